@@ -0,0 +1,34 @@
+from django.contrib import admin
+from .models import AgentDailyStats, EmailCampaign
+
+
+@admin.register(AgentDailyStats)
+class AgentDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("agent", "date", "revenue", "paid_orders", "sales", "no_sales")
+    list_filter = ("date",)
+    search_fields = ("agent__user__username",)
+    ordering = ("-date",)
+
+
+@admin.register(EmailCampaign)
+class EmailCampaignAdmin(admin.ModelAdmin):
+    list_display = (
+        "subject",
+        "status",
+        "sent_count",
+        "failed_count",
+        "created_by",
+        "created_at",
+        "completed_at",
+    )
+    list_filter = ("status", "created_at")
+    search_fields = ("subject",)
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "last_client_id",
+        "sent_count",
+        "failed_count",
+        "completed_at",
+        "heartbeat_at",
+        "error_message",
+    )
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import localdate
+
+from agents.models import AgentDailyStats
+
+
+# Recomputes the per-agent daily rollup from orders and leads
+class Command(BaseCommand):
+    help = "Rebuild the per-agent daily stats used by the agents leaderboard."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Only rebuild the last N days (default: the whole history).",
+        )
+
+    def handle(self, *args, **options):
+        start_date = None
+        days = options.get("days")
+        if days:
+            start_date = localdate() - timedelta(days=days - 1)
+
+        rows = AgentDailyStats.objects.rebuild(start_date=start_date)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} agent daily stats rows."))
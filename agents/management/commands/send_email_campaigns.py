@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from agents.models import EmailCampaign
+
+
+# Sends queued email campaigns and resumes interrupted ones
+class Command(BaseCommand):
+    help = "Send pending email campaigns, resuming any that were interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--campaign", type=int, help="Only run this campaign id.")
+        parser.add_argument(
+            "--chunk-size", type=int, help="Recipients claimed per chunk."
+        )
+        parser.add_argument(
+            "--rate-limit", type=float, help="Maximum messages per second."
+        )
+
+    def handle(self, *args, **options):
+        campaigns = EmailCampaign.objects.exclude(
+            status=EmailCampaign.StatusChoices.COMPLETED
+        ).order_by("created_at")
+        if options.get("campaign"):
+            campaigns = campaigns.filter(pk=options["campaign"])
+
+        for campaign in campaigns:
+            self.stdout.write(f"Sending campaign #{campaign.pk}: {campaign.subject}")
+            sent = campaign.run(
+                chunk_size=options.get("chunk_size"),
+                rate_limit=options.get("rate_limit"),
+            )
+            if sent is None:
+                self.stdout.write(
+                    f"Campaign #{campaign.pk} is being sent by another worker."
+                )
+                continue
+            if campaign.error_message:
+                self.stderr.write(
+                    f"Campaign #{campaign.pk} stopped after {campaign.sent_count} "
+                    f"sent and will resume on the next run: {campaign.error_message}"
+                )
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Campaign #{campaign.pk} finished: {campaign.sent_count} sent, "
+                    f"{campaign.failed_count} failed."
+                )
+            )
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-19 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("leads", "0005_lead_convert_alter_lead_phone_number"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgentDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("paid_orders", models.PositiveIntegerField(default=0)),
+                ("sales", models.PositiveIntegerField(default=0)),
+                ("no_sales", models.PositiveIntegerField(default=0)),
+                (
+                    "agent",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="leads.agent",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["date", "agent"], name="agents_agen_date_f6230d_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("agent", "date"), name="unique_agent_daily_stats"
+                    )
+                ],
+            },
+        ),
+    ]
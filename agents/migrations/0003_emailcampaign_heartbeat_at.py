@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0002_emailcampaign"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailcampaign",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0003_emailcampaign_heartbeat_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailcampaign",
+            name="error_message",
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -1,5 +1,9 @@
+from django.contrib import messages
 from django.contrib.auth.mixins import AccessMixin
-from django.shortcuts import render
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import redirect, render
+
+from .exports import EXPORT_FORMATS, export_response
 
 
 # Mixin for logged in organisor
@@ -15,3 +19,115 @@ class OrganisorAndLoginRequiredMixin(AccessMixin):
                 status=403,
             )
         return super().dispatch(request, *args, **kwargs)
+
+
+# Mixin for paginated list views that can also render only their results
+class FragmentListMixin:
+    fragment = False
+    fragment_template_name = None
+
+    def get_template_names(self):
+        if self.fragment:
+            return [self.fragment_template_name]
+        return super().get_template_names()
+
+    def paginate_queryset(self, queryset, page_size):
+        # Missing or out-of-range pages fall back to the first or last page
+        paginator = self.get_paginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET.get(self.page_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+# Mixin for list views that can stream their filtered rows as CSV, XLSX or NDJSON
+class ExportMixin:
+    export_filename = "export"
+    export_fields = ()  # (values() name, column header) pairs
+    export_chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("export")
+        if export_format:
+            if export_format not in EXPORT_FORMATS:
+                return HttpResponseBadRequest("Unsupported export format.")
+            return export_response(
+                export_format,
+                self.export_filename,
+                self.export_fields,
+                self.get_export_queryset(),
+                chunk_size=self.export_chunk_size,
+            )
+        return super().get(request, *args, **kwargs)
+
+    def get_export_queryset(self):
+        # The list's own filters, without prefetches that values() cannot use
+        return self.get_queryset().prefetch_related(None)
+
+
+# Mixin for JSON autocomplete endpoints used by AutocompleteSelect widgets
+class AutocompleteMixin:
+    page_size = 20
+
+    def get_results(self, query):
+        raise NotImplementedError
+
+    def get_label(self, obj):
+        # Same text as the option the widget renders for a selected value
+        return str(obj)
+
+    def get_detail(self, obj):
+        # Extra text shown under the label in the suggestion list
+        return ""
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get("q", "").strip()
+        results = self.get_results(query)[: self.page_size] if query else []
+        return JsonResponse(
+            {
+                "results": [
+                    {
+                        "id": obj.pk,
+                        "text": self.get_label(obj),
+                        "detail": self.get_detail(obj),
+                    }
+                    for obj in results
+                ]
+            }
+        )
+
+
+# Mixin for the progress page of a background import job, with cancel and resume
+class ImportJobDetailMixin:
+    context_object_name = "job"
+    job_label = "Import"
+    detail_url_name = None
+
+    def post(self, request, *args, **kwargs):
+        # Cancels a running job or queues a stopped one to resume
+        job = self.get_object()
+        action = request.POST.get("action")
+        statuses = self.model.StatusChoices
+
+        if action == "cancel" and not job.is_finished:
+            self.model.objects.filter(pk=job.pk).update(status=statuses.CANCELLED)
+            messages.warning(request, f"{self.job_label} #{job.pk} has been cancelled.")
+        elif action == "resume" and job.status in (
+            statuses.CANCELLED,
+            statuses.FAILED,
+        ):
+            self.model.objects.filter(pk=job.pk).update(
+                status=statuses.PENDING, error_message=""
+            )
+            messages.success(
+                request,
+                f"{self.job_label} #{job.pk} will resume from row {job.last_row + 1}.",
+            )
+        else:
+            messages.error(request, "Invalid action.")
+
+        return redirect(self.detail_url_name, pk=job.pk)
+
+
+# Mixin for the JSON endpoint polled by an import job progress page
+class ImportJobStatusMixin:
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(self.object.progress())
@@ -0,0 +1,434 @@
+import smtplib
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.timezone import localdate, now
+from django.utils.translation import gettext_lazy as _
+
+
+# Manages incremental updates and rebuilds of the daily agent rollup
+class AgentDailyStatsManager(models.Manager):
+
+    def record_paid_order(self, order, delta=1):
+        # Adds a newly paid order to its agent's row for the order date, or
+        # takes it out again with delta=-1 when it leaves Paid
+        if order.agent_id is None:
+            return
+        revenue = order.order_products.aggregate(
+            total=Sum(F("product_price") * F("quantity"))
+        )["total"] or Decimal("0")
+        self._increment(
+            order.agent_id,
+            localdate(order.date_created),
+            revenue=revenue * delta,
+            paid_orders=delta,
+        )
+
+    def record_conversion(self, lead):
+        # Adds a converted lead to its agent's row for the conversion date
+        self.record_conversions([lead])
+
+    def record_conversions(self, leads):
+        # Adds converted leads to their agents' rows, one update per agent and day
+        self._record_lead_counts((lead, lead.category_id, 1) for lead in leads)
+
+    def record_category_changes(self, changes):
+        # Moves converted leads from the count of their previous category to
+        # that of their current one; changes are (lead, previous category id)
+        self._record_lead_counts(
+            entry
+            for lead, previous_category_id in changes
+            for entry in ((lead, previous_category_id, -1), (lead, lead.category_id, 1))
+        )
+
+    def record_lead_change(self, previous, lead):
+        # Takes a lead out of the counts as it was before a save and adds it
+        # back as it is now (None once deleted); unchanged leads cancel out
+        # without a query
+        entries = []
+        if previous is not None and previous.is_converted:
+            entries.append((previous, previous.category_id, -1))
+        if lead is not None and lead.is_converted:
+            entries.append((lead, lead.category_id, 1))
+        self._record_lead_counts(entries)
+
+    def _record_lead_counts(self, entries):
+        # Applies (lead, category id, +1 or -1) entries to the sale and no-sale
+        # counts of the lead's agent on its conversion date
+        Category = apps.get_model("leads", "Category")
+        fields = {"sale": "sales", "no sale": "no_sales"}
+        deltas = {}
+        for lead, category_id, delta in entries:
+            category_name = Category.objects.name_for(category_id) or ""
+            field = fields.get(category_name.lower())
+            if lead.agent_id is None or field is None or not lead.conversion_date:
+                continue
+            counts = deltas.setdefault(
+                (lead.agent_id, localdate(lead.conversion_date)), {}
+            )
+            counts[field] = counts.get(field, 0) + delta
+
+        for (agent_id, date), counts in deltas.items():
+            counts = {field: delta for field, delta in counts.items() if delta}
+            if counts:
+                self._increment(agent_id, date, **counts)
+
+    def _increment(self, agent_id, date, **deltas):
+        # Atomically increments counters on the (agent, date) row. Decrements
+        # stop at zero, for rows built before the change being reversed.
+        self.get_or_create(agent_id=agent_id, date=date)
+        self.filter(agent_id=agent_id, date=date).update(
+            **{
+                field: F(field) + value if value >= 0 else Greatest(F(field) + value, 0)
+                for field, value in deltas.items()
+            }
+        )
+
+    def rebuild(self, start_date=None, end_date=None):
+        # Recomputes rows from orders and leads, optionally within a date range
+        Order = apps.get_model("orders", "Order")
+        Lead = apps.get_model("leads", "Lead")
+        Category = apps.get_model("leads", "Category")
+
+        orders = Order.objects.filter(agent__isnull=False, status="Paid")
+        leads = Lead.objects.filter(agent__isnull=False, is_converted=True)
+        existing = self.all()
+        if start_date:
+            orders = orders.filter(date_created__date__gte=start_date)
+            leads = leads.filter(conversion_date__date__gte=start_date)
+            existing = existing.filter(date__gte=start_date)
+        if end_date:
+            orders = orders.filter(date_created__date__lte=end_date)
+            leads = leads.filter(conversion_date__date__lte=end_date)
+            existing = existing.filter(date__lte=end_date)
+
+        rows = {}
+        order_rows = (
+            orders.annotate(day=TruncDate("date_created"))
+            .values("agent", "day")
+            .annotate(
+                paid_orders=Count("id", distinct=True),
+                revenue=Sum(
+                    F("order_products__product_price") * F("order_products__quantity")
+                ),
+            )
+            .order_by()
+        )
+        for row in order_rows:
+            stats = rows.setdefault((row["agent"], row["day"]), {})
+            stats["paid_orders"] = row["paid_orders"]
+            stats["revenue"] = row["revenue"] or Decimal("0")
+
+        lead_rows = (
+            leads.filter(conversion_date__isnull=False)
+            .annotate(day=TruncDate("conversion_date"))
+            .values("agent", "day")
+            .annotate(
+                sales=Count(
+                    "id", filter=Q(category_id__in=Category.objects.ids_for("sale"))
+                ),
+                no_sales=Count(
+                    "id", filter=Q(category_id__in=Category.objects.ids_for("no sale"))
+                ),
+            )
+            .order_by()
+        )
+        for row in lead_rows:
+            if not row["sales"] and not row["no_sales"]:
+                continue
+            stats = rows.setdefault((row["agent"], row["day"]), {})
+            stats["sales"] = row["sales"]
+            stats["no_sales"] = row["no_sales"]
+
+        with transaction.atomic():
+            existing.delete()
+            self.bulk_create(
+                [
+                    self.model(agent_id=agent_id, date=date, **stats)
+                    for (agent_id, date), stats in rows.items()
+                ],
+                batch_size=1000,
+            )
+        return len(rows)
+
+    def leaderboard(self, days=30, today=None):
+        # Ranks agents for the last `days` days and for the period before it
+        Agent = apps.get_model("leads", "Agent")
+        today = today or localdate()
+        start = today - timedelta(days=days - 1)
+        previous_start = start - timedelta(days=days)
+
+        current = Q(daily_stats__date__gte=start, daily_stats__date__lte=today)
+        previous = Q(daily_stats__date__gte=previous_start, daily_stats__date__lt=start)
+        agents = (
+            Agent.objects.annotate(
+                revenue=Sum("daily_stats__revenue", filter=current, default=0),
+                paid_orders=Sum("daily_stats__paid_orders", filter=current, default=0),
+                sales=Sum("daily_stats__sales", filter=current, default=0),
+                no_sales=Sum("daily_stats__no_sales", filter=current, default=0),
+                previous_revenue=Sum(
+                    "daily_stats__revenue", filter=previous, default=0
+                ),
+                previous_paid_orders=Sum(
+                    "daily_stats__paid_orders", filter=previous, default=0
+                ),
+            )
+            .values(
+                "pk",
+                "user__username",
+                "revenue",
+                "paid_orders",
+                "sales",
+                "no_sales",
+                "previous_revenue",
+                "previous_paid_orders",
+            )
+            .order_by("user__username")
+        )
+        agents = list(agents)
+
+        previous_ranking = sorted(
+            agents,
+            key=lambda row: (-row["previous_revenue"], -row["previous_paid_orders"]),
+        )
+        previous_ranks = {
+            row["pk"]: rank for rank, row in enumerate(previous_ranking, 1)
+        }
+
+        ranking = sorted(agents, key=lambda row: (-row["revenue"], -row["paid_orders"]))
+        leaderboard = []
+        for rank, row in enumerate(ranking, start=1):
+            total_leads = row["sales"] + row["no_sales"]
+            previous_rank = previous_ranks[row["pk"]]
+            leaderboard.append(
+                {
+                    "agent_id": row["pk"],
+                    "username": row["user__username"],
+                    "rank": rank,
+                    "previous_rank": previous_rank,
+                    "movement": previous_rank - rank,
+                    "revenue": row["revenue"],
+                    "paid_orders": row["paid_orders"],
+                    "conversions": row["sales"],
+                    "conversion_rate": (
+                        row["sales"] / total_leads * 100 if total_leads > 0 else None
+                    ),
+                }
+            )
+        return leaderboard
+
+
+# Per-agent daily rollup of paid orders and lead conversions
+class AgentDailyStats(models.Model):
+    agent = models.ForeignKey(
+        "leads.Agent", on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_orders = models.PositiveIntegerField(default=0)
+    sales = models.PositiveIntegerField(default=0)
+    no_sales = models.PositiveIntegerField(default=0)
+
+    objects = AgentDailyStatsManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agent", "date"], name="unique_agent_daily_stats"
+            )
+        ]
+        indexes = [models.Index(fields=["date", "agent"])]
+
+    def __str__(self):
+        return f"{self.agent} on {self.date}"
+
+
+# Organiser email sent to every client in throttled, resumable chunks
+class EmailCampaign(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = "Pending", _("Pending")
+        RUNNING = "Running", _("Running")
+        COMPLETED = "Completed", _("Completed")
+
+    subject = models.CharField(max_length=100)
+    message = models.TextField()
+    from_email = models.EmailField(blank=True)
+    created_by = models.ForeignKey(
+        "leads.UserProfile", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    # Highest client id whose message has been recorded; resume point
+    last_client_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed with every message; a running campaign whose heartbeat is
+    # older than STALE_AFTER is taken over by the next worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # Why the last run stopped early, e.g. the mail server refused the login
+    error_message = models.TextField(blank=True)
+
+    STALE_AFTER = timedelta(minutes=5)
+
+    def claim(self, stale_after=None):
+        # Takes the campaign for this worker; False while another one sends it
+        stale_after = stale_after or self.STALE_AFTER
+        statuses = self.StatusChoices
+        claimed = (
+            EmailCampaign.objects.filter(pk=self.pk)
+            .filter(
+                Q(status=statuses.PENDING)
+                | Q(status=statuses.RUNNING, heartbeat_at__isnull=True)
+                | Q(status=statuses.RUNNING, heartbeat_at__lt=now() - stale_after)
+            )
+            .update(status=statuses.RUNNING, heartbeat_at=now(), error_message="")
+        )
+        self.refresh_from_db()
+        return bool(claimed)
+
+    def next_chunk(self, chunk_size):
+        # Recipients after the last recorded message; completes the campaign
+        # once none are left
+        Client = apps.get_model("clients", "Client")
+        recipients = list(
+            Client.objects.filter(pk__gt=self.last_client_id)
+            .exclude(email__isnull=True)
+            .exclude(email="")
+            .order_by("pk")
+            .values_list("pk", "email")[:chunk_size]
+        )
+        if not recipients:
+            EmailCampaign.objects.filter(pk=self.pk).update(
+                status=self.StatusChoices.COMPLETED,
+                completed_at=now(),
+                heartbeat_at=None,
+            )
+            self.refresh_from_db()
+        return recipients
+
+    def record_delivery(self, client_id, delivered, description):
+        # Logs one message and moves the cursor past its client as soon as the
+        # mail server took it or refused it, so a crash loses at most the
+        # record of the message in flight, which is then sent again
+        Contact = apps.get_model("clients", "Contact")
+        with transaction.atomic():
+            if delivered:
+                Contact.objects.create(
+                    client_id=client_id,
+                    reason=Contact.ReasonChoices.OTHER,
+                    description=description,
+                    contact_date=now(),
+                    user_id=self.created_by_id,
+                )
+                counter = "sent_count"
+            else:
+                counter = "failed_count"
+            EmailCampaign.objects.filter(pk=self.pk).update(
+                last_client_id=client_id,
+                heartbeat_at=now(),
+                **{counter: F(counter) + 1},
+            )
+        self.last_client_id = client_id
+
+    def run(self, chunk_size=None, rate_limit=None, connection=None):
+        # Sends the campaign chunk by chunk, resuming after the last recorded
+        # client. Returns the number sent so far, or None when another worker
+        # is sending the campaign.
+        if chunk_size is None:
+            chunk_size = getattr(settings, "EMAIL_CAMPAIGN_CHUNK_SIZE", 100)
+        if rate_limit is None:
+            rate_limit = getattr(settings, "EMAIL_CAMPAIGN_RATE_LIMIT", 0)
+        if not self.claim():
+            return None
+
+        connection = connection or get_connection()
+        description = f"An email with subject '{self.subject}' was sent to the client."
+        started = time.monotonic()
+        sent_in_run = 0
+
+        try:
+            with connection:
+                while True:
+                    recipients = self.next_chunk(chunk_size)
+                    if not recipients:
+                        break
+
+                    for client_id, email in recipients:
+                        message = EmailMessage(
+                            self.subject,
+                            self.message,
+                            self.from_email or settings.EMAIL_HOST_USER,
+                            [email],
+                            connection=connection,
+                        )
+                        try:
+                            delivered = bool(connection.send_messages([message]))
+                        except smtplib.SMTPRecipientsRefused:
+                            delivered = False
+                        self.record_delivery(client_id, delivered, description)
+                        sent_in_run += 1
+
+                        if rate_limit:
+                            delay = sent_in_run / rate_limit - (
+                                time.monotonic() - started
+                            )
+                            if delay > 0:
+                                time.sleep(delay)
+        except (smtplib.SMTPException, OSError) as e:
+            # The mail server is down or refused the login, so nobody else can
+            # be reached now. The campaign stays running and is released for
+            # the next run instead of recording every client as failed.
+            EmailCampaign.objects.filter(pk=self.pk).update(
+                heartbeat_at=None, error_message=str(e)
+            )
+
+        self.refresh_from_db()
+        return self.sent_count
+
+    def __str__(self):
+        return f"Campaign '{self.subject}' ({self.status})"
+
+
+@receiver(post_save, sender="orders.Order")
+def update_agent_daily_stats_on_order_paid(sender, instance, **kwargs):
+    # Updates the daily rollup when an order transitions to or out of Paid
+    if getattr(instance, "_became_paid", False):
+        AgentDailyStats.objects.record_paid_order(instance)
+    elif getattr(instance, "_paid_changed", False):
+        AgentDailyStats.objects.record_paid_order(instance, delta=-1)
+
+
+@receiver(pre_delete, sender="orders.Order")
+def update_agent_daily_stats_on_order_delete(sender, instance, **kwargs):
+    # Takes a paid order out while its lines are still there to total
+    if instance.status == "Paid":
+        AgentDailyStats.objects.record_paid_order(instance, delta=-1)
+
+
+@receiver(post_save, sender="leads.Lead")
+def update_agent_daily_stats_on_lead_save(sender, instance, **kwargs):
+    # Moves a lead's conversion when a save changes its category, agent or
+    # conversion state; convert_leads updates in bulk and records its own
+    AgentDailyStats.objects.record_lead_change(
+        getattr(instance, "_previous", None), instance
+    )
+
+
+@receiver(post_delete, sender="leads.Lead")
+def update_agent_daily_stats_on_lead_delete(sender, instance, **kwargs):
+    # Takes a deleted converted lead out of its agent's counts
+    AgentDailyStats.objects.record_lead_change(instance, None)
@@ -1,8 +1,22 @@
+import json
+import smtplib
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core import mail
+from django.core.mail import get_connection
 from django.contrib.auth import get_user_model
+from django.utils.timezone import now
 from leads.models import Agent
+from clients.models import Contact
+from .models import AgentDailyStats, EmailCampaign
 
 
 class AgentCreateViewTest(TestCase):
@@ -46,3 +60,406 @@ class AgentCreateViewTest(TestCase):
 
         # Ensure the agent was created in the database
         self.assertTrue(Agent.objects.filter(user__username="new_agent").exists())
+
+
+class AllAgentsStatsViewTest(TestCase):
+    def setUp(self):
+        from clients.models import Client
+        from leads.models import Category, Lead
+        from orders.models import Order, OrderProduct
+
+        self.organisor_user = get_user_model().objects.create_user(
+            username="organisor", password="testpassword", is_organisor=True
+        )
+        self.client.login(username="organisor", password="testpassword")
+
+        customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        sale, _ = Category.objects.get_or_create(name="sale")
+        no_sale, _ = Category.objects.get_or_create(name="no sale")
+
+        self.agents = []
+        for index in range(3):
+            user = get_user_model().objects.create_user(
+                username=f"agent{index}", password="testpassword", is_organisor=False
+            )
+            agent = Agent.objects.create(user=user)
+            self.agents.append(agent)
+            for status in ("Paid", "Pending"):
+                order = Order.objects.create(
+                    client=customer, agent=agent, status=status
+                )
+                OrderProduct.objects.create(
+                    order=order,
+                    product_name="Item",
+                    product_price=10 + index,
+                    quantity=2,
+                )
+            Lead.objects.create(
+                first_name="Lead",
+                last_name=str(index),
+                email=f"lead{index}@example.com",
+                phone_number="123456789",
+                agent=agent,
+                category=sale if index else no_sale,
+                is_converted=True,
+            )
+
+    def test_stats_match_per_agent_methods(self):
+        """Test that the set-based totals equal the sum of per-agent stats."""
+        response = self.client.get(reverse("agents:all-agents-statistics"))
+        self.assertEqual(response.status_code, 200)
+
+        stats = response.context["stats"]
+        expected = [agent.get_stats() for agent in self.agents]
+        self.assertEqual(stats["order_count"], sum(s["order_count"] for s in expected))
+        self.assertEqual(stats["total_value"], sum(s["total_value"] for s in expected))
+        self.assertEqual(stats["sale"], 2)
+        self.assertEqual(stats["no_sale"], 1)
+
+        daily = json.loads(response.context["daily_orders_data_json"])
+        self.assertEqual(daily[0]["average_count"], 1)
+
+    def test_query_count_does_not_grow_with_agents(self):
+        """Test that the page issues a fixed number of queries."""
+        with CaptureQueriesContext(connection) as few_agents:
+            self.client.get(reverse("agents:all-agents-statistics"))
+
+        user = get_user_model().objects.create_user(
+            username="agent_extra", password="testpassword", is_organisor=False
+        )
+        Agent.objects.create(user=user)
+
+        with CaptureQueriesContext(connection) as more_agents:
+            self.client.get(reverse("agents:all-agents-statistics"))
+
+        self.assertEqual(len(few_agents), len(more_agents))
+
+
+class AgentLeaderboardTest(TestCase):
+    def setUp(self):
+        from clients.models import Client
+        from leads.models import Category
+
+        self.organisor_user = get_user_model().objects.create_user(
+            username="organisor", password="testpassword", is_organisor=True
+        )
+        self.client.login(username="organisor", password="testpassword")
+        self.customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        self.sale, _ = Category.objects.get_or_create(name="sale")
+        self.agents = [
+            Agent.objects.create(
+                user=get_user_model().objects.create_user(
+                    username=f"agent{index}", is_organisor=False
+                )
+            )
+            for index in range(2)
+        ]
+
+    def pay_order(self, agent, price, date_created=None):
+        from orders.models import Order, OrderProduct
+
+        order = Order.objects.create(client=self.customer, agent=agent)
+        if date_created:
+            Order.objects.filter(pk=order.pk).update(date_created=date_created)
+            order.refresh_from_db()
+        OrderProduct.objects.create(
+            order=order, product_name="Item", product_price=price, quantity=1
+        )
+        order.status = "Paid"
+        order.save()
+        return order
+
+    def test_paid_transition_updates_rollup(self):
+        """Test that marking an order as paid increments the agent's row once."""
+        order = self.pay_order(self.agents[0], "25.00")
+        order.save()
+
+        stats = AgentDailyStats.objects.get(agent=self.agents[0])
+        self.assertEqual(stats.paid_orders, 1)
+        self.assertEqual(stats.revenue, Decimal("25.00"))
+
+    def test_leaving_paid_takes_the_order_out_of_the_rollup(self):
+        """Test that unpaying or deleting a paid order reverses its increment."""
+        order = self.pay_order(self.agents[0], "25.00")
+        self.pay_order(self.agents[0], "10.00")
+
+        order.status = "Pending"
+        order.save()
+        stats = AgentDailyStats.objects.get(agent=self.agents[0])
+        self.assertEqual((stats.paid_orders, stats.revenue), (1, Decimal("10.00")))
+
+        order.status = "Paid"
+        order.save()
+        order.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.paid_orders, stats.revenue), (1, Decimal("10.00")))
+
+    def test_category_reversal_moves_the_conversion(self):
+        """Test that changing a converted lead's category moves its count."""
+        from leads.models import Category, Lead
+
+        lead = Lead.objects.create(
+            first_name="Lead",
+            last_name="Sold",
+            agent=self.agents[0],
+            category=self.sale,
+            is_converted=True,
+            conversion_date=now(),
+        )
+        stats = AgentDailyStats.objects.get(agent=self.agents[0])
+        self.assertEqual((stats.sales, stats.no_sales), (1, 0))
+
+        # Moved back on the pipeline board
+        no_sale, _ = Category.objects.get_or_create(name="no sale")
+        self.client.post(
+            reverse("leads:lead-move", args=[lead.pk]), {"category": no_sale.pk}
+        )
+        stats.refresh_from_db()
+        self.assertEqual((stats.sales, stats.no_sales), (0, 1))
+
+        # Edited and saved
+        lead.refresh_from_db()
+        lead.category = Category.objects.get(name="new")
+        lead.save()
+        stats.refresh_from_db()
+        self.assertEqual((stats.sales, stats.no_sales), (0, 0))
+
+    def test_rebuild_matches_incremental_updates(self):
+        """Test that rebuilding the rollup reproduces the incremental rows."""
+        self.pay_order(self.agents[0], "25.00")
+        self.pay_order(self.agents[1], "10.00", now() - timedelta(days=3))
+        incremental = sorted(
+            AgentDailyStats.objects.values_list(
+                "agent", "date", "revenue", "paid_orders"
+            )
+        )
+
+        call_command("rebuild_agent_daily_stats", stdout=StringIO())
+
+        rebuilt = sorted(
+            AgentDailyStats.objects.values_list(
+                "agent", "date", "revenue", "paid_orders"
+            )
+        )
+        self.assertEqual(incremental, rebuilt)
+
+    def test_leaderboard_ranks_and_movement(self):
+        """Test that the leaderboard ranks by revenue and reports rank movement."""
+        self.pay_order(self.agents[0], "50.00", now() - timedelta(days=10))
+        self.pay_order(self.agents[1], "20.00")
+
+        response = self.client.get(
+            reverse("agents:agent-leaderboard-data"), {"days": 7}
+        )
+        self.assertEqual(response.status_code, 200)
+        leaderboard = response.json()["leaderboard"]
+        self.assertEqual(leaderboard[0]["username"], "agent1")
+        self.assertEqual(leaderboard[0]["movement"], 1)
+        self.assertEqual(leaderboard[1]["movement"], -1)
+
+        response = self.client.get(reverse("agents:agent-leaderboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "agent0")
+
+
+class EmailCampaignTest(TestCase):
+    def setUp(self):
+        from clients.models import Client
+
+        self.organisor_user = get_user_model().objects.create_user(
+            username="organisor",
+            password="testpassword",
+            email="organisor@example.com",
+            is_organisor=True,
+        )
+        self.client.login(username="organisor", password="testpassword")
+        self.customers = [
+            Client.objects.create(
+                first_name="Client", last_name=str(index), email=f"c{index}@example.com"
+            )
+            for index in range(5)
+        ]
+        Client.objects.create(first_name="No", last_name="Email")
+
+    def test_send_to_all_queues_campaign(self):
+        """Test that 'send to all' queues a campaign instead of sending inline."""
+        response = self.client.post(
+            reverse("agents:send-email"),
+            {"subject": "News", "message": "Hello", "send_to_all": "on"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        campaign = EmailCampaign.objects.get()
+        self.assertEqual(campaign.status, EmailCampaign.StatusChoices.PENDING)
+
+    def test_campaign_sends_individual_messages_in_chunks(self):
+        """Test that each client gets its own message and a contact entry."""
+        campaign = EmailCampaign.objects.create(
+            subject="News",
+            message="Hello",
+            created_by=self.organisor_user.userprofile,
+        )
+        campaign.run(chunk_size=2, rate_limit=0)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertTrue(all(len(message.to) == 1 for message in mail.outbox))
+        self.assertEqual(Contact.objects.count(), 5)
+        self.assertEqual(campaign.sent_count, 5)
+        self.assertEqual(campaign.status, EmailCampaign.StatusChoices.COMPLETED)
+
+    def test_interrupted_campaign_resumes_without_resending(self):
+        """Test that a resumed campaign skips clients already handed off."""
+        campaign = EmailCampaign.objects.create(
+            subject="News",
+            message="Hello",
+            status=EmailCampaign.StatusChoices.RUNNING,
+            last_client_id=self.customers[2].pk,
+        )
+        call_command("send_email_campaigns", "--rate-limit", "0", stdout=StringIO())
+
+        recipients = sorted(message.to[0] for message in mail.outbox)
+        self.assertEqual(recipients, ["c3@example.com", "c4@example.com"])
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, EmailCampaign.StatusChoices.COMPLETED)
+
+    def test_crash_mid_chunk_resumes_after_the_last_recorded_message(self):
+        """Test that a crashed run is resumed from the last recorded client."""
+        campaign = EmailCampaign.objects.create(subject="News", message="Hello")
+        mail_connection = get_connection()
+        send_messages = mail_connection.send_messages
+
+        def crash_on_third(messages):
+            if len(mail.outbox) == 2:
+                raise RuntimeError("Worker killed")
+            return send_messages(messages)
+
+        with patch.object(mail_connection, "send_messages", side_effect=crash_on_third):
+            with self.assertRaises(RuntimeError):
+                campaign.run(chunk_size=5, rate_limit=0, connection=mail_connection)
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.sent_count, 2)
+        self.assertEqual(campaign.last_client_id, self.customers[1].pk)
+        self.assertEqual(Contact.objects.count(), 2)
+
+        # The lease is still held until the heartbeat goes stale
+        self.assertIsNone(campaign.run(rate_limit=0))
+        EmailCampaign.objects.filter(pk=campaign.pk).update(
+            heartbeat_at=now() - timedelta(hours=1)
+        )
+        self.assertEqual(campaign.run(rate_limit=0), 5)
+        recipients = sorted(message.to[0] for message in mail.outbox)
+        self.assertEqual(recipients, [f"c{index}@example.com" for index in range(5)])
+        self.assertEqual(campaign.status, EmailCampaign.StatusChoices.COMPLETED)
+
+    def test_unreachable_mail_server_leaves_campaign_resumable(self):
+        """Test that a refused login stops the run instead of failing everyone."""
+        campaign = EmailCampaign.objects.create(subject="News", message="Hello")
+        mail_connection = get_connection()
+        login_refused = smtplib.SMTPAuthenticationError(535, b"Bad credentials")
+
+        with patch.object(mail_connection, "open", side_effect=login_refused):
+            campaign.run(rate_limit=0, connection=mail_connection)
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, EmailCampaign.StatusChoices.RUNNING)
+        self.assertEqual((campaign.sent_count, campaign.failed_count), (0, 0))
+        self.assertEqual(campaign.last_client_id, 0)
+        self.assertIn("Bad credentials", campaign.error_message)
+
+        # Released at once, so the next run sends everything
+        self.assertEqual(campaign.run(rate_limit=0), 5)
+        self.assertEqual(campaign.error_message, "")
+
+    def test_refused_recipient_is_counted_as_failed(self):
+        """Test that a recipient the server refuses does not stop the campaign."""
+        campaign = EmailCampaign.objects.create(subject="News", message="Hello")
+        mail_connection = get_connection()
+        send_messages = mail_connection.send_messages
+
+        def refuse_first(messages):
+            if messages[0].to == ["c0@example.com"]:
+                raise smtplib.SMTPRecipientsRefused({"c0@example.com": (550, b"")})
+            return send_messages(messages)
+
+        with patch.object(mail_connection, "send_messages", side_effect=refuse_first):
+            campaign.run(rate_limit=0, connection=mail_connection)
+
+        self.assertEqual((campaign.sent_count, campaign.failed_count), (4, 1))
+        self.assertEqual(campaign.status, EmailCampaign.StatusChoices.COMPLETED)
+
+
+class ExportMixinTest(TestCase):
+    def setUp(self):
+        from clients.models import Client
+        from leads.models import Category, Lead
+        from orders.models import Order, OrderProduct
+
+        self.organisor_user = get_user_model().objects.create_user(
+            username="organisor", password="testpassword", is_organisor=True
+        )
+        self.client.login(username="organisor", password="testpassword")
+
+        new, _ = Category.objects.get_or_create(name="new")
+        sale, _ = Category.objects.get_or_create(name="sale")
+        for index in range(5):
+            Lead.objects.create(
+                first_name="Export",
+                last_name=str(index),
+                email=f"export{index}@example.com",
+                phone_number="123456789",
+                category=new if index % 2 else sale,
+            )
+
+        customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        for index in range(4):
+            order = Order.objects.create(client=customer)
+            for price in (10, 5):
+                OrderProduct.objects.create(
+                    order=order, product_name="Item", product_price=price, quantity=2
+                )
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_csv_export_respects_filters(self):
+        """Test that the CSV export streams only the leads matching the filter."""
+        content = self.export(reverse("leads:lead-list"), export="csv", category="new")
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["First Name", "Last Name"])
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(",new," in line for line in lines[1:]))
+
+    def test_xlsx_and_ndjson_exports(self):
+        """Test that XLSX opens as a workbook and NDJSON has one object per line."""
+        import openpyxl
+
+        content = self.export(reverse("leads:lead-list"), export="xlsx")
+        sheet = openpyxl.load_workbook(BytesIO(content)).active
+        self.assertEqual(sheet.max_row, 6)
+        self.assertEqual(sheet.cell(row=1, column=1).value, "First Name")
+
+        content = self.export(reverse("leads:lead-list"), export="ndjson")
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["first_name"], "Export")
+
+    def test_order_totals_are_annotated(self):
+        """Test that order totals come from the query, not a query per order."""
+        url = reverse("orders:order-list")
+        with CaptureQueriesContext(connection) as queries:
+            content = self.export(url, export="ndjson")
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({Decimal(row["total_price"]) for row in rows}, {Decimal(30)})
+        self.assertEqual(rows[0]["client_name"], "Jan Nowak")
+        order_queries = [q for q in queries if "orders_order" in q["sql"]]
+        self.assertEqual(len(order_queries), 1)
+
+    def test_unknown_format_is_rejected(self):
+        """Test that an unsupported export format returns 400."""
+        response = self.client.get(reverse("leads:lead-list"), {"export": "pdf"})
+        self.assertEqual(response.status_code, 400)
@@ -7,7 +7,10 @@ from .views import (
     AgentDeleteView,
     AgentStatsView,
     AllAgentsStatsView,
+    AgentLeaderboardView,
+    AgentLeaderboardDataView,
     SendEmailView,
+    AgentAutocompleteView,
 )
 
 
@@ -16,7 +19,14 @@ app_name = "agents"
 urlpatterns = [
     path("", AgentListView.as_view(), name="agent-list"),
     path("create/", AgentCreateView.as_view(), name="agent-create"),
+    path("autocomplete/", AgentAutocompleteView.as_view(), name="agent-autocomplete"),
     path("all/stats", AllAgentsStatsView.as_view(), name="all-agents-statistics"),
+    path("leaderboard/", AgentLeaderboardView.as_view(), name="agent-leaderboard"),
+    path(
+        "leaderboard/data/",
+        AgentLeaderboardDataView.as_view(),
+        name="agent-leaderboard-data",
+    ),
     path("<int:pk>/", AgentDetailView.as_view(), name="agent-detail"),
     path("<int:pk>/update/", AgentUpdateView.as_view(), name="agent-update"),
     path("<int:pk>/delete/", AgentDeleteView.as_view(), name="agent-delete"),
@@ -8,15 +8,18 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.mail import send_mail
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
 from django.shortcuts import reverse, get_object_or_404
 from django.urls import reverse_lazy
 from django.utils.timezone import now
-from django.views import generic
+from django.views import generic, View
 from django.conf import settings
 
 
 # Models
 from leads.models import Agent
+from .models import AgentDailyStats, EmailCampaign
 from clients.models import Client, Contact
 
 # Forms
@@ -24,7 +27,7 @@ from orders.forms import StatisticsFilterForm
 from .forms import AgentModelForm, AgentSearchForm, OrganisorEmailForm, AgentEmailForm
 
 # Custom Mixins
-from .mixins import OrganisorAndLoginRequiredMixin
+from .mixins import AutocompleteMixin, OrganisorAndLoginRequiredMixin
 
 
 # Agent list with filters and search functionality
@@ -187,35 +190,29 @@ class AllAgentsStatsView(OrganisorAndLoginRequiredMixin, generic.TemplateView):
             start_datetime = form.cleaned_data.get("start_datetime")
             end_datetime = form.cleaned_data.get("end_datetime")
 
-        agents = Agent.objects.all()
+        # Per-agent metrics come from a handful of grouped queries
+        agent_stats = Agent.objects.stats_by_agent(start_datetime, end_datetime)
+        daily_data = Agent.objects.daily_order_data_by_agent(days=30)
+        monthly_data = Agent.objects.monthly_revenue_data_by_agent(months=12)
 
-        total_orders = 0
-        total_value = Decimal("0.0")
-        total_sales = 0
-        total_no_sales = 0
+        total_orders = sum(stats["order_count"] for stats in agent_stats.values())
+        total_value = sum(
+            (stats["total_value"] for stats in agent_stats.values()), Decimal("0.0")
+        )
+        total_sales = sum(stats["sale"] for stats in agent_stats.values())
+        total_no_sales = sum(stats["no_sale"] for stats in agent_stats.values())
 
+        # Aggregate daily orders
         daily_orders_map = {}
-        monthly_revenue_map = {}
-
-        # Aggregate stats from all agents
-        for agent in agents:
-            stats = agent.get_stats(start_datetime, end_datetime)
-
-            # Accumulate stats
-            total_orders += stats["order_count"]
-            total_value += stats["total_value"]
-            total_sales += stats["sale"]
-            total_no_sales += stats["no_sale"]
-
-            # Aggregate daily orders
-            daily_data = agent.get_daily_order_data(days=30)
-            for entry in daily_data:
+        for entries in daily_data.values():
+            for entry in entries:
                 date = entry["date"]
                 daily_orders_map[date] = daily_orders_map.get(date, 0) + entry["count"]
 
-            # Aggregate monthly revenue
-            monthly_data = agent.get_monthly_revenue_data(months=12)
-            for entry in monthly_data:
+        # Aggregate monthly revenue
+        monthly_revenue_map = {}
+        for entries in monthly_data.values():
+            for entry in entries:
                 month = entry["month"]
                 monthly_revenue_map[month] = (
                     monthly_revenue_map.get(month, 0) + entry["revenue"]
@@ -228,14 +225,14 @@ class AllAgentsStatsView(OrganisorAndLoginRequiredMixin, generic.TemplateView):
         )
 
         # Compute averages for charts
-        agent_count = agents.count()
+        agent_count = len(agent_stats)
         average_daily_orders = [
             {"date": d, "average_count": c / agent_count if agent_count > 0 else 0}
-            for d, c in daily_orders_map.items()
+            for d, c in sorted(daily_orders_map.items())
         ]
         average_monthly_revenue = [
             {"month": m, "average_revenue": r / agent_count if agent_count > 0 else 0}
-            for m, r in monthly_revenue_map.items()
+            for m, r in sorted(monthly_revenue_map.items())
         ]
 
         # Pass aggregated stats and chart data to context
@@ -256,6 +253,49 @@ class AllAgentsStatsView(OrganisorAndLoginRequiredMixin, generic.TemplateView):
         return context
 
 
+# Ranks agents by revenue using the daily per-agent rollup
+class AgentLeaderboardView(OrganisorAndLoginRequiredMixin, generic.TemplateView):
+    template_name = "agents/agent_leaderboard.html"
+    period_choices = (7, 30, 90)
+    default_period = 30
+
+    def get_period(self):
+        # Returns the selected period in days, falling back to the default
+        try:
+            days = int(self.request.GET.get("days", self.default_period))
+        except ValueError:
+            return self.default_period
+        return days if days in self.period_choices else self.default_period
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        days = self.get_period()
+        context["days"] = days
+        context["period_choices"] = self.period_choices
+        context["leaderboard"] = AgentDailyStats.objects.leaderboard(days=days)
+        return context
+
+
+# JSON endpoint serving the agent leaderboard
+class AgentLeaderboardDataView(AgentLeaderboardView):
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(
+            {"days": context["days"], "leaderboard": context["leaderboard"]},
+            encoder=DjangoJSONEncoder,
+        )
+
+
+# JSON autocomplete of agents by username, name or email prefix
+class AgentAutocompleteView(OrganisorAndLoginRequiredMixin, AutocompleteMixin, View):
+
+    def get_results(self, query):
+        return Agent.objects.search(query)
+
+    def get_detail(self, agent):
+        return agent.user.username
+
+
 # Send an email to a specific client or all clients
 class SendEmailView(LoginRequiredMixin, generic.FormView):
     template_name = "agents/send_email.html"
@@ -301,43 +341,25 @@ class SendEmailView(LoginRequiredMixin, generic.FormView):
 
         if send_to_all:
             if self.request.user.is_organisor:
-                # Retrieve all clients
-                clients = Client.objects.all()
-
-                if not clients:
-                    form.add_error(None, "No clients available to send emails.")
-                    return self.form_invalid(form)
+                recipients = (
+                    Client.objects.exclude(email__isnull=True).exclude(email="").count()
+                )
 
-                recipient_list = [client.email for client in clients if client.email]
-
-                if recipient_list:
-                    send_mail(
-                        subject,
-                        message,
-                        self.request.user.email,  # From email
-                        recipient_list,  # To emails
-                    )
-                    messages.success(
-                        self.request,
-                        f"Email sent successfully to {len(recipient_list)} clients.",
-                    )
-
-                    # Create contact entries for all clients
-                    for client in clients:
-                        Contact.objects.create(
-                            client=client,
-                            reason=Contact.ReasonChoices.OTHER,
-                            description=f"An email with subject '{subject}' was sent to the client.",
-                            contact_date=now(),
-                            user=self.request.user.userprofile,
-                        )
-                else:
+                if not recipients:
                     form.add_error(None, "No valid client emails available.")
-                    messages.error(
-                        self.request,
-                        "You do not have permission to send emails to all clients.",
-                    )
                     return self.form_invalid(form)
+
+                # Recipients are streamed by the send_email_campaigns worker
+                campaign = EmailCampaign.objects.create(
+                    subject=subject,
+                    message=message,
+                    from_email=self.request.user.email,
+                    created_by=self.request.user.userprofile,
+                )
+                messages.success(
+                    self.request,
+                    f"Email campaign #{campaign.pk} to {recipients} clients has been queued.",
+                )
             else:
                 form.add_error(
                     None, "You do not have permission to send emails to all clients."
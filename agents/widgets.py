@@ -0,0 +1,28 @@
+from django import forms
+
+
+# Select for large tables that renders only the selected option; other options
+# are fetched from a JSON autocomplete endpoint by static/js/autocomplete.js
+class AutocompleteSelect(forms.Select):
+    def __init__(self, url, attrs=None):
+        attrs = {"data-autocomplete-url": url, **(attrs or {})}
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        iterator = self.choices
+        choices = []
+        if getattr(iterator, "field", None) is not None:
+            if iterator.field.empty_label is not None:
+                choices.append(("", iterator.field.empty_label))
+            selected = [pk for pk in value if pk not in (None, "")]
+            if selected:
+                try:
+                    instances = list(iterator.queryset.filter(pk__in=selected))
+                except (TypeError, ValueError):
+                    instances = []
+                choices.extend(iterator.choice(instance) for instance in instances)
+        self.choices = choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.2 on 2026-10-19 01:59
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clients", "0003_alter_client_age"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="email_key",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=django.db.models.functions.text.Lower(
+                    django.db.models.functions.text.Trim(models.F("email"))
+                ),
+                output_field=models.CharField(max_length=254, null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="client",
+            name="phone_key",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=django.db.models.functions.text.Right(
+                    django.db.models.functions.text.Replace(
+                        django.db.models.functions.text.Replace(
+                            django.db.models.functions.text.Replace(
+                                django.db.models.functions.text.Replace(
+                                    django.db.models.functions.text.Replace(
+                                        django.db.models.functions.text.Replace(
+                                            django.db.models.functions.text.Replace(
+                                                models.F("phone_number"),
+                                                models.Value(" "),
+                                                models.Value(""),
+                                            ),
+                                            models.Value("-"),
+                                            models.Value(""),
+                                        ),
+                                        models.Value("("),
+                                        models.Value(""),
+                                    ),
+                                    models.Value(")"),
+                                    models.Value(""),
+                                ),
+                                models.Value("."),
+                                models.Value(""),
+                            ),
+                            models.Value("+"),
+                            models.Value(""),
+                        ),
+                        models.Value("/"),
+                        models.Value(""),
+                    ),
+                    9,
+                ),
+                output_field=models.CharField(max_length=15, null=True),
+            ),
+        ),
+    ]
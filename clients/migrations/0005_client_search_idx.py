@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:05
+
+from django.db import migrations
+
+# Pattern-ops indexes match the LIKE 'prefix%' that startswith/istartswith emit
+# under non-C collations; they are PostgreSQL only
+SEARCH_INDEXES = {
+    "client_number_prefix_idx": '(("client_number"::text) text_pattern_ops)',
+    "client_email_key_prefix_idx": '(("email_key"::text) text_pattern_ops)',
+    "client_first_name_prefix_idx": '((UPPER("first_name"::text)) text_pattern_ops)',
+    "client_last_name_prefix_idx": '((UPPER("last_name"::text)) text_pattern_ops)',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, columns in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON clients_client {columns}"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clients", "0004_client_match_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -1,10 +1,53 @@
 import random
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Sum, F, Count
+from django.db.models import Sum, F, Count, Q
 from django.db.models.functions import TruncMonth
 from django.utils.timezone import now, timedelta
 
+from leads.matching import email_match_key, normalize_email, phone_match_key
+
+
+# Prefix searches used by the client autocomplete
+class ClientQuerySet(models.QuerySet):
+
+    def search(self, query):
+        # Matches the client number, email or name prefix; "Jan Now" matches
+        # first and last name together
+        query = query.strip()
+        condition = (
+            Q(client_number__startswith=query)
+            | Q(email_key__startswith=normalize_email(query))
+            | Q(first_name__istartswith=query)
+            | Q(last_name__istartswith=query)
+        )
+        first, _, last = query.partition(" ")
+        if last.strip():
+            condition |= Q(first_name__istartswith=first) & Q(
+                last_name__istartswith=last.strip()
+            )
+        return self.filter(condition).order_by("last_name", "first_name", "pk")
+
+
+# Manager with bulk helpers for creating clients
+class ClientManager(models.Manager.from_queryset(ClientQuerySet)):
+
+    def allocate_client_numbers(self, count):
+        # Returns `count` distinct client numbers not used by any client yet
+        numbers = set()
+        while len(numbers) < count:
+            candidates = set()
+            while len(candidates) < count - len(numbers):
+                candidates.add(self.model.generate_client_number())
+            candidates -= numbers
+            taken = set(
+                self.filter(client_number__in=candidates).values_list(
+                    "client_number", flat=True
+                )
+            )
+            numbers |= candidates - taken
+        return list(numbers)
+
 
 # Represents a client with personal details and related metrics
 class Client(models.Model):
@@ -21,6 +64,19 @@ class Client(models.Model):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     converted_date = models.DateTimeField(auto_now_add=True)
     client_number = models.CharField(max_length=20, unique=True, blank=True)
+    # Normalised keys used to find duplicate leads and clients
+    email_key = models.GeneratedField(
+        expression=email_match_key(),
+        output_field=models.CharField(max_length=254, null=True),
+        db_persist=True,
+        db_index=True,
+    )
+    phone_key = models.GeneratedField(
+        expression=phone_match_key(),
+        output_field=models.CharField(max_length=15, null=True),
+        db_persist=True,
+        db_index=True,
+    )
 
     # Client status
     status = models.CharField(
@@ -29,7 +85,10 @@ class Client(models.Model):
         default=StatusChoices.REGULAR,
     )
 
-    def generate_client_number(self):
+    objects = ClientManager()
+
+    @staticmethod
+    def generate_client_number():
         # Generates a unique client number composed of digits.
         length = 8
         return "".join(random.choices("0123456789", k=length))
@@ -1,4 +1,9 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
 from .models import Client
 
 
@@ -34,3 +39,80 @@ class ClientModelTest(TestCase):
         self.assertEqual(retrieved_client.age, 30)
         self.assertEqual(retrieved_client.email, "david@example.com")
         self.assertEqual(retrieved_client.phone_number, "123-456-7890")
+
+
+class ClientListViewTest(TestCase):
+
+    def setUp(self):
+        get_user_model().objects.create_user(
+            username="organiser", password="password", is_organisor=True
+        )
+        self.client.login(username="organiser", password="password")
+        for index in range(12):
+            Client.objects.create(first_name="Listed", last_name=str(index))
+
+    def test_fragment_keeps_search_in_pagination(self):
+        # The fragment contains only the results, with filters kept in page links
+        response = self.client.get(
+            reverse("clients:client-list-fragment"), {"important": "", "page": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "<html")
+        self.assertContains(response, "View Client", count=2)
+        self.assertContains(response, "important=&amp;page=1")
+
+
+class ClientAutocompleteTest(TestCase):
+
+    def setUp(self):
+        from leads.models import Agent
+
+        user = get_user_model().objects.create_user(
+            username="agent", password="password", is_organisor=False
+        )
+        Agent.objects.create(user=user)
+        self.client.login(username="agent", password="password")
+        self.jan = Client.objects.create(
+            first_name="Jan",
+            last_name="Nowak",
+            email="jan.nowak@example.com",
+            client_number="12340000",
+        )
+        Client.objects.create(
+            first_name="Janina",
+            last_name="Kowalska",
+            email="janina@example.com",
+            client_number="56780000",
+        )
+
+    def suggestions(self, query):
+        response = self.client.get(reverse("clients:client-autocomplete"), {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [result["text"] for result in response.json()["results"]]
+
+    def test_number_email_and_name_prefixes(self):
+        # Each kind of prefix finds the client; full names match across fields
+        self.assertEqual(self.suggestions("1234"), ["Jan Nowak"])
+        self.assertEqual(self.suggestions("JAN.NO"), ["Jan Nowak"])
+        self.assertEqual(self.suggestions("now"), ["Jan Nowak"])
+        self.assertEqual(self.suggestions("jan n"), ["Jan Nowak"])
+        self.assertEqual(self.suggestions("jan"), ["Janina Kowalska", "Jan Nowak"])
+        self.assertEqual(self.suggestions(""), [])
+
+    def test_order_form_cost_does_not_grow_with_clients(self):
+        # The client widget renders only the preselected client
+        url = reverse("orders:order-create")
+        params = {"client_number": self.jan.client_number}
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url, params)
+        self.assertContains(response, "Jan Nowak")
+        self.assertNotContains(response, "Janina Kowalska")
+
+        Client.objects.bulk_create(
+            Client(first_name="Bulk", last_name=str(index), client_number=str(index))
+            for index in range(30)
+        )
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url, params)
+        self.assertNotContains(response, "Bulk")
+        self.assertEqual(len(after), len(before))
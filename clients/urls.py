@@ -8,12 +8,19 @@ from .views import (
     ContactCreateView,
     ClientStatisticsView,
     AllClientsStatisticsView,
+    ClientAutocompleteView,
 )
 
 app_name = "clients"
 
 urlpatterns = [
     path("", ClientListView.as_view(), name="client-list"),
+    path(
+        "fragment/",
+        ClientListView.as_view(fragment=True),
+        name="client-list-fragment",
+    ),
+    path("autocomplete/", ClientAutocompleteView.as_view(), name="client-autocomplete"),
     path(
         "all/statistics/",
         AllClientsStatisticsView.as_view(),
@@ -4,15 +4,19 @@ import json
 
 # Django Core Imports
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.serializers.json import DjangoJSONEncoder
 from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
 from django.utils import timezone
-from django.views import generic
+from django.views import generic, View
 
 # Custom Mixins
-from agents.mixins import OrganisorAndLoginRequiredMixin
+from agents.mixins import (
+    AutocompleteMixin,
+    ExportMixin,
+    FragmentListMixin,
+    OrganisorAndLoginRequiredMixin,
+)
 
 # Forms
 from orders.forms import StatisticsFilterForm
@@ -23,11 +27,25 @@ from .models import Client, Contact
 
 
 # Displays a list of clients with search and filter functionality
-class ClientListView(LoginRequiredMixin, generic.ListView):
+class ClientListView(
+    LoginRequiredMixin, FragmentListMixin, ExportMixin, generic.ListView
+):
     model = Client
     template_name = "clients/client_list.html"
+    fragment_template_name = "clients/partials/client_list_results.html"
     context_object_name = "clients"
     paginate_by = 10
+    export_filename = "clients"
+    export_fields = (
+        ("client_number", "Client Number"),
+        ("first_name", "First Name"),
+        ("last_name", "Last Name"),
+        ("age", "Age"),
+        ("email", "Email"),
+        ("phone_number", "Phone Number"),
+        ("status", "Status"),
+        ("converted_date", "Client Since"),
+    )
 
     def get_queryset(self):
         # Returns a list of clients filtered by search and criteria
@@ -63,19 +81,7 @@ class ClientListView(LoginRequiredMixin, generic.ListView):
     def get_context_data(self, **kwargs):
         # Adds the search form and pagination to the context
         context = super().get_context_data(**kwargs)
-        queryset = self.get_queryset()
-
-        paginator = Paginator(queryset, self.paginate_by)
-        page = self.request.GET.get("page")
-
-        try:
-            clients = paginator.page(page)
-        except PageNotAnInteger:
-            clients = paginator.page(1)
-        except EmptyPage:
-            clients = paginator.page(paginator.num_pages)
-
-        context["clients"] = clients
+        context["clients"] = context["page_obj"]
         context["form"] = ClientSearchForm(self.request.GET)
         return context
 
@@ -129,10 +135,17 @@ class ClientDeleteView(LoginRequiredMixin, generic.DeleteView):
 
 
 # Displays a list of contacts for a specific client
-class ContactListView(LoginRequiredMixin, generic.ListView):
+class ContactListView(LoginRequiredMixin, ExportMixin, generic.ListView):
     model = Contact
     template_name = "clients/contact_list.html"
     context_object_name = "contacts"
+    export_filename = "contacts"
+    export_fields = (
+        ("contact_date", "Contact Date"),
+        ("reason", "Reason"),
+        ("description", "Description"),
+        ("user__user__username", "Contacted By"),
+    )
 
     def get_queryset(self):
         # Filters contacts for a specific client
@@ -375,3 +388,13 @@ class AllClientsStatisticsView(OrganisorAndLoginRequiredMixin, generic.TemplateV
                 for label in labels
             ],
         }
+
+
+# JSON autocomplete of clients by number, email or name prefix
+class ClientAutocompleteView(LoginRequiredMixin, AutocompleteMixin, View):
+
+    def get_results(self, query):
+        return Client.objects.search(query)
+
+    def get_detail(self, client):
+        return " · ".join(filter(None, [client.client_number, client.email]))
@@ -133,6 +133,10 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Uploaded files (lead imports)
+MEDIA_URL = "media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -159,3 +163,8 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = "example"
 EMAIL_HOST_PASSWORD = "example"
+
+# Organiser "send to all" campaigns: recipients claimed per chunk and
+# maximum messages sent per second (0 disables throttling)
+EMAIL_CAMPAIGN_CHUNK_SIZE = 100
+EMAIL_CAMPAIGN_RATE_LIMIT = 5
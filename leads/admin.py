@@ -1,10 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.utils import timezone
 from django.contrib import messages
 
+from .conversion import convert_leads
+from .distribution import LeadDistributor
 from .models import User, UserProfile, Agent, Lead, Category
-from clients.models import Client  # Ensure this is correctly imported
 
 
 # Custom UserAdmin
@@ -56,54 +56,75 @@ class AgentAdmin(admin.ModelAdmin):
         "no_sale_leads",
     )
 
+    def get_queryset(self, request):
+        # Annotates stats for every listed agent in the changelist query
+        return super().get_queryset(request).with_stats()
+
     def order_count(self, obj):
-        return obj.get_order_stats()["order_count"]
+        return obj.order_count
 
     order_count.short_description = "Order Count"
+    order_count.admin_order_field = "order_count"
 
     def total_revenue(self, obj):
-        return obj.get_order_stats()["total_value"]
+        return obj.total_value
 
     total_revenue.short_description = "Total Revenue"
+    total_revenue.admin_order_field = "total_value"
 
     def average_order_value(self, obj):
-        return obj.get_order_stats()["average_order_value"]
+        return obj.total_value / obj.order_count if obj.order_count > 0 else 0
 
     average_order_value.short_description = "Average Order Value"
 
     def sale_leads(self, obj):
-        return obj.get_lead_conversion_count()["sale"]
+        return obj.sale
 
     sale_leads.short_description = "Sale Leads"
+    sale_leads.admin_order_field = "sale"
 
     def no_sale_leads(self, obj):
-        return obj.get_lead_conversion_count()["no_sale"]
+        return obj.no_sale
 
     no_sale_leads.short_description = "No Sale Leads"
+    no_sale_leads.admin_order_field = "no_sale"
 
 
 # Custom Admin Action to Convert Leads
 @admin.action(description="Mark selected leads as converted")
 def mark_as_converted(modeladmin, request, queryset):
-    updated = queryset.update(is_converted=True, conversion_date=timezone.now())
-    for lead in queryset.filter(is_converted=True):
-        if lead.category and lead.category.name.lower() == "sale":
-            Client.objects.get_or_create(
-                email=lead.email,
-                defaults={
-                    "first_name": lead.first_name,
-                    "last_name": lead.last_name,
-                    "age": lead.age,
-                    "phone_number": lead.phone_number,
-                },
-            )
+    result = convert_leads(queryset.values_list("pk", flat=True))
     modeladmin.message_user(
         request,
-        f"{updated} lead(s) were successfully marked as converted.",
+        f"{len(result.converted)} lead(s) were successfully marked as converted, "
+        f"{len(result.created_clients)} new client(s) were created.",
         messages.SUCCESS,
     )
 
 
+# Builds an admin action that distributes the selected unassigned leads
+def distribute_leads_action(strategy, description):
+    @admin.action(description=description)
+    def distribute_leads(modeladmin, request, queryset):
+        report = LeadDistributor(strategy).distribute(queryset)
+        if not report:
+            modeladmin.message_user(
+                request,
+                "There are no active agents to distribute leads to.",
+                messages.WARNING,
+            )
+            return
+        assigned = sum(row["assigned"] for row in report)
+        modeladmin.message_user(
+            request,
+            f"{assigned} lead(s) were distributed across {len(report)} agent(s).",
+            messages.SUCCESS,
+        )
+
+    distribute_leads.__name__ = f"distribute_leads_{strategy}"
+    return distribute_leads
+
+
 # LeadAdmin with custom actions
 @admin.register(Lead)
 class LeadAdmin(admin.ModelAdmin):
@@ -133,7 +154,18 @@ class LeadAdmin(admin.ModelAdmin):
     )
     ordering = ("-date_created",)
     readonly_fields = ("conversion_date",)
-    actions = [mark_as_converted]
+    actions = [
+        mark_as_converted,
+        distribute_leads_action(
+            LeadDistributor.ROUND_ROBIN, "Distribute selected leads (round-robin)"
+        ),
+        distribute_leads_action(
+            LeadDistributor.LEAST_LOADED, "Distribute selected leads (least loaded)"
+        ),
+        distribute_leads_action(
+            LeadDistributor.WEIGHTED, "Distribute selected leads (by conversion rate)"
+        ),
+    ]
 
 
 # CategoryAdmin
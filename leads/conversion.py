@@ -0,0 +1,122 @@
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from agents.models import AgentDailyStats
+from clients.models import Client
+
+from .matching import normalize_email
+from .models import Category, Lead
+
+
+# Outcome of converting a batch of leads
+class ConversionResult:
+    def __init__(self):
+        self.converted = []
+        self.already_converted = 0
+        self.recategorised = []
+        self.created_clients = []
+        self.existing_clients = []
+
+
+def convert_leads(leads, category=None):
+    # Converts leads with one UPDATE and creates clients for sales in bulk
+    result = ConversionResult()
+    if isinstance(leads, Lead):
+        leads = [leads]
+    lead_ids = [lead.pk if isinstance(lead, Lead) else lead for lead in leads]
+    converted_at = now()
+
+    with transaction.atomic():
+        locked = list(
+            Lead.objects.select_for_update().filter(pk__in=lead_ids).order_by("pk")
+        )
+        pending = [lead for lead in locked if not lead.is_converted]
+        result.already_converted = len(locked) - len(pending)
+        if category is not None:
+            recategorise_converted(
+                [lead for lead in locked if lead.is_converted], category, result
+            )
+        if not pending:
+            create_clients_for_sales(result.recategorised, result)
+            return result
+
+        updates = {
+            "is_converted": True,
+            "convert": False,
+            "conversion_date": Coalesce("conversion_date", converted_at),
+        }
+        if category is not None:
+            updates["category"] = category
+        Lead.objects.filter(pk__in=[lead.pk for lead in pending]).update(**updates)
+
+        for lead in pending:
+            lead.is_converted = True
+            lead.convert = False
+            lead.conversion_date = lead.conversion_date or converted_at
+            if category is not None:
+                lead.category = category
+        result.converted = pending
+
+        AgentDailyStats.objects.record_conversions(pending)
+        create_clients_for_sales(pending + result.recategorised, result)
+    return result
+
+
+def recategorise_converted(leads, category, result):
+    # Moves already converted leads to the category and their rollup counts with them
+    changed = [lead for lead in leads if lead.category_id != category.pk]
+    if not changed:
+        return
+    Lead.objects.filter(pk__in=[lead.pk for lead in changed]).update(
+        category=category, convert=False
+    )
+    changes = []
+    for lead in changed:
+        changes.append((lead, lead.category_id))
+        lead.category = category
+        lead.convert = False
+    AgentDailyStats.objects.record_category_changes(changes)
+    result.recategorised = changed
+
+
+def create_clients_for_sales(leads, result):
+    # Bulk creates a client for every lead converted as a sale
+    sale_ids = set(Category.objects.ids_for("sale"))
+    sales = {}
+    for lead in leads:
+        if lead.category_id in sale_ids:
+            sales.setdefault(normalize_email(lead.email), lead)
+    if not sales:
+        return
+
+    existing = {
+        client.email_key: client
+        for client in Client.objects.filter(email_key__in=list(sales))
+    }
+    result.existing_clients = list(existing.values())
+    new_sales = [lead for email_key, lead in sales.items() if email_key not in existing]
+    if not new_sales:
+        return
+
+    numbers = Client.objects.allocate_client_numbers(len(new_sales))
+    clients = [
+        Client(
+            email=lead.email,
+            first_name=lead.first_name,
+            last_name=lead.last_name,
+            age=lead.age,
+            phone_number=lead.phone_number,
+            client_number=number,
+        )
+        for lead, number in zip(new_sales, numbers)
+    ]
+    # A client created concurrently with the same email is kept as it is
+    Client.objects.bulk_create(clients, ignore_conflicts=True)
+
+    allocated = set(numbers)
+    for client in Client.objects.filter(email__in=[lead.email for lead in new_sales]):
+        if client.client_number in allocated:
+            result.created_clients.append(client)
+        else:
+            result.existing_clients.append(client)
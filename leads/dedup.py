@@ -0,0 +1,178 @@
+from django.db import transaction
+from django.db.models import CharField, Min, Value
+
+from clients.models import Client, Contact
+from orders.models import Order
+
+from .models import Lead
+
+# Phone keys shorter than this are too generic to identify a person
+MIN_PHONE_KEY_LENGTH = 6
+
+
+# Groups records that share any match key, using union-find
+class DuplicateClusters:
+    def __init__(self):
+        self.parent = {}
+        self.keys = {}
+
+    def find(self, member):
+        root = self.parent.setdefault(member, member)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while member != root:
+            self.parent[member], member = root, self.parent[member]
+        return root
+
+    def union(self, members, key):
+        first = self.find(members[0])
+        for member in members[1:]:
+            root = self.find(member)
+            if root != first:
+                self.parent[root] = first
+                self.keys.setdefault(first, set()).update(self.keys.pop(root, ()))
+        self.keys.setdefault(first, set()).add(key)
+
+    def clusters(self):
+        # Returns clusters as dicts of lead ids, client ids and matching keys
+        groups = {}
+        for member in self.parent:
+            groups.setdefault(self.find(member), []).append(member)
+
+        clusters = []
+        for root, members in groups.items():
+            clusters.append(
+                {
+                    "leads": sorted(pk for kind, pk in members if kind == "lead"),
+                    "clients": sorted(pk for kind, pk in members if kind == "client"),
+                    "keys": sorted(self.keys.get(root, ())),
+                }
+            )
+        clusters.sort(key=lambda cluster: cluster["keys"])
+        return clusters
+
+
+def match_key_rows(leads=None, clients=None):
+    # One UNION ALL query over the match keys of leads and clients
+    leads = Lead.objects.all() if leads is None else leads
+    clients = Client.objects.all() if clients is None else clients
+    lead_rows = leads.annotate(
+        kind=Value("lead", output_field=CharField())
+    ).values_list("kind", "pk", "email_key", "phone_key")
+    client_rows = clients.annotate(
+        kind=Value("client", output_field=CharField())
+    ).values_list("kind", "pk", "email_key", "phone_key")
+    return lead_rows.order_by().union(client_rows.order_by(), all=True)
+
+
+def group_by_match_key(rows):
+    # Maps every match key to the (kind, pk) records carrying it
+    members_by_key = {}
+    for kind, pk, email_key, phone_key in rows:
+        member = (kind, pk)
+        if email_key:
+            members_by_key.setdefault(f"email:{email_key}", []).append(member)
+        if phone_key and len(phone_key) >= MIN_PHONE_KEY_LENGTH:
+            members_by_key.setdefault(f"phone:{phone_key}", []).append(member)
+    return members_by_key
+
+
+def find_duplicate_clusters(leads=None, clients=None):
+    # Finds duplicate leads and clients across both tables in one pass
+    members_by_key = group_by_match_key(
+        match_key_rows(leads, clients).iterator(chunk_size=2000)
+    )
+    clusters = DuplicateClusters()
+    for key, members in members_by_key.items():
+        if len(members) > 1:
+            clusters.union(members, key)
+    return clusters.clusters()
+
+
+def merge_duplicates(
+    lead_ids=(), client_ids=(), primary_lead_id=None, primary_client_id=None
+):
+    # Merges duplicate leads into one lead and duplicate clients into one client
+    lead_ids = {int(pk) for pk in lead_ids}
+    client_ids = {int(pk) for pk in client_ids}
+    if primary_lead_id is not None:
+        lead_ids.add(int(primary_lead_id))
+    if primary_client_id is not None:
+        client_ids.add(int(primary_client_id))
+
+    with transaction.atomic():
+        rows = list(
+            match_key_rows(
+                Lead.objects.filter(pk__in=lead_ids),
+                Client.objects.filter(pk__in=client_ids),
+            )
+        )
+        if len(rows) != len(lead_ids) + len(client_ids):
+            raise ValueError("Some of the selected records no longer exist.")
+        clusters = DuplicateClusters()
+        for key, members in group_by_match_key(rows).items():
+            clusters.union(members, key)
+        if len({clusters.find((kind, pk)) for kind, pk, *keys in rows}) > 1:
+            raise ValueError("The selected records do not match each other.")
+
+        merged_leads = 0
+        if primary_lead_id is not None:
+            merged_leads = merge_leads(int(primary_lead_id), lead_ids)
+        merged_clients = 0
+        if primary_client_id is not None:
+            merged_clients = merge_clients(int(primary_client_id), client_ids)
+    return merged_leads, merged_clients
+
+
+def merge_leads(primary_id, lead_ids):
+    # Fills gaps in the primary lead from its duplicates, then deletes them
+    primary = Lead.objects.get(pk=primary_id)
+    duplicates = list(
+        Lead.objects.filter(pk__in=lead_ids).exclude(pk=primary_id).order_by("pk")
+    )
+    if not duplicates:
+        return 0
+
+    comments = [primary.comment] if primary.comment else []
+    for lead in duplicates:
+        for field in ("age", "agent_id", "category_id"):
+            if getattr(primary, field) is None:
+                setattr(primary, field, getattr(lead, field))
+        if lead.comment:
+            comments.append(lead.comment)
+        if lead.is_converted and not primary.is_converted:
+            primary.is_converted = True
+            primary.conversion_date = lead.conversion_date
+    primary.comment = "\n\n".join(comments) or None
+
+    Lead.objects.filter(pk__in=[lead.pk for lead in duplicates]).delete()
+    primary.save()
+    return len(duplicates)
+
+
+def merge_clients(primary_id, client_ids):
+    # Moves orders and contacts of duplicate clients to the primary one
+    primary = Client.objects.get(pk=primary_id)
+    duplicate_ids = list(
+        Client.objects.filter(pk__in=client_ids)
+        .exclude(pk=primary_id)
+        .values_list("pk", flat=True)
+    )
+    if not duplicate_ids:
+        return 0
+
+    Order.objects.filter(client_id__in=duplicate_ids).update(client=primary)
+    Contact.objects.filter(client_id__in=duplicate_ids).update(client=primary)
+    earliest = Client.objects.filter(pk__in=client_ids).aggregate(
+        earliest=Min("converted_date")
+    )["earliest"]
+    for client in Client.objects.filter(pk__in=duplicate_ids):
+        for field in ("age", "email", "phone_number"):
+            if not getattr(primary, field):
+                setattr(primary, field, getattr(client, field))
+    Client.objects.filter(pk__in=duplicate_ids).delete()
+
+    primary.converted_date = earliest
+    primary.update_status()
+    primary.save()
+    return len(duplicate_ids)
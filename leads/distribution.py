@@ -0,0 +1,105 @@
+import heapq
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from .models import Agent, Category, Lead
+
+
+# Spreads unassigned leads over the active agents with set-based updates
+class LeadDistributor:
+    ROUND_ROBIN = "round_robin"
+    LEAST_LOADED = "least_loaded"
+    WEIGHTED = "weighted"
+    STRATEGIES = (ROUND_ROBIN, LEAST_LOADED, WEIGHTED)
+
+    def __init__(self, strategy=ROUND_ROBIN, batch_size=1000):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown distribution strategy: {strategy}")
+        self.strategy = strategy
+        self.batch_size = batch_size
+
+    def agent_loads(self):
+        # Open leads and conversion history of every active agent in one grouped query
+        sale_ids = Category.objects.ids_for("sale")
+        agents = (
+            Agent.objects.filter(user__is_active=True)
+            .annotate(
+                open_leads=Count("lead", filter=Q(lead__is_converted=False)),
+                converted=Count("lead", filter=Q(lead__is_converted=True)),
+                sales=Count(
+                    "lead",
+                    filter=Q(lead__is_converted=True, lead__category_id__in=sale_ids),
+                ),
+            )
+            .values("pk", "user__username", "open_leads", "converted", "sales")
+            .order_by("pk")
+        )
+        agents = list(agents)
+        for agent in agents:
+            # Smoothed conversion rate, so agents without history still get leads
+            agent["weight"] = (agent["sales"] + 1) / (agent["converted"] + 2)
+        return agents
+
+    def priority(self, agent, assigned):
+        # Lower values receive the next lead
+        if self.strategy == self.LEAST_LOADED:
+            return agent["open_leads"] + assigned
+        if self.strategy == self.WEIGHTED:
+            return (assigned + 1) / agent["weight"]
+        return assigned
+
+    def plan(self, lead_ids, agents):
+        # Maps agent ids to the lead ids they should receive, in lead order
+        plan = {agent["pk"]: [] for agent in agents}
+        heap = [(self.priority(agent, 0), index) for index, agent in enumerate(agents)]
+        heapq.heapify(heap)
+        for lead_id in lead_ids:
+            priority, index = heapq.heappop(heap)
+            assigned = plan[agents[index]["pk"]]
+            assigned.append(lead_id)
+            heapq.heappush(heap, (self.priority(agents[index], len(assigned)), index))
+        return plan
+
+    def distribute(self, leads=None, dry_run=False):
+        # Assigns pending leads and returns a per-agent report of the distribution
+        if leads is None:
+            leads = Lead.objects.all()
+        pending = leads.filter(agent__isnull=True, is_converted=False).order_by(
+            "date_created", "pk"
+        )
+
+        with transaction.atomic():
+            if not dry_run and connection.features.has_select_for_update_skip_locked:
+                # Leads being claimed by agents right now are left to them
+                pending = pending.select_for_update(skip_locked=True, of=("self",))
+            lead_ids = list(pending.values_list("pk", flat=True))
+            agents = self.agent_loads()
+            plan = self.plan(lead_ids, agents) if agents else {}
+
+            report = []
+            for agent in agents:
+                ids = plan[agent["pk"]]
+                assigned = len(ids)
+                if not dry_run:
+                    assigned = 0
+                    for start in range(0, len(ids), self.batch_size):
+                        assigned += Lead.objects.filter(
+                            pk__in=ids[start : start + self.batch_size],
+                            agent__isnull=True,
+                        ).update(agent_id=agent["pk"])
+                report.append(
+                    {
+                        "agent_id": agent["pk"],
+                        "username": agent["user__username"],
+                        "open_leads": agent["open_leads"],
+                        "conversion_rate": (
+                            agent["sales"] / agent["converted"] * 100
+                            if agent["converted"] > 0
+                            else None
+                        ),
+                        "assigned": assigned,
+                        "new_load": agent["open_leads"] + assigned,
+                    }
+                )
+        return report
@@ -1,8 +1,9 @@
 from django import forms
-from .models import Lead, Category
+from django.urls import reverse_lazy
+from agents.widgets import AutocompleteSelect
+from .models import Agent, Lead, Category
 from django.contrib.auth.forms import UserCreationForm, UsernameField
 from django.contrib.auth import get_user_model
-from django.db import OperationalError, ProgrammingError
 
 # Get the custom User model
 
@@ -21,6 +22,14 @@ class LeadForm(forms.ModelForm):
             "email",
             "phone_number",
         )
+        widgets = {
+            "agent": AutocompleteSelect(reverse_lazy("agents:agent-autocomplete")),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Agent labels come from the user, which the widget loads for one agent
+        self.fields["agent"].queryset = Agent.objects.select_related("user")
 
 
 class LeadAgentForm(forms.ModelForm):
@@ -60,19 +69,15 @@ class LeadCategoryUpdateForm(forms.ModelForm):
         fields = ("category", "convert")
 
 
-try:
-    CATEGORY_CHOICES = [
-        (category.name, category.name) for category in Category.objects.all()
-    ]
-except (OperationalError, ProgrammingError):
-    # If the table doesn't exist or is otherwise unavailable, use an empty list.
-    CATEGORY_CHOICES = []
+# Category choices, read from the registry each time a form is built
+def category_filter_choices():
+    return [("", "------")] + Category.objects.choices()
 
 
 # Form for filtering leads by category
 class CategoryFilterForm(forms.Form):
     category = forms.ChoiceField(
-        choices=[("", "------")] + CATEGORY_CHOICES,
+        choices=category_filter_choices,
         required=False,
     )
 
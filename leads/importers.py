@@ -0,0 +1,245 @@
+from datetime import timedelta
+from itertools import islice
+
+import openpyxl
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .matching import normalize_email
+from .models import Lead
+
+
+# Counters and per-row error report collected during a lead import
+class LeadImportResult:
+    def __init__(self):
+        self.rows_processed = 0
+        self.created = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def add_error(self, row_number, email, message, duplicate=False):
+        # Records a rejected row in the report
+        if duplicate:
+            self.duplicates += 1
+        else:
+            self.skipped += 1
+        self.errors.append({"row": row_number, "email": email, "error": message})
+
+
+# Base for importers that stream a file into the database chunk by chunk;
+# subclasses read the rows and import one chunk into a `result_class` report
+class ChunkedImporter:
+    result_class = None
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+
+    def read_rows(self, file, name=None, start_row=2):
+        # Yields (row number, values); `name` is the uploaded file name
+        raise NotImplementedError
+
+    def import_chunk(self, chunk, result):
+        raise NotImplementedError
+
+    def chunks(self, rows):
+        # Groups an iterator of rows into lists of at most `chunk_size` rows
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+# Streams an Excel sheet of leads into the database in validated chunks
+class LeadImporter(ChunkedImporter):
+    FIELDS = ("first_name", "last_name", "age", "email", "phone_number")
+    result_class = LeadImportResult
+
+    def __init__(self, category_id=None, chunk_size=1000):
+        super().__init__(chunk_size)
+        self.category_id = category_id
+        self.max_lengths = {
+            name: Lead._meta.get_field(name).max_length
+            for name in ("first_name", "last_name", "email", "phone_number")
+        }
+        self.seen_emails = set()
+
+    def read_rows(self, file, name=None, start_row=2):
+        # Yields (row number, values) from the active sheet in read-only mode
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            rows = sheet.iter_rows(min_row=start_row, values_only=True)
+            for row_number, row in enumerate(rows, start=start_row):
+                yield row_number, row
+        finally:
+            workbook.close()
+
+    def clean_row(self, row):
+        # Returns a dict of lead fields or raises ValidationError with the reason
+        values = list(row[: len(self.FIELDS)])
+        values += [None] * (len(self.FIELDS) - len(values))
+        data = {
+            name: str(value).strip() if value is not None else ""
+            for name, value in zip(self.FIELDS, values)
+        }
+        if not all(data.values()):
+            raise ValidationError("Missing required fields")
+
+        try:
+            age = float(data["age"])
+        except ValueError:
+            raise ValidationError("Age must be a number")
+        if not age.is_integer() or age < 0:
+            raise ValidationError("Age must be a whole number")
+        data["age"] = int(age)
+
+        try:
+            validate_email(data["email"])
+        except ValidationError:
+            raise ValidationError("Invalid email address")
+
+        for name, max_length in self.max_lengths.items():
+            if len(data[name]) > max_length:
+                raise ValidationError(
+                    f"{name.replace('_', ' ').capitalize()} is longer than {max_length} characters"
+                )
+        return data
+
+    def import_chunk(self, chunk, result):
+        # Validates a chunk, drops duplicates with one IN lookup and bulk inserts it
+        first_error = len(result.errors)
+        candidates = []
+        for row_number, row in chunk:
+            if not any(value not in (None, "") for value in row):
+                continue  # Blank rows, e.g. trailing formatting, are ignored
+            result.rows_processed += 1
+            try:
+                data = self.clean_row(row)
+            except ValidationError as error:
+                email = row[3] if len(row) > 3 else None
+                result.add_error(row_number, email, error.messages[0])
+                continue
+
+            email_key = normalize_email(data["email"])
+            if email_key in self.seen_emails:
+                result.add_error(
+                    row_number, data["email"], "Duplicate email in file", duplicate=True
+                )
+                continue
+            self.seen_emails.add(email_key)
+            candidates.append((row_number, data))
+
+        existing = set(
+            Lead.objects.filter(
+                email_key__in=[
+                    normalize_email(data["email"]) for row_number, data in candidates
+                ]
+            ).values_list("email_key", flat=True)
+        )
+
+        leads = []
+        for row_number, data in candidates:
+            if normalize_email(data["email"]) in existing:
+                result.add_error(
+                    row_number,
+                    data["email"],
+                    "Duplicate email in database",
+                    duplicate=True,
+                )
+                continue
+            leads.append(Lead(category_id=self.category_id, **data))
+
+        Lead.objects.bulk_create(leads, batch_size=self.chunk_size)
+        result.created += len(leads)
+        result.errors[first_error:] = sorted(
+            result.errors[first_error:], key=lambda error: error["row"]
+        )
+        return result
+
+    def run(self, file, start_row=2, result=None, on_chunk=None):
+        # Imports the whole file; `on_chunk` is called with the last row number
+        result = result or self.result_class()
+        for chunk in self.chunks(self.read_rows(file, start_row=start_row)):
+            self.import_chunk(chunk, result)
+            if on_chunk is not None:
+                on_chunk(result, chunk[-1][0])
+        return result
+
+
+def claim_next_import_job(job_model, stale_after=timedelta(minutes=5)):
+    # Picks a pending job, or a running one whose worker stopped reporting
+    with transaction.atomic():
+        job = (
+            job_model.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=job_model.StatusChoices.PENDING)
+                | Q(
+                    status=job_model.StatusChoices.RUNNING,
+                    heartbeat_at__lt=now() - stale_after,
+                )
+            )
+            .order_by("created_at")
+            .first()
+        )
+        if job is not None:
+            job.status = job_model.StatusChoices.RUNNING
+            job.heartbeat_at = now()
+            job.save(update_fields=["status", "heartbeat_at", "updated_at"])
+    return job
+
+
+def run_import_job(job, importer):
+    # Imports a job from its last committed row, one transaction per chunk,
+    # adding each chunk's result to the counters listed in `job.COUNTERS`
+    job_model = type(job)
+    running = job_model.StatusChoices.RUNNING
+
+    try:
+        with job.file.open("rb") as file:
+            rows = importer.read_rows(
+                file, name=job.file.name, start_row=job.last_row + 1
+            )
+            for chunk in importer.chunks(rows):
+                # The heartbeat is committed before the chunk starts, so a slow
+                # chunk is not mistaken for a crashed worker
+                alive = job_model.objects.filter(pk=job.pk, status=running).update(
+                    heartbeat_at=now()
+                )
+                if not alive:
+                    job.refresh_from_db()
+                    return job  # Cancelled while running
+
+                result = importer.result_class()
+                with transaction.atomic():
+                    importer.import_chunk(chunk, result)
+                    room = job_model.MAX_REPORTED_ERRORS - len(job.errors)
+                    job.errors = job.errors + result.errors[: max(room, 0)]
+                    job_model.objects.filter(pk=job.pk).update(
+                        last_row=chunk[-1][0],
+                        errors=job.errors,
+                        heartbeat_at=now(),
+                        updated_at=now(),
+                        **{
+                            name: F(name) + getattr(result, name)
+                            for name in job_model.COUNTERS
+                        },
+                    )
+    except Exception as e:
+        job_model.objects.filter(pk=job.pk, status=running).update(
+            status=job_model.StatusChoices.FAILED,
+            error_message=str(e),
+            updated_at=now(),
+        )
+    else:
+        job_model.objects.filter(pk=job.pk, status=running).update(
+            status=job_model.StatusChoices.COMPLETED, updated_at=now()
+        )
+
+    job.refresh_from_db()
+    return job
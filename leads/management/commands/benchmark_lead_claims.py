@@ -0,0 +1,92 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from leads.models import Agent, Category, Lead
+
+
+# Measures concurrent lead claiming on a throwaway test database
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent lead claiming: agents in parallel threads take "
+        "leads until the queue is empty. Runs against a temporary test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--leads", type=int, default=5000)
+        parser.add_argument("--agents", type=int, default=8)
+        parser.add_argument("--batch", type=int, default=1, help="Leads per claim.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run_benchmark(options["leads"], options["agents"], options["batch"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_benchmark(self, lead_count, agent_count, batch):
+        User = get_user_model()
+        category, _ = Category.objects.get_or_create(name="new")
+        Lead.objects.bulk_create(
+            [
+                Lead(
+                    first_name="Bench",
+                    last_name=str(index),
+                    email=f"claim.{index}@example.com",
+                    phone_number="123456789",
+                    category=category,
+                )
+                for index in range(lead_count)
+            ],
+            batch_size=1000,
+        )
+        agents = [
+            Agent.objects.create(
+                user=User.objects.create(
+                    username=f"bench_agent_{index}", is_organisor=False
+                )
+            )
+            for index in range(agent_count)
+        ]
+
+        claims = {agent.pk: [] for agent in agents}
+        errors = []
+
+        def work(agent):
+            try:
+                while True:
+                    leads = Lead.objects.claim_for_agent(agent, count=batch)
+                    if not leads:
+                        return
+                    claims[agent.pk].extend(lead.pk for lead in leads)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(agent,)) for agent in agents]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if errors:
+            raise CommandError(f"{len(errors)} worker(s) failed: {errors[0]}")
+
+        claimed = [pk for pks in claims.values() for pk in pks]
+        if len(claimed) != len(set(claimed)):
+            raise CommandError("A lead was claimed by more than one agent.")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(claimed)} leads claimed by {agent_count} agents "
+                f"(batch of {batch}) in {elapsed:.2f}s: "
+                f"{len(claimed) / elapsed:,.0f} leads/s, no double claims."
+            )
+        )
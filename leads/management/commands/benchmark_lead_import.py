@@ -0,0 +1,80 @@
+import tempfile
+import time
+
+import openpyxl
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from leads.importers import LeadImporter
+from leads.models import Category
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+# Measures lead import throughput on a generated workbook
+class Command(BaseCommand):
+    help = "Benchmark the Excel lead import and report rows per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--duplicate-every",
+            type=int,
+            default=50,
+            help="Repeat an earlier email every N rows to exercise deduplication.",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as file:
+            started = time.perf_counter()
+            self.write_workbook(file.name, rows, options["duplicate_every"])
+            self.stdout.write(
+                f"Generated {rows} rows in {time.perf_counter() - started:.2f}s"
+            )
+
+            category, _ = Category.objects.get_or_create(name="new")
+            importer = LeadImporter(
+                category_id=category.pk, chunk_size=options["chunk_size"]
+            )
+            started = time.perf_counter()
+            try:
+                # The benchmark never keeps the generated leads
+                with transaction.atomic():
+                    result = importer.run(file.name)
+                    elapsed = time.perf_counter() - started
+                    raise RollbackBenchmark
+            except RollbackBenchmark:
+                pass
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.created} leads "
+                f"({result.duplicates} duplicates, {result.skipped} skipped) "
+                f"in {elapsed:.2f}s: {result.rows_processed / elapsed:,.0f} rows/s"
+            )
+        )
+
+    def write_workbook(self, path, rows, duplicate_every):
+        # Writes a synthetic lead sheet with the upload column layout
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(["First Name", "Last Name", "Age", "Email", "Phone Number"])
+        for index in range(rows):
+            email_index = (
+                index - 1 if duplicate_every and index % duplicate_every == 0 else index
+            )
+            sheet.append(
+                [
+                    "Bench",
+                    f"Lead {index}",
+                    20 + index % 50,
+                    f"benchmark.{email_index}@example.com",
+                    f"{500000000 + index}",
+                ]
+            )
+        workbook.save(path)
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.distribution import LeadDistributor
+from leads.models import Category, Lead
+
+
+# Assigns every unassigned, unconverted lead to an agent in bulk
+class Command(BaseCommand):
+    help = "Distribute unassigned leads across active agents."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strategy",
+            choices=LeadDistributor.STRATEGIES,
+            default=LeadDistributor.ROUND_ROBIN,
+            help="round_robin, least_loaded (by open leads) or weighted (by conversion rate).",
+        )
+        parser.add_argument(
+            "--category",
+            help="Only distribute leads in this category, e.g. 'new'.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the planned distribution without assigning anything.",
+        )
+
+    def handle(self, *args, **options):
+        leads = Lead.objects.all()
+        if options["category"]:
+            leads = leads.filter(
+                category_id__in=Category.objects.ids_for(options["category"])
+            )
+
+        report = LeadDistributor(options["strategy"]).distribute(
+            leads, dry_run=options["dry_run"]
+        )
+        if not report:
+            raise CommandError("There are no active agents to distribute leads to.")
+
+        self.stdout.write(
+            f"{'Agent':<20} {'Open leads':>10} {'Conv. rate':>10} "
+            f"{'Assigned':>10} {'New load':>10}"
+        )
+        for row in report:
+            rate = row["conversion_rate"]
+            rate = f"{rate:.1f}%" if rate is not None else "-"
+            self.stdout.write(
+                f"{row['username']:<20} {row['open_leads']:>10} {rate:>10} "
+                f"{row['assigned']:>10} {row['new_load']:>10}"
+            )
+
+        assigned = sum(row["assigned"] for row in report)
+        if options["dry_run"]:
+            self.stdout.write(
+                self.style.WARNING(f"Dry run: {assigned} lead(s) would be assigned.")
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Assigned {assigned} lead(s) across {len(report)} agent(s)."
+                )
+            )
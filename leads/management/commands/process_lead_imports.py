@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from leads.importers import LeadImporter, claim_next_import_job, run_import_job
+from leads.models import Category, LeadImportJob
+
+
+# Worker process that runs background lead imports
+class Command(BaseCommand):
+    help = "Process queued lead import jobs, resuming crashed ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is waiting instead of polling forever.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=5.0)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_import_job(LeadImportJob)
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(
+                f"Processing lead import #{job.pk} from row {job.last_row + 1}"
+            )
+            importer = LeadImporter(
+                category_id=Category.objects.id_for("new"),
+                chunk_size=options["chunk_size"],
+            )
+            job = run_import_job(job, importer)
+            self.stdout.write(
+                f"Lead import #{job.pk} {job.status.lower()}: "
+                f"{job.created} created, {job.skipped} skipped, "
+                f"{job.duplicates} duplicates."
+            )
@@ -0,0 +1,27 @@
+from django.db.models import F, Value
+from django.db.models.functions import Lower, Replace, Right, Trim
+
+# Trailing digits compared for phone numbers; Polish numbers have nine, so
+# country codes and "00" prefixes are dropped
+PHONE_MATCH_DIGITS = 9
+
+# Formatting characters stripped from phone numbers before matching
+PHONE_SEPARATORS = " -().+/"
+
+
+def email_match_key(field="email"):
+    # Database expression for a case-insensitive email match key
+    return Lower(Trim(F(field)))
+
+
+def phone_match_key(field="phone_number"):
+    # Database expression for the canonical digits of a phone number
+    digits = F(field)
+    for separator in PHONE_SEPARATORS:
+        digits = Replace(digits, Value(separator), Value(""))
+    return Right(digits, PHONE_MATCH_DIGITS)
+
+
+def normalize_email(value):
+    # Python counterpart of email_match_key for values not yet saved
+    return (value or "").strip().lower()
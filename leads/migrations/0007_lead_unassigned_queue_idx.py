@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-19 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leads", "0006_leadimportjob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                condition=models.Q(("agent__isnull", True)),
+                fields=["category", "date_created"],
+                name="lead_unassigned_queue_idx",
+            ),
+        ),
+    ]
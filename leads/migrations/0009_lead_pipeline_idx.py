@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leads", "0008_lead_match_keys"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                fields=["category", "-date_created", "-id"], name="lead_pipeline_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:13
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeat_at(apps, schema_editor):
+    # Jobs running during the upgrade last reported in at their last update
+    LeadImportJob = apps.get_model("leads", "LeadImportJob")
+    LeadImportJob.objects.filter(status="Running").update(heartbeat_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leads", "0009_lead_pipeline_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leadimportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeat_at, migrations.RunPython.noop),
+    ]
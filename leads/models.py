@@ -1,11 +1,18 @@
-from django.db import models
-from django.db.models.signals import post_save, post_migrate
+import threading
+import time
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save, post_migrate
 from django.contrib.auth.models import AbstractUser
 from django.dispatch import receiver
-from django.db.models import Count, F, Sum
-from django.db.models.functions import TruncDay, TruncMonth
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth
 from django.utils.timezone import now, timedelta
 from django.apps import apps
+from django.utils.translation import gettext_lazy as _
+
+from .matching import email_match_key, phone_match_key
 
 
 # Custom User model with roles
@@ -22,30 +29,181 @@ class UserProfile(models.Model):
         return self.user.username
 
 
-# Agent model linked to User, with custom order stats methods
-class Agent(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+# Queryset with database-side order and lead conversion stats for agents
+class AgentQuerySet(models.QuerySet):
 
-    def __str__(self):
-        return self.user.email
+    def search(self, query):
+        # Matches a prefix of the agent's username, name or email
+        query = query.strip()
+        return (
+            self.select_related("user")
+            .filter(
+                Q(user__username__istartswith=query)
+                | Q(user__email__istartswith=query)
+                | Q(user__first_name__istartswith=query)
+                | Q(user__last_name__istartswith=query)
+            )
+            .order_by("user__email", "pk")
+        )
 
-    def get_order_stats(self, start_date=None, end_date=None):
-        # Calculate order stats (count, total value, average) for the agent
-        orders = self.orders.all()
+    def with_stats(self, start_date=None, end_date=None):
+        # Annotates order count, order value and conversions in a single query
+        OrderProduct = apps.get_model("orders", "OrderProduct")
+        Order = apps.get_model("orders", "Order")
+
+        orders = Order.objects.filter(agent=OuterRef("pk"))
+        order_products = OrderProduct.objects.filter(order__agent=OuterRef("pk"))
+        leads = Lead.objects.filter(agent=OuterRef("pk"), is_converted=True)
 
         if start_date:
             orders = orders.filter(date_created__gte=start_date)
+            order_products = order_products.filter(order__date_created__gte=start_date)
+            leads = leads.filter(conversion_date__gte=start_date)
         if end_date:
             orders = orders.filter(date_created__lte=end_date)
+            order_products = order_products.filter(order__date_created__lte=end_date)
+            leads = leads.filter(conversion_date__lte=end_date)
+
+        order_count = (
+            orders.order_by()
+            .values("agent")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        total_value = (
+            order_products.order_by()
+            .values("order__agent")
+            .annotate(total=Sum(F("product_price") * F("quantity")))
+            .values("total")
+        )
+        conversions = leads.order_by().values("agent")
+        sale_ids = Category.objects.ids_for("sale")
+        no_sale_ids = Category.objects.ids_for("no sale")
+
+        value_field = models.DecimalField(max_digits=14, decimal_places=2)
+        return self.annotate(
+            order_count=Coalesce(Subquery(order_count), 0),
+            total_value=Coalesce(
+                Subquery(total_value, output_field=value_field),
+                Value(Decimal("0")),
+                output_field=value_field,
+            ),
+            sale=Coalesce(
+                Subquery(
+                    conversions.annotate(
+                        count=Count("id", filter=Q(category_id__in=sale_ids))
+                    ).values("count")
+                ),
+                0,
+            ),
+            no_sale=Coalesce(
+                Subquery(
+                    conversions.annotate(
+                        count=Count("id", filter=Q(category_id__in=no_sale_ids))
+                    ).values("count")
+                ),
+                0,
+            ),
+        )
+
+    def stats_by_agent(self, start_date=None, end_date=None):
+        # Returns a mapping of agent id to stats for every agent in the queryset
+        rows = self.with_stats(start_date, end_date).values(
+            "pk", "order_count", "total_value", "sale", "no_sale"
+        )
+        return {row["pk"]: build_agent_stats(row) for row in rows}
+
+
+def build_agent_stats(row):
+    # Shapes annotated values into the stats dictionary used by views and admin
+    order_count = row["order_count"]
+    total_value = row["total_value"]
+    return {
+        "order_count": order_count,
+        "total_value": total_value,
+        "average_order_value": total_value / order_count if order_count > 0 else 0,
+        "sale": row["sale"],
+        "no_sale": row["no_sale"],
+    }
+
+
+# Manages set-based statistics for many agents at once
+class AgentManager(models.Manager.from_queryset(AgentQuerySet)):
+
+    def daily_order_data_by_agent(self, days=7):
+        # Groups paid orders of the last `days` days by agent and day
+        Order = apps.get_model("orders", "Order")
+        today = now().date()
+        start_date = today - timedelta(days=days - 1)
+
+        rows = (
+            Order.objects.filter(
+                agent__isnull=False,
+                status="Paid",
+                date_created__date__range=[start_date, today],
+            )
+            .annotate(day=TruncDay("date_created"))
+            .values("agent", "day")
+            .annotate(order_count=Count("id"))
+            .order_by("day")
+        )
+
+        daily_data = {}
+        for row in rows:
+            daily_data.setdefault(row["agent"], []).append(
+                {"date": row["day"].strftime("%Y-%m-%d"), "count": row["order_count"]}
+            )
+        return daily_data
+
+    def monthly_revenue_data_by_agent(self, months=6):
+        # Groups paid order revenue of the last `months` months by agent and month
+        Order = apps.get_model("orders", "Order")
+        today = now().date()
+        start_month = today.replace(day=1) - timedelta(days=30 * (months - 1))
+
+        rows = (
+            Order.objects.filter(
+                agent__isnull=False,
+                status="Paid",
+                date_created__date__gte=start_month,
+            )
+            .annotate(month=TruncMonth("date_created"))
+            .values("agent", "month")
+            .annotate(
+                monthly_revenue=Sum(
+                    F("order_products__product_price") * F("order_products__quantity")
+                )
+            )
+            .order_by("month")
+        )
+
+        monthly_data = {}
+        for row in rows:
+            monthly_data.setdefault(row["agent"], []).append(
+                {
+                    "month": row["month"].strftime("%Y-%m"),
+                    "revenue": float(row["monthly_revenue"] or 0),
+                }
+            )
+        return monthly_data
 
-        order_count = orders.count()
-        total_value = sum(order.total_price for order in orders)
-        average_order_value = total_value / order_count if order_count > 0 else 0
 
+# Agent model linked to User, with custom order stats methods
+class Agent(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+
+    objects = AgentManager()
+
+    def __str__(self):
+        return self.user.email
+
+    def get_order_stats(self, start_date=None, end_date=None):
+        # Calculate order stats (count, total value, average) for the agent
+        stats = self.get_stats(start_date, end_date)
         return {
-            "order_count": order_count,
-            "total_value": total_value,
-            "average_order_value": average_order_value,
+            "order_count": stats["order_count"],
+            "total_value": stats["total_value"],
+            "average_order_value": stats["average_order_value"],
         }
 
     def get_daily_order_data(self, days=7):
@@ -97,30 +255,59 @@ class Agent(models.Model):
 
     def get_lead_conversion_count(self, start_date=None, end_date=None):
         # Calculate lead conversion count for the agent within the date range
-        leads = Lead.objects.filter(agent=self, is_converted=True)
-
-        if start_date:
-            leads = leads.filter(conversion_date__gte=start_date)
-        if end_date:
-            leads = leads.filter(conversion_date__lte=end_date)
-
-        sale_count = leads.filter(category__name__iexact="sale").count()
-        no_sale_count = leads.filter(category__name__iexact="no sale").count()
-
+        stats = self.get_stats(start_date, end_date)
         return {
-            "sale": sale_count,
-            "no_sale": no_sale_count,
+            "sale": stats["sale"],
+            "no_sale": stats["no_sale"],
         }
 
     def get_stats(self, start_date=None, end_date=None):
-        # Aggregate order stats and lead conversion stats for the agent
-        order_stats = self.get_order_stats(start_date, end_date)
-        lead_conversion_stats = self.get_lead_conversion_count(start_date, end_date)
+        # Aggregate order stats and lead conversion stats for the agent in one query
+        return Agent.objects.filter(pk=self.pk).stats_by_agent(start_date, end_date)[
+            self.pk
+        ]
 
-        return {
-            **order_stats,
-            **lead_conversion_stats,
-        }
+
+# Manages lead assignment queries
+class LeadManager(models.Manager):
+
+    def claim_for_agent(self, agent, count=1):
+        # Atomically assigns up to `count` of the oldest unassigned new leads
+        category_id = Category.objects.id_for("new")
+        if category_id is None:
+            return []
+        queue = self.filter(agent__isnull=True, category_id=category_id).order_by(
+            "date_created", "pk"
+        )
+
+        claimed_ids = []
+        with transaction.atomic():
+            if connection.features.has_select_for_update_skip_locked:
+                # Rows locked by a concurrent claim are skipped, not waited for
+                claimed_ids = list(
+                    queue.select_for_update(skip_locked=True).values_list(
+                        "pk", flat=True
+                    )[:count]
+                )
+                self.filter(pk__in=claimed_ids).update(agent=agent)
+            else:
+                # Fallback: a conditional UPDATE only wins rows still unassigned
+                while len(claimed_ids) < count:
+                    candidates = list(
+                        queue.exclude(pk__in=claimed_ids).values_list("pk", flat=True)[
+                            : count - len(claimed_ids)
+                        ]
+                    )
+                    if not candidates:
+                        break
+                    self.filter(pk__in=candidates, agent__isnull=True).update(
+                        agent=agent
+                    )
+                    claimed_ids += self.filter(
+                        pk__in=candidates, agent=agent
+                    ).values_list("pk", flat=True)
+
+        return list(self.filter(pk__in=claimed_ids).order_by("date_created", "pk"))
 
 
 # Lead model for potential clients
@@ -143,6 +330,35 @@ class Lead(models.Model):
     convert = models.BooleanField(default=False)
     conversion_date = models.DateTimeField(null=True, blank=True)
     comment = models.TextField(blank=True, null=True)
+    # Normalised keys used to find duplicate leads and clients
+    email_key = models.GeneratedField(
+        expression=email_match_key(),
+        output_field=models.CharField(max_length=254),
+        db_persist=True,
+        db_index=True,
+    )
+    phone_key = models.GeneratedField(
+        expression=phone_match_key(),
+        output_field=models.CharField(max_length=15),
+        db_persist=True,
+        db_index=True,
+    )
+
+    objects = LeadManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["category", "date_created"],
+                condition=Q(agent__isnull=True),
+                name="lead_unassigned_queue_idx",
+            ),
+            # Keyset pagination of pipeline columns
+            models.Index(
+                fields=["category", "-date_created", "-id"],
+                name="lead_pipeline_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -160,19 +376,166 @@ class Lead(models.Model):
             previous = Lead.objects.get(pk=self.pk)
             self._is_converted_changed = not previous.is_converted and self.is_converted
         else:
+            previous = None
             self._is_converted_changed = False  # New instance, no state change possible
+        # State before the save, moved out of the agent daily rollup after it
+        self._previous = previous
 
         super().save(*args, **kwargs)
 
 
+# Seconds the category registry is trusted; renames and deletions made by
+# other processes show up after this
+CATEGORY_REGISTRY_TIMEOUT = 300
+
+
+# Process-wide registry of categories, so hot paths can filter by id without joins
+class CategoryManager(models.Manager):
+    _registry = None
+    _expires = 0
+    _lock = threading.Lock()
+
+    def registry(self):
+        # Returns {pk: name} for all categories, loading it on first use and
+        # again once it expires
+        registry = CategoryManager._registry
+        if registry is None or CategoryManager._expires <= time.monotonic():
+            with CategoryManager._lock:
+                registry = CategoryManager._registry
+                if registry is None or CategoryManager._expires <= time.monotonic():
+                    registry = dict(self.order_by("pk").values_list("pk", "name"))
+                    CategoryManager._registry = registry
+                    CategoryManager._expires = (
+                        time.monotonic() + CATEGORY_REGISTRY_TIMEOUT
+                    )
+        return registry
+
+    def clear_registry(self):
+        CategoryManager._registry = None
+
+    def id_for(self, name):
+        # Id of the category with exactly this name, or None. A miss is
+        # checked against the table, since another process may have added it.
+        for pk, category_name in self.registry().items():
+            if category_name == name:
+                return pk
+        pk = self.filter(name=name).order_by("pk").values_list("pk", flat=True).first()
+        if pk is not None:
+            self.clear_registry()
+        return pk
+
+    def ids_for(self, name):
+        # Ids of all categories matching the name case-insensitively. A miss
+        # is checked against the table, as in id_for.
+        lowered = name.lower()
+        ids = [
+            pk
+            for pk, category_name in self.registry().items()
+            if category_name.lower() == lowered
+        ]
+        if not ids:
+            ids = list(
+                self.filter(name__iexact=name)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            if ids:
+                self.clear_registry()
+        return ids
+
+    def name_for(self, pk):
+        # Name of a category id, or None; a miss is checked against the table
+        name = self.registry().get(pk)
+        if name is None and pk is not None:
+            name = self.filter(pk=pk).values_list("name", flat=True).first()
+            if name is not None:
+                self.clear_registry()
+        return name
+
+    def choices(self):
+        # (name, name) pairs for choice fields, in creation order
+        return [(name, name) for name in self.registry().values()]
+
+
 # Category model for categorizing leads
 class Category(models.Model):
     name = models.CharField(max_length=30)
 
+    objects = CategoryManager()
+
     def __str__(self):
         return self.name
 
 
+# Status, resume point, heartbeat and report shared by background file imports;
+# subclasses add the file field and their own counters
+class ImportJob(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = "Pending", _("Pending")
+        RUNNING = "Running", _("Running")
+        COMPLETED = "Completed", _("Completed")
+        FAILED = "Failed", _("Failed")
+        CANCELLED = "Cancelled", _("Cancelled")
+
+    MAX_REPORTED_ERRORS = 500
+    # Counters the worker adds each chunk's result to, in display order
+    COUNTERS = ("rows_processed", "skipped")
+
+    created_by = models.ForeignKey(
+        UserProfile, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    # Last file row whose chunk has been committed; resume point
+    last_row = models.PositiveIntegerField(default=1)
+    rows_processed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Refreshed by the worker before and after every chunk; a running job
+    # whose heartbeat is older than the stale limit is claimed again
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def is_finished(self):
+        return self.status in (
+            self.StatusChoices.COMPLETED,
+            self.StatusChoices.FAILED,
+            self.StatusChoices.CANCELLED,
+        )
+
+    def progress(self):
+        # Returns the job counters in a JSON-serializable form
+        return {
+            "id": self.pk,
+            "status": self.status,
+            **{name: getattr(self, name) for name in self.COUNTERS},
+            "last_row": self.last_row,
+            "error_message": self.error_message,
+            "is_finished": self.is_finished,
+        }
+
+
+# Background Excel import of leads, processed chunk by chunk by a worker
+class LeadImportJob(ImportJob):
+    COUNTERS = ("rows_processed", "created", "skipped", "duplicates")
+
+    file = models.FileField(upload_to="lead_imports/")
+    created = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Lead import #{self.pk} ({self.status})"
+
+
 # Signal to create user profile on user creation
 @receiver(post_save, sender=User)
 def post_user_created_signal(sender, instance, created, **kwargs):
@@ -184,6 +547,15 @@ def post_user_created_signal(sender, instance, created, **kwargs):
             instance.save()
 
 
+# Signal to drop the category registry whenever a category changes
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def clear_category_registry(sender, **kwargs):
+    Category.objects.clear_registry()
+    # Also clear after commit, in case another thread reloaded it in between
+    transaction.on_commit(Category.objects.clear_registry)
+
+
 # Signal to create default categories after migrations
 def create_default_categories(sender, **kwargs):
     Category = apps.get_model("leads", "Category")
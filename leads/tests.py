@@ -1,7 +1,30 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Lead, Category, Agent
+from agents.models import AgentDailyStats
+from clients.models import Client
+from orders.models import Order
+from .conversion import convert_leads
+from .dedup import find_duplicate_clusters
+from .distribution import LeadDistributor
+from .forms import CategoryFilterForm
+from .models import Lead, Category, Agent, LeadImportJob
+from .views import LeadPipelineColumnView
 
 User = get_user_model()
 
@@ -79,3 +102,779 @@ class LeadDeleteViewTests(TestCase):
         self.assertNotContains(
             response, "Jane Doe"
         )  # Ensure the deleted lead is no longer displayed
+
+
+class AgentStatsTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up an agent with orders of different statuses and converted leads.
+        """
+        from clients.models import Client
+        from orders.models import Order, OrderProduct
+
+        user = User.objects.create_user(
+            username="agent", password="password", is_organisor=False
+        )
+        self.agent = Agent.objects.create(user=user)
+        customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        for status, price in (("Paid", "10.50"), ("Pending", "4.25")):
+            order = Order.objects.create(
+                client=customer, agent=self.agent, status=status
+            )
+            OrderProduct.objects.create(
+                order=order, product_name="Item", product_price=price, quantity=2
+            )
+        sale, created = Category.objects.get_or_create(name="sale")
+        no_sale, created = Category.objects.get_or_create(name="no sale")
+        for index, category in enumerate((sale, sale, no_sale)):
+            Lead.objects.create(
+                first_name="Lead",
+                last_name=str(index),
+                email=f"lead{index}@example.com",
+                phone_number="123456789",
+                agent=self.agent,
+                category=category,
+                is_converted=True,
+            )
+
+    def test_get_stats_in_one_query(self):
+        """
+        Test that agent stats are computed in the database with a single query.
+        """
+        Category.objects.registry()  # Categories are served from the registry
+        with self.assertNumQueries(1):
+            stats = self.agent.get_stats()
+
+        self.assertEqual(stats["order_count"], 2)
+        self.assertEqual(stats["total_value"], Decimal("29.50"))
+        self.assertEqual(stats["average_order_value"], Decimal("14.75"))
+        self.assertEqual(stats["sale"], 2)
+        self.assertEqual(stats["no_sale"], 1)
+
+    def test_stats_by_agent_batch(self):
+        """
+        Test that the batch form returns stats for agents without any activity.
+        """
+        other = Agent.objects.create(
+            user=User.objects.create_user(username="other", is_organisor=False)
+        )
+        Category.objects.registry()  # Categories are served from the registry
+        with self.assertNumQueries(1):
+            stats = Agent.objects.stats_by_agent()
+
+        self.assertEqual(stats[self.agent.pk]["order_count"], 2)
+        self.assertEqual(stats[other.pk]["order_count"], 0)
+        self.assertEqual(stats[other.pk]["total_value"], Decimal("0"))
+        self.assertEqual(stats[other.pk]["average_order_value"], 0)
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class LeadUploadViewTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """
+        Set up an organisor, the default category and one existing lead.
+        """
+        self.organisor_user = User.objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.category, created = Category.objects.get_or_create(name="new")
+        Lead.objects.create(
+            first_name="Existing",
+            last_name="Lead",
+            age=40,
+            email="existing@example.com",
+            phone_number="111222333",
+        )
+        self.client.login(username="organisor", password="password")
+
+    def build_workbook(self, rows):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["First Name", "Last Name", "Age", "Email", "Phone Number"])
+        for row in rows:
+            sheet.append(row)
+        file = BytesIO()
+        workbook.save(file)
+        file.seek(0)
+        file.name = "leads.xlsx"
+        return file
+
+    def test_upload_reports_each_rejected_row(self):
+        """
+        Test that the upload is queued and the worker reports every rejected row.
+        """
+        file = self.build_workbook(
+            [
+                ["Anna", "Nowak", 30, "anna@example.com", 123456789],
+                ["Anna", "Copy", 31, "anna@example.com", "987654321"],
+                ["Old", "Lead", 40, "existing@example.com", "111222333"],
+                ["No", "Age", None, "no.age@example.com", "555666777"],
+                ["Bad", "Email", 25, "not-an-email", "555666777"],
+            ]
+        )
+        response = self.client.post(reverse("leads:lead-upload"), {"file": file})
+        job = LeadImportJob.objects.get()
+        self.assertRedirects(
+            response, reverse("leads:lead-import-detail", kwargs={"pk": job.pk})
+        )
+        self.assertEqual(Lead.objects.count(), 1)
+
+        call_command("process_lead_imports", "--once", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, LeadImportJob.StatusChoices.COMPLETED)
+        self.assertEqual(job.created, 1)
+        self.assertEqual(job.duplicates, 2)
+        self.assertEqual(job.skipped, 2)
+        self.assertEqual([error["row"] for error in job.errors], [3, 4, 5, 6])
+
+        lead = Lead.objects.get(email="anna@example.com")
+        self.assertEqual(lead.category, self.category)
+        self.assertEqual(lead.phone_number, "123456789")
+
+        response = self.client.get(
+            reverse("leads:lead-import-status", kwargs={"pk": job.pk})
+        )
+        self.assertEqual(response.json()["created"], 1)
+
+    def test_interrupted_job_resumes_after_last_committed_chunk(self):
+        """
+        Test that a crashed job is picked up again from its last committed row.
+        """
+        file = self.build_workbook(
+            [
+                [f"Lead{index}", "Test", 30, f"lead{index}@example.com", "123"]
+                for index in range(5)
+            ]
+        )
+        job = LeadImportJob.objects.create(
+            file=SimpleUploadedFile("leads.xlsx", file.read()),
+            status=LeadImportJob.StatusChoices.RUNNING,
+            last_row=4,
+            rows_processed=3,
+        )
+        LeadImportJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=now() - timedelta(hours=1)
+        )
+
+        call_command("process_lead_imports", "--once", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, LeadImportJob.StatusChoices.COMPLETED)
+        self.assertEqual(job.rows_processed, 5)
+        self.assertEqual(
+            sorted(
+                Lead.objects.filter(last_name="Test").values_list("email", flat=True)
+            ),
+            ["lead3@example.com", "lead4@example.com"],
+        )
+
+    def test_running_job_is_only_reclaimed_once_its_heartbeat_stops(self):
+        """
+        Test that a job claimed long ago is left alone while its worker reports in.
+        """
+        from .importers import claim_next_import_job
+
+        job = LeadImportJob.objects.create(
+            file=SimpleUploadedFile("leads.xlsx", self.build_workbook([]).read()),
+            status=LeadImportJob.StatusChoices.RUNNING,
+        )
+        LeadImportJob.objects.filter(pk=job.pk).update(
+            updated_at=now() - timedelta(hours=1), heartbeat_at=now()
+        )
+        self.assertIsNone(claim_next_import_job(LeadImportJob))
+
+        LeadImportJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=now() - timedelta(minutes=10)
+        )
+        self.assertEqual(claim_next_import_job(LeadImportJob), job)
+
+
+class LeadClaimTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up an agent and a queue of unassigned new leads.
+        """
+        self.agent_user = User.objects.create_user(
+            username="agent", password="password", is_organisor=False
+        )
+        self.agent = Agent.objects.create(user=self.agent_user)
+        self.category, created = Category.objects.get_or_create(name="new")
+        self.leads = [
+            Lead.objects.create(
+                first_name="Lead",
+                last_name=str(index),
+                email=f"queue{index}@example.com",
+                phone_number="123456789",
+                category=self.category,
+            )
+            for index in range(4)
+        ]
+        self.client.login(username="agent", password="password")
+
+    def test_claim_takes_oldest_unassigned_leads(self):
+        """
+        Test that a batch claim assigns the oldest leads and never reassigns them.
+        """
+        other = Agent.objects.create(
+            user=User.objects.create_user(username="other", is_organisor=False)
+        )
+        first = Lead.objects.claim_for_agent(self.agent, count=3)
+        second = Lead.objects.claim_for_agent(other, count=3)
+
+        self.assertEqual(
+            [lead.pk for lead in first], [lead.pk for lead in self.leads[:3]]
+        )
+        self.assertEqual([lead.pk for lead in second], [self.leads[3].pk])
+        self.assertEqual(Lead.objects.claim_for_agent(other), [])
+
+    def test_agent_takes_leads_from_list_view(self):
+        """
+        Test that an agent can take several leads at once from the lead list.
+        """
+        response = self.client.post(reverse("leads:lead-list"), {"count": 2})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Lead.objects.filter(agent=self.agent).count(), 2)
+
+
+class LeadDistributionTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up three agents and a queue of unassigned leads.
+        """
+        self.agents = [
+            Agent.objects.create(
+                user=User.objects.create_user(
+                    username=f"agent{index}", is_organisor=False
+                )
+            )
+            for index in range(3)
+        ]
+        self.category, created = Category.objects.get_or_create(name="new")
+        self.sale, created = Category.objects.get_or_create(name="Sale")
+        self.leads = [
+            self.create_lead(f"pending{index}", category=self.category)
+            for index in range(9)
+        ]
+
+    def create_lead(self, name, **fields):
+        return Lead.objects.create(
+            first_name="Lead",
+            last_name=name,
+            email=f"{name}@example.com",
+            phone_number="123456789",
+            **fields,
+        )
+
+    def assigned_counts(self):
+        return [
+            Lead.objects.filter(agent=agent, last_name__startswith="pending").count()
+            for agent in self.agents
+        ]
+
+    def test_round_robin_spreads_leads_evenly(self):
+        """
+        Test that round-robin gives every agent the same number of leads.
+        """
+        LeadDistributor(LeadDistributor.ROUND_ROBIN).distribute()
+        self.assertEqual(self.assigned_counts(), [3, 3, 3])
+        self.assertEqual(
+            Lead.objects.filter(pk=self.leads[0].pk).values_list("agent", flat=True)[0],
+            self.agents[0].pk,
+        )
+
+    def test_least_loaded_fills_up_lighter_agents_first(self):
+        """
+        Test that agents with more open leads receive fewer new ones.
+        """
+        for index in range(6):
+            self.create_lead(f"open{index}", agent=self.agents[0])
+        LeadDistributor(LeadDistributor.LEAST_LOADED).distribute()
+        self.assertEqual(self.assigned_counts(), [0, 5, 4])
+
+    def test_weighted_favours_higher_conversion_rate(self):
+        """
+        Test that agents who convert more leads receive a larger share.
+        """
+        for index in range(4):
+            self.create_lead(
+                f"won{index}",
+                agent=self.agents[0],
+                category=self.sale,
+                is_converted=True,
+            )
+        LeadDistributor(LeadDistributor.WEIGHTED).distribute()
+        counts = self.assigned_counts()
+        self.assertEqual(sum(counts), 9)
+        self.assertGreater(counts[0], counts[1])
+
+    def test_dry_run_reports_without_assigning(self):
+        """
+        Test that the command's dry run reports the plan and changes nothing.
+        """
+        out = StringIO()
+        call_command("distribute_leads", "--dry-run", "--category", "new", stdout=out)
+        self.assertIn("9 lead(s) would be assigned", out.getvalue())
+        self.assertFalse(Lead.objects.filter(agent__isnull=False).exists())
+
+        Category.objects.registry()  # Categories are served from the registry
+        with self.assertNumQueries(1):
+            LeadDistributor().agent_loads()
+
+
+class CategoryRegistryTests(TestCase):
+
+    def test_lookups_follow_category_changes(self):
+        """
+        Test that name lookups and form choices pick up saved and deleted categories.
+        """
+        new_id = Category.objects.get(name="new").pk
+        self.assertEqual(Category.objects.id_for("new"), new_id)
+        with self.assertNumQueries(0):
+            Category.objects.id_for("new")
+
+        category = Category.objects.create(name="Follow up")
+        self.assertIn(("Follow up", "Follow up"), Category.objects.choices())
+        self.assertEqual(Category.objects.ids_for("follow UP"), [category.pk])
+        self.assertIn(
+            ("Follow up", "Follow up"),
+            CategoryFilterForm().fields["category"].choices,
+        )
+
+        category.delete()
+        self.assertIsNone(Category.objects.id_for("Follow up"))
+        self.assertNotIn(("Follow up", "Follow up"), Category.objects.choices())
+
+    def test_categories_added_elsewhere_are_found(self):
+        """
+        Test that a category created by another process is found on a miss.
+        """
+        Category.objects.registry()
+        # Created without signals, as by another process with its own registry
+        Category.objects.bulk_create([Category(name="Follow up")])
+        category = Category.objects.get(name="Follow up")
+
+        self.assertEqual(Category.objects.ids_for("follow UP"), [category.pk])
+        self.assertEqual(Category.objects.id_for("Follow up"), category.pk)
+        self.assertEqual(Category.objects.name_for(category.pk), "Follow up")
+        self.assertIn(("Follow up", "Follow up"), Category.objects.choices())
+
+    def test_registry_expires(self):
+        """
+        Test that renames made by another process show up after the timeout.
+        """
+        from .models import CATEGORY_REGISTRY_TIMEOUT
+
+        new = Category.objects.get(name="new")
+        self.assertEqual(Category.objects.name_for(new.pk), "new")
+        Category.objects.filter(pk=new.pk).update(name="fresh")
+        self.assertEqual(Category.objects.name_for(new.pk), "new")
+
+        later = time.monotonic() + CATEGORY_REGISTRY_TIMEOUT + 1
+        with patch("leads.models.time.monotonic", return_value=later):
+            self.assertEqual(Category.objects.name_for(new.pk), "fresh")
+
+
+class DuplicateReportTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up an organiser and leads and clients written in different formats.
+        """
+        self.organiser = User.objects.create_user(
+            username="organiser", password="password", is_organisor=True
+        )
+        self.lead = Lead.objects.create(
+            first_name="Anna",
+            last_name="Nowak",
+            email="Anna.Nowak@Example.com",
+            phone_number="+48 601-234-567",
+        )
+        self.other_lead = Lead.objects.create(
+            first_name="Anna",
+            last_name="Nowak",
+            email="anna.nowak@example.com",
+            phone_number="600000000",
+            comment="Called twice",
+        )
+        self.client_record = Client.objects.create(
+            first_name="Anna", last_name="Nowak", phone_number="601234567"
+        )
+        self.other_client = Client.objects.create(
+            first_name="A.", last_name="Nowak", email="ANNA.NOWAK@example.com"
+        )
+        self.unrelated = Lead.objects.create(
+            first_name="Jan",
+            last_name="Kowalski",
+            email="jan@example.com",
+            phone_number="123 456 789",
+        )
+        self.client.login(username="organiser", password="password")
+
+    def test_match_keys_are_normalised(self):
+        """
+        Test that email and phone keys ignore case, formatting and country code.
+        """
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.email_key, "anna.nowak@example.com")
+        self.assertEqual(self.lead.phone_key, "601234567")
+
+    def test_finds_clusters_across_leads_and_clients(self):
+        """
+        Test that records linked by email or phone form one cluster in one query.
+        """
+        with self.assertNumQueries(1):
+            clusters = find_duplicate_clusters()
+
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]["leads"], [self.lead.pk, self.other_lead.pk])
+        self.assertEqual(
+            clusters[0]["clients"], [self.client_record.pk, self.other_client.pk]
+        )
+        self.assertEqual(
+            clusters[0]["keys"], ["email:anna.nowak@example.com", "phone:601234567"]
+        )
+
+        response = self.client.get(reverse("leads:duplicate-report"))
+        self.assertContains(response, "1 group of records")
+        self.assertContains(response, "phone:601234567")
+
+    def test_merge_moves_orders_and_deletes_duplicates(self):
+        """
+        Test that merging keeps the chosen records and moves orders to the client.
+        """
+        order = Order.objects.create(client=self.other_client)
+        response = self.client.post(
+            reverse("leads:duplicate-report"),
+            {
+                "leads": [self.lead.pk, self.other_lead.pk],
+                "clients": [self.client_record.pk, self.other_client.pk],
+                "primary_lead": self.lead.pk,
+                "primary_client": self.client_record.pk,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+
+        self.assertFalse(Lead.objects.filter(pk=self.other_lead.pk).exists())
+        self.assertFalse(Client.objects.filter(pk=self.other_client.pk).exists())
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.comment, "Called twice")
+        order.refresh_from_db()
+        self.assertEqual(order.client_id, self.client_record.pk)
+        self.client_record.refresh_from_db()
+        self.assertEqual(self.client_record.email, "ANNA.NOWAK@example.com")
+
+    def test_merge_rejects_unrelated_records(self):
+        """
+        Test that records which do not match each other are never merged.
+        """
+        response = self.client.post(
+            reverse("leads:duplicate-report"),
+            {
+                "leads": [self.lead.pk, self.unrelated.pk],
+                "primary_lead": self.lead.pk,
+            },
+            follow=True,
+        )
+        self.assertContains(response, "do not match each other")
+        self.assertTrue(Lead.objects.filter(pk=self.unrelated.pk).exists())
+
+
+class LeadConversionTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up an agent with leads ready to be converted.
+        """
+        self.agent = Agent.objects.create(
+            user=User.objects.create_user(
+                username="agent", password="password", is_organisor=False
+            )
+        )
+        self.sale = Category.objects.get(name="sale")
+        self.leads = [
+            Lead.objects.create(
+                first_name="Lead",
+                last_name=str(index),
+                email=f"convert{index}@example.com",
+                phone_number="123456789",
+                agent=self.agent,
+                category=self.sale,
+            )
+            for index in range(3)
+        ]
+        Client.objects.create(
+            first_name="Existing", last_name="Client", email="CONVERT0@example.com"
+        )
+
+    def test_converts_batch_with_one_lead_update(self):
+        """
+        Test that a batch is converted with a single UPDATE and bulk created clients.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            result = convert_leads(self.leads)
+
+        lead_updates = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "leads_lead"')
+        ]
+        self.assertEqual(len(lead_updates), 1)
+        self.assertEqual(len(result.converted), 3)
+        self.assertEqual(len(result.created_clients), 2)
+        self.assertEqual(len(result.existing_clients), 1)
+        self.assertEqual(Lead.objects.filter(is_converted=True).count(), 3)
+        self.assertEqual(Client.objects.count(), 3)
+        self.assertEqual(AgentDailyStats.objects.get(agent=self.agent).sales, 3)
+
+        again = convert_leads(self.leads)
+        self.assertEqual(again.already_converted, 3)
+        self.assertEqual(Client.objects.count(), 3)
+
+    def test_category_update_view_converts_lead(self):
+        """
+        Test that converting from the category page creates the client once.
+        """
+        self.client.login(username="agent", password="password")
+        lead = self.leads[1]
+        response = self.client.post(
+            reverse("leads:lead-category-update", args=[lead.pk]),
+            {"category": self.sale.pk, "convert": "on"},
+            follow=True,
+        )
+        self.assertContains(response, "A new client with client number")
+        lead.refresh_from_db()
+        self.assertTrue(lead.is_converted)
+        self.assertFalse(lead.convert)
+        self.assertIsNotNone(lead.conversion_date)
+        self.assertTrue(Client.objects.filter(email=lead.email).exists())
+
+    def test_category_change_of_converted_lead_moves_rollup(self):
+        """
+        Test that recategorising a converted lead updates it and the agent rollup.
+        """
+        no_sale = Category.objects.get(name="no sale")
+        convert_leads(self.leads)
+        result = convert_leads(self.leads[1], category=no_sale)
+
+        self.assertEqual(result.already_converted, 1)
+        self.assertEqual(result.recategorised, [self.leads[1]])
+        self.leads[1].refresh_from_db()
+        self.assertEqual(self.leads[1].category, no_sale)
+        stats = AgentDailyStats.objects.get(agent=self.agent)
+        self.assertEqual((stats.sales, stats.no_sales), (2, 1))
+
+    def test_category_update_view_reports_already_converted_lead(self):
+        """
+        Test that resubmitting a converted lead does not claim a new conversion.
+        """
+        convert_leads(self.leads)
+        self.client.login(username="agent", password="password")
+        response = self.client.post(
+            reverse("leads:lead-category-update", args=[self.leads[1].pk]),
+            {"category": self.sale.pk, "convert": "on"},
+            follow=True,
+        )
+        self.assertContains(response, "Lead was already converted.")
+        self.assertEqual(AgentDailyStats.objects.get(agent=self.agent).sales, 3)
+
+
+class LeadPipelineTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up an agent with leads in the new category and one of another agent.
+        """
+        self.agent_user = User.objects.create_user(
+            username="agent", password="password", is_organisor=False
+        )
+        self.agent = Agent.objects.create(user=self.agent_user)
+        self.new = Category.objects.get(name="new")
+        self.sale = Category.objects.get(name="sale")
+        self.leads = [
+            Lead.objects.create(
+                first_name="Lead",
+                last_name=str(index),
+                email=f"pipeline{index}@example.com",
+                phone_number="123456789",
+                agent=self.agent,
+                category=self.new,
+            )
+            for index in range(5)
+        ]
+        self.foreign_lead = Lead.objects.create(
+            first_name="Other",
+            last_name="Lead",
+            email="foreign@example.com",
+            phone_number="123456789",
+            category=self.new,
+        )
+        self.client.login(username="agent", password="password")
+
+    def test_board_counts_leads_per_category(self):
+        """
+        Test that the board shows per-category counts of the agent's leads.
+        """
+        response = self.client.get(reverse("leads:lead-pipeline"))
+        columns = {
+            column["name"]: column["count"] for column in response.context["columns"]
+        }
+        self.assertEqual(columns["new"], 5)
+        self.assertEqual(columns["sale"], 0)
+
+    @patch.object(LeadPipelineColumnView, "page_size", 2)
+    def test_column_pages_with_keyset_cursor(self):
+        """
+        Test that following the cursor walks the column newest first without gaps.
+        """
+        url = reverse("leads:lead-pipeline-column", args=[self.new.pk])
+        seen = []
+        params = {}
+        while True:
+            page = self.client.get(url, params).json()
+            seen += [lead["id"] for lead in page["leads"]]
+            if not page["next"]:
+                break
+            params = page["next"]
+        self.assertEqual(seen, [lead.pk for lead in reversed(self.leads)])
+
+    def test_move_updates_only_the_category(self):
+        """
+        Test that moving a card changes its category and cannot touch other leads.
+        """
+        lead = self.leads[0]
+        response = self.client.post(
+            reverse("leads:lead-move", args=[lead.pk]), {"category": self.sale.pk}
+        )
+        self.assertEqual(response.json(), {"id": lead.pk, "category": self.sale.pk})
+        lead.refresh_from_db()
+        self.assertEqual(lead.category, self.sale)
+        self.assertFalse(lead.is_converted)
+
+        response = self.client.post(
+            reverse("leads:lead-move", args=[self.foreign_lead.pk]),
+            {"category": self.sale.pk},
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class LeadListViewTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up an organiser and more leads than fit on one page.
+        """
+        User.objects.create_user(
+            username="organiser", password="password", is_organisor=True
+        )
+        self.category = Category.objects.get(name="new")
+        for index in range(12):
+            Lead.objects.create(
+                first_name="Listed",
+                last_name=str(index),
+                email=f"listed{index}@example.com",
+                phone_number="123456789",
+                category=self.category,
+            )
+        self.client.login(username="organiser", password="password")
+
+    def test_first_page_is_served_without_redirect(self):
+        """
+        Test that the list renders page 1 directly and clamps invalid pages.
+        """
+        response = self.client.get(reverse("leads:lead-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["leads"].number, 1)
+
+        response = self.client.get(reverse("leads:lead-list"), {"page": 99})
+        self.assertEqual(response.context["leads"].number, 2)
+
+    def test_fragment_renders_only_the_results(self):
+        """
+        Test that the fragment endpoint returns the filtered cards without the page.
+        """
+        response = self.client.get(
+            reverse("leads:lead-list-fragment"), {"category": "new", "page": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "<html")
+        self.assertContains(response, "Listed", count=3)
+        self.assertContains(response, "category=new&amp;page=1")
+
+
+class AgentAutocompleteTests(TestCase):
+
+    def setUp(self):
+        """
+        Set up an organiser and a few agents.
+        """
+        User.objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.agents = [
+            Agent.objects.create(
+                user=User.objects.create_user(
+                    username=f"agent{index}",
+                    email=f"agent{index}@example.com",
+                    first_name=name,
+                    is_organisor=False,
+                )
+            )
+            for index, name in enumerate(["Anna", "Bartek", "Celina"])
+        ]
+        self.client.login(username="organisor", password="password")
+
+    def test_agents_are_matched_by_prefix(self):
+        """
+        Test that agents are found by name or email prefix.
+        """
+        response = self.client.get(reverse("agents:agent-autocomplete"), {"q": "bar"})
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {
+                    "id": self.agents[1].pk,
+                    "text": "agent1@example.com",
+                    "detail": "agent1",
+                }
+            ],
+        )
+
+    def test_lead_form_renders_only_the_selected_agent(self):
+        """
+        Test that editing a lead does not list every agent.
+        """
+        lead = Lead.objects.create(
+            first_name="Jan",
+            last_name="Nowak",
+            email="jan@example.com",
+            phone_number="123456789",
+            agent=self.agents[2],
+        )
+        response = self.client.get(reverse("leads:lead-update", args=[lead.pk]))
+        self.assertContains(response, "agent2@example.com")
+        self.assertNotContains(response, "agent0@example.com")
+        self.assertContains(response, reverse("agents:agent-autocomplete"))
+
+        data = {
+            "first_name": "Jan",
+            "last_name": "Nowak",
+            "email": "jan@example.com",
+            "phone_number": "123456789",
+            "agent": self.agents[0].pk,
+        }
+        self.client.post(reverse("leads:lead-update", args=[lead.pk]), data)
+        lead.refresh_from_db()
+        self.assertEqual(lead.agent, self.agents[0])
@@ -7,12 +7,23 @@ from .views import (
     LeadDeleteView,
     LeadCategoryUpdateView,
     LeadUploadView,
+    LeadImportJobDetailView,
+    LeadImportJobStatusView,
+    DuplicateReportView,
+    LeadPipelineView,
+    LeadPipelineColumnView,
+    LeadMoveView,
 )
 
 app_name = "leads"
 
 urlpatterns = [
     path("", LeadListView.as_view(), name="lead-list"),
+    path(
+        "fragment/",
+        LeadListView.as_view(fragment=True),
+        name="lead-list-fragment",
+    ),
     path("<int:pk>/", LeadDetailView.as_view(), name="lead-detail"),
     path("new/", LeadCreateView.as_view(), name="lead-create"),
     path("<int:pk>/edit/", LeadUpdateView.as_view(), name="lead-update"),
@@ -23,4 +34,22 @@ urlpatterns = [
         name="lead-category-update",
     ),
     path("upload/", LeadUploadView.as_view(), name="lead-upload"),
+    path(
+        "imports/<int:pk>/",
+        LeadImportJobDetailView.as_view(),
+        name="lead-import-detail",
+    ),
+    path(
+        "imports/<int:pk>/status/",
+        LeadImportJobStatusView.as_view(),
+        name="lead-import-status",
+    ),
+    path("duplicates/", DuplicateReportView.as_view(), name="duplicate-report"),
+    path("pipeline/", LeadPipelineView.as_view(), name="lead-pipeline"),
+    path(
+        "pipeline/<int:category_id>/",
+        LeadPipelineColumnView.as_view(),
+        name="lead-pipeline-column",
+    ),
+    path("<int:pk>/move/", LeadMoveView.as_view(), name="lead-move"),
 ]
@@ -1,14 +1,25 @@
-import openpyxl
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import JsonResponse
 from django.shortcuts import render, reverse, redirect
 from django.urls import reverse_lazy
+from django.utils.dateparse import parse_datetime
 from django.utils.html import format_html
-from django.utils.timezone import now
 from django.views import generic, View
-from agents.mixins import OrganisorAndLoginRequiredMixin
-from .models import Lead, Category
+from agents.models import AgentDailyStats
+from agents.mixins import (
+    ExportMixin,
+    FragmentListMixin,
+    ImportJobDetailMixin,
+    ImportJobStatusMixin,
+    OrganisorAndLoginRequiredMixin,
+)
+from .conversion import convert_leads
+from .dedup import find_duplicate_clusters, merge_duplicates
+from .models import Lead, Category, LeadImportJob
 from clients.models import Client
 from .forms import (
     LeadForm,
@@ -30,30 +41,28 @@ class SignupView(generic.CreateView):
 
 
 # View to display a list of leads with pagination and filtering.
-class LeadListView(LoginRequiredMixin, generic.ListView):
+class LeadListView(
+    LoginRequiredMixin, FragmentListMixin, ExportMixin, generic.ListView
+):
     model = Lead
     template_name = "leads/lead-list.html"
+    fragment_template_name = "leads/partials/lead_list_results.html"
     context_object_name = "leads"
     paginate_by = 9  # Pagination set to 9 leads per page
-
-    def dispatch(self, request, *args, **kwargs):
-        if request.method == "POST":
-            return self.post(request, *args, **kwargs)
-
-        if request.method == "GET":
-            query_params = request.GET.copy()
-
-            if "page" not in query_params:
-                query_params["page"] = 1
-
-            if query_params != request.GET and query_params["page"] != request.GET.get(
-                "page"
-            ):
-                return redirect(
-                    f"{reverse('leads:lead-list')}?{query_params.urlencode()}"
-                )
-
-        return super().dispatch(request, *args, **kwargs)
+    export_filename = "leads"
+    export_fields = (
+        ("first_name", "First Name"),
+        ("last_name", "Last Name"),
+        ("age", "Age"),
+        ("email", "Email"),
+        ("phone_number", "Phone Number"),
+        ("category__name", "Category"),
+        ("agent__user__username", "Agent"),
+        ("is_converted", "Converted"),
+        ("conversion_date", "Conversion Date"),
+        ("date_created", "Date Created"),
+    )
+    max_claim_count = 10  # Most leads an agent can take at once
 
     def get_queryset(self):
         user = self.request.user
@@ -67,33 +76,30 @@ class LeadListView(LoginRequiredMixin, generic.ListView):
         )
 
         if category_name:
-            queryset = queryset.filter(category__name=category_name)
+            category_id = Category.objects.id_for(category_name)
+            if category_id is None:
+                return queryset.none()
+            queryset = queryset.filter(category_id=category_id)
 
         if unassigned_only:
             queryset = queryset.filter(agent__isnull=True)
 
-        return queryset.order_by("-date_created")
+        return queryset.select_related("category", "agent__user").order_by(
+            "-date_created"
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        leads = self.get_queryset()
-        paginator = Paginator(leads, self.paginate_by)
-        page = self.request.GET.get("page", 1)
+        context["leads"] = context["page_obj"]
+        if self.fragment:
+            return context
 
-        try:
-            paginated_leads = paginator.page(page)
-        except PageNotAnInteger:
-            paginated_leads = paginator.page(1)
-        except EmptyPage:
-            paginated_leads = paginator.page(paginator.num_pages)
-
-        context["leads"] = paginated_leads
         context["form"] = CategoryFilterForm(self.request.GET)
         context["unassigned_only"] = self.request.GET.get("unassigned_only", False)
 
         if self.request.user.is_organisor:
             unassigned_leads = Lead.objects.filter(
-                agent__isnull=True, category__name="new"
+                agent__isnull=True, category_id=Category.objects.id_for("new")
             )
             context["unassigned_leads"] = unassigned_leads
 
@@ -101,24 +107,28 @@ class LeadListView(LoginRequiredMixin, generic.ListView):
 
     def post(self, request, *args, **kwargs):
         """
-        Handles the POST request to assign the oldest unassigned lead to the current agent.
+        Handles the POST request to assign the oldest unassigned leads to the current agent.
         """
         user = self.request.user
 
         if not user.is_organisor and hasattr(user, "agent") and user.agent:
-            oldest_unassigned_lead = (
-                Lead.objects.filter(agent__isnull=True, category__name="new")
-                .order_by("date_created")
-                .first()
-            )
+            try:
+                count = int(request.POST.get("count", 1))
+            except ValueError:
+                count = 1
+            count = min(max(count, 1), self.max_claim_count)
 
-            if oldest_unassigned_lead:
-                oldest_unassigned_lead.agent = user.agent
-                oldest_unassigned_lead.save()
+            claimed_leads = Lead.objects.claim_for_agent(user.agent, count=count)
 
+            if len(claimed_leads) == 1:
+                lead = claimed_leads[0]
                 messages.success(
                     request,
-                    f"You successfully took the lead: {oldest_unassigned_lead.first_name} {oldest_unassigned_lead.last_name}.",
+                    f"You successfully took the lead: {lead.first_name} {lead.last_name}.",
+                )
+            elif claimed_leads:
+                messages.success(
+                    request, f"You successfully took {len(claimed_leads)} leads."
                 )
             else:
                 messages.warning(request, "No unassigned leads available.")
@@ -138,8 +148,7 @@ class LeadCreateView(OrganisorAndLoginRequiredMixin, generic.CreateView):
 
     def form_valid(self, form):
         lead = form.save(commit=False)
-        new_category = Category.objects.get(name="new")
-        lead.category = new_category
+        lead.category_id = Category.objects.id_for("new")
         lead.save()
 
         messages.success(self.request, "You have successfully created a lead")
@@ -231,48 +240,34 @@ class LeadCategoryUpdateView(LoginRequiredMixin, generic.UpdateView):
         lead = self.object
 
         if lead.convert:
-            lead.is_converted = True
-            lead.convert = False
-            lead.save(update_fields=["is_converted", "convert"])
-
-            if not lead.conversion_date:
-                lead.conversion_date = now()
-                lead.save(update_fields=["conversion_date"])
-
-            # Save the updated category, if there is a change
-            if form.cleaned_data.get("category"):
-                lead.category = form.cleaned_data["category"]
-                lead.save(update_fields=["category"])
-
-            if lead.category and lead.category.name.lower() == "sale":
-                client, created_client = Client.objects.get_or_create(
-                    email=lead.email,
-                    defaults={
-                        "first_name": lead.first_name,
-                        "last_name": lead.last_name,
-                        "age": lead.age,
-                        "phone_number": lead.phone_number,
-                    },
+            result = convert_leads(lead, category=form.cleaned_data.get("category"))
+
+            if result.already_converted and not result.recategorised:
+                messages.info(self.request, "Lead was already converted.")
+            elif result.created_clients:
+                client = result.created_clients[0]
+                client_url = reverse(
+                    "clients:client-detail", args=[client.client_number]
+                )
+                messages.success(
+                    self.request,
+                    format_html(
+                        "Lead converted successfully. A new client with client number {} was created. "
+                        "Click <a href='{}' class='underline text-blue-500'>here</a> to view the client.",
+                        client.client_number,
+                        client_url,
+                    ),
+                )
+            elif result.existing_clients:
+                messages.info(
+                    self.request,
+                    f"Lead converted successfully, but the client with email {lead.email} already exists.",
+                )
+            elif result.recategorised:
+                messages.success(
+                    self.request,
+                    "Lead was already converted, its category was updated.",
                 )
-
-                if created_client:
-                    client_url = reverse(
-                        "clients:client-detail", args=[client.client_number]
-                    )
-                    messages.success(
-                        self.request,
-                        format_html(
-                            "Lead converted successfully. A new client with client number {} was created. "
-                            "Click <a href='{}' class='underline text-blue-500'>here</a> to view the client.",
-                            client.client_number,
-                            client_url,
-                        ),
-                    )
-                else:
-                    messages.info(
-                        self.request,
-                        f"Lead converted successfully, but the client with email {lead.email} already exists.",
-                    )
             else:
                 messages.success(self.request, "Lead converted successfully.")
 
@@ -286,54 +281,219 @@ class LeadCategoryUpdateView(LoginRequiredMixin, generic.UpdateView):
 class LeadUploadView(OrganisorAndLoginRequiredMixin, View):
     template_name = "leads/lead_upload.html"
 
+    def get_context_data(self, form):
+        return {
+            "form": form,
+            "import_jobs": LeadImportJob.objects.order_by("-created_at")[:10],
+        }
+
     def get(self, request, *args, **kwargs):
         form = LeadUploadForm()
-        return render(request, self.template_name, {"form": form})
+        return render(request, self.template_name, self.get_context_data(form))
 
     def post(self, request, *args, **kwargs):
         form = LeadUploadForm(request.POST, request.FILES)
 
         if form.is_valid():
-            file = form.cleaned_data["file"]
-            try:
-                wb = openpyxl.load_workbook(file)
-                sheet = wb.active
-
-                skipped_rows = []
-                duplicate_emails = []
-                created_leads = 0
-                new_category = Category.objects.get(name="new")
-
-                for idx, row in enumerate(
-                    sheet.iter_rows(min_row=2, values_only=True), start=2
-                ):
-                    first_name, last_name, age, email, phone_number = row[:5]
-
-                    if not all([first_name, last_name, age, email, phone_number]):
-                        skipped_rows.append(idx)
-                        continue
-
-                    if Lead.objects.filter(email=email).exists():
-                        duplicate_emails.append(email)
-                        continue
-
-                    Lead.objects.create(
-                        first_name=first_name,
-                        last_name=last_name,
-                        age=age,
-                        email=email,
-                        phone_number=phone_number,
-                        category=new_category,
-                    )
-                    created_leads += 1
+            # The file is stored and imported by the process_lead_imports worker
+            job = LeadImportJob.objects.create(
+                file=form.cleaned_data["file"],
+                created_by=request.user.userprofile,
+            )
+            messages.success(
+                request, f"Lead import #{job.pk} has been queued for processing."
+            )
+            return redirect("leads:lead-import-detail", pk=job.pk)
 
+        return render(request, self.template_name, self.get_context_data(form))
+
+
+# View to follow the progress of a background lead import.
+class LeadImportJobDetailView(
+    OrganisorAndLoginRequiredMixin, ImportJobDetailMixin, generic.DetailView
+):
+    model = LeadImportJob
+    template_name = "leads/lead_import_detail.html"
+    job_label = "Lead import"
+    detail_url_name = "leads:lead-import-detail"
+
+
+# JSON endpoint polled by the lead import progress page.
+class LeadImportJobStatusView(
+    OrganisorAndLoginRequiredMixin, ImportJobStatusMixin, generic.DetailView
+):
+    model = LeadImportJob
+
+
+# Report of duplicate leads and clients, with a merge action per cluster.
+class DuplicateReportView(OrganisorAndLoginRequiredMixin, generic.TemplateView):
+    template_name = "leads/duplicate_report.html"
+    paginate_by = 20
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        paginator = Paginator(find_duplicate_clusters(), self.paginate_by)
+        page = paginator.get_page(self.request.GET.get("page"))
+
+        # Only the records shown on this page are loaded
+        leads = Lead.objects.select_related("agent__user", "category").in_bulk(
+            [pk for cluster in page for pk in cluster["leads"]]
+        )
+        clients = Client.objects.in_bulk(
+            [pk for cluster in page for pk in cluster["clients"]]
+        )
+        context["clusters"] = [
+            {
+                "keys": cluster["keys"],
+                "leads": [leads[pk] for pk in cluster["leads"] if pk in leads],
+                "clients": [clients[pk] for pk in cluster["clients"] if pk in clients],
+            }
+            for cluster in page
+        ]
+        context["page_obj"] = page
+        context["cluster_count"] = paginator.count
+        return context
+
+    def post(self, request, *args, **kwargs):
+        # Merges the submitted cluster into the chosen lead and client
+        primary_lead = request.POST.get("primary_lead") or None
+        primary_client = request.POST.get("primary_client") or None
+        try:
+            merged_leads, merged_clients = merge_duplicates(
+                request.POST.getlist("leads"),
+                request.POST.getlist("clients"),
+                primary_lead_id=primary_lead,
+                primary_client_id=primary_client,
+            )
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            if merged_leads or merged_clients:
                 messages.success(
                     request,
-                    f"Successfully uploaded {created_leads} new leads. "
-                    f"Skipped rows: {len(skipped_rows)}. "
-                    f"Duplicate emails: {', '.join(duplicate_emails)}.",
+                    f"Merged {merged_leads} duplicate lead(s) and "
+                    f"{merged_clients} duplicate client(s).",
+                )
+            else:
+                messages.warning(request, "Choose which lead or client to keep.")
+
+        return redirect(
+            f"{reverse('leads:duplicate-report')}?page={request.POST.get('page', 1)}"
+        )
+
+
+# Kanban board of leads grouped by category; columns load lazily.
+class LeadPipelineView(LoginRequiredMixin, generic.TemplateView):
+    template_name = "leads/lead_pipeline.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        counts = dict(
+            visible_leads(self.request.user)
+            .values_list("category_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        columns = [
+            {"id": pk, "name": name, "count": counts.get(pk, 0)}
+            for pk, name in Category.objects.registry().items()
+        ]
+        if counts.get(None):
+            columns.append({"id": 0, "name": "Uncategorized", "count": counts[None]})
+        context["columns"] = columns
+        return context
+
+
+# JSON page of one pipeline column, paginated by (date_created, id) keyset.
+class LeadPipelineColumnView(LoginRequiredMixin, View):
+    page_size = 25
+
+    def get(self, request, category_id):
+        leads = visible_leads(request.user).filter(category_id=category_id or None)
+        before = request.GET.get("before")
+        before_id = request.GET.get("before_id")
+        if before and before_id:
+            before = parse_datetime(before)
+            if before is None or not before_id.isdigit():
+                return JsonResponse({"error": "Invalid cursor."}, status=400)
+            leads = leads.filter(
+                Q(date_created__lt=before)
+                | Q(date_created=before, pk__lt=int(before_id))
+            )
+
+        rows = list(
+            leads.order_by("-date_created", "-pk").values(
+                "pk",
+                "first_name",
+                "last_name",
+                "email",
+                "date_created",
+                "is_converted",
+                "agent__user__username",
+            )[: self.page_size + 1]
+        )
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        cursor = None
+        if has_more:
+            cursor = {
+                "before": rows[-1]["date_created"].isoformat(),
+                "before_id": rows[-1]["pk"],
+            }
+        return JsonResponse(
+            {
+                "leads": [
+                    {
+                        "id": row["pk"],
+                        "name": f"{row['first_name']} {row['last_name']}",
+                        "email": row["email"],
+                        "agent": row["agent__user__username"],
+                        "is_converted": row["is_converted"],
+                        "url": reverse("leads:lead-detail", args=[row["pk"]]),
+                    }
+                    for row in rows
+                ],
+                "next": cursor,
+            }
+        )
+
+
+# AJAX endpoint that moves a lead to another pipeline column.
+class LeadMoveView(LoginRequiredMixin, View):
+
+    def post(self, request, pk):
+        category_id = request.POST.get("category", "")
+        if not category_id.isdigit():
+            return JsonResponse({"error": "Invalid category."}, status=400)
+        category_id = int(category_id) or None
+        if category_id is not None and Category.objects.name_for(category_id) is None:
+            return JsonResponse({"error": "Unknown category."}, status=400)
+
+        # Only the category column is written; a converted lead's count in the
+        # agent rollup moves with it
+        with transaction.atomic():
+            lead = (
+                visible_leads(request.user)
+                .select_for_update(of=("self",))
+                .filter(pk=pk)
+                .only("pk", "category", "is_converted", "agent", "conversion_date")
+                .first()
+            )
+            if lead is None:
+                return JsonResponse({"error": "Lead not found."}, status=404)
+            Lead.objects.filter(pk=pk).update(category_id=category_id)
+            if lead.is_converted and lead.category_id != category_id:
+                previous_category_id = lead.category_id
+                lead.category_id = category_id
+                AgentDailyStats.objects.record_category_changes(
+                    [(lead, previous_category_id)]
                 )
-            except Exception as e:
-                messages.error(request, f"Error uploading leads: {str(e)}")
+        return JsonResponse({"id": pk, "category": category_id or 0})
+
 
-        return render(request, self.template_name, {"form": form})
+def visible_leads(user):
+    # Leads the user may see: all for organisers, their own for agents
+    if user.is_organisor:
+        return Lead.objects.all()
+    return Lead.objects.filter(agent__user=user)
@@ -1,4 +1,19 @@
 from django import forms
+from django.urls import reverse_lazy
+
+from agents.widgets import AutocompleteSelect
+
+from .models import Order
+
+
+# Form for the client of a new order, picked by autocomplete
+class OrderCreateForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = ["client"]
+        widgets = {
+            "client": AutocompleteSelect(reverse_lazy("clients:client-autocomplete")),
+        }
 
 
 # Form for timeframe filter
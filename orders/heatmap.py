@@ -0,0 +1,35 @@
+import time
+
+from django.core.cache import cache
+
+from .models import Order
+
+# Seconds a heatmap is cached; paying an order also drops all cached heatmaps
+HEATMAP_TIMEOUT = 300
+VERSION_KEY = "orders:paid_heatmap:version"
+
+
+def heatmap_version():
+    # A fresh version starts from the clock, so an evicted version key can
+    # never bring back heatmaps cached under an older one
+    initial = time.time_ns()
+    cache.add(VERSION_KEY, initial, timeout=None)
+    return cache.get(VERSION_KEY, initial)
+
+
+def invalidate_heatmaps():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def cached_paid_heatmap(start_date=None, end_date=None):
+    # The weekday x hour grid of paid orders for a range, from cache when possible
+    bounds = [value.isoformat() if value else "" for value in (start_date, end_date)]
+    key = f"orders:paid_heatmap:v{heatmap_version()}:{bounds[0]}:{bounds[1]}"
+    grid = cache.get(key)
+    if grid is None:
+        grid = Order.objects.paid_heatmap(start_date, end_date)
+        cache.set(key, grid, HEATMAP_TIMEOUT)
+    return grid
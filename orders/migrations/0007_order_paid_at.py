@@ -0,0 +1,46 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:48
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def backfill_paid_at(apps, schema_editor):
+    # Paid orders take the time of their last change to Paid from the status
+    # history, or their creation time when the history has none
+    Order = apps.get_model("orders", "Order")
+    orders = []
+    for order in Order.objects.filter(status="Paid").only(
+        "date_created", "status_history"
+    ):
+        paid_changes = [
+            change["changed_at"]
+            for change in order.status_history
+            if change.get("new_status") == "Paid" and change.get("changed_at")
+        ]
+        order.paid_at = (
+            parse_datetime(paid_changes[-1]) if paid_changes else order.date_created
+        )
+        orders.append(order)
+    Order.objects.bulk_update(orders, ["paid_at"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_order_status_history_alter_order_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="paid_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_paid_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["paid_at"], name="orders_orde_paid_at_8fa0ef_idx"
+            ),
+        ),
+    ]
@@ -3,8 +3,27 @@ from decimal import Decimal
 
 # Django Core Imports
 from django.db import models
-from django.db.models import Sum, F, Count
-from django.db.models.functions import TruncDay
+from django.db.models import (
+    Sum,
+    F,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    FloatField,
+    Func,
+    IntegerField,
+    Window,
+)
+from django.db.models.expressions import RowRange
+from django.db.models.functions import (
+    Cast,
+    ExtractHour,
+    ExtractIsoWeekDay,
+    NullIf,
+    Round,
+    RowNumber,
+    TruncDay,
+)
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
@@ -15,6 +34,26 @@ from clients.models import Client
 from products.models import Product
 
 
+# SUM() that can wrap an aggregate inside a window, e.g. SUM(SUM(x)) OVER ()
+class WindowSum(Func):
+    function = "SUM"
+    window_compatible = True
+
+
+# Expression over aggregates and windows of a grouped query; Django would
+# otherwise add it to GROUP BY, which databases reject for window functions
+class GroupedWindow(ExpressionWrapper):
+    def get_group_by_cols(self):
+        return []
+
+
+def percentage_of(part, whole):
+    # Share of part in whole as a percentage with two decimals, NULL for a zero whole
+    share = Cast(part, FloatField()) * 100 / Cast(NullIf(whole, 0), FloatField())
+    output_field = DecimalField(max_digits=5, decimal_places=2)
+    return GroupedWindow(Round(Cast(share, output_field), 2), output_field=output_field)
+
+
 # Manages order-related queries and statistics
 class OrderManager(models.Manager):
 
@@ -53,6 +92,30 @@ class OrderManager(models.Manager):
             "total_orders": self.filter(status="Paid").count(),
         }
 
+    def paid_heatmap(self, start_date=None, end_date=None):
+        # Paid orders counted by local weekday and hour of payment, as a 7x24
+        # grid with Monday first, from one grouped query
+        queryset = self.filter(status="Paid", paid_at__isnull=False)
+        if start_date:
+            queryset = queryset.filter(paid_at__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(paid_at__lte=end_date)
+
+        local_zone = timezone.get_default_timezone()  # Europe/Warsaw
+        cells = (
+            queryset.annotate(
+                weekday=ExtractIsoWeekDay("paid_at", tzinfo=local_zone),
+                hour=ExtractHour("paid_at", tzinfo=local_zone),
+            )
+            .values("weekday", "hour")
+            .annotate(total_orders=Count("id"))
+            .order_by()
+        )
+        grid = [[0] * 24 for weekday in range(7)]
+        for cell in cells:
+            grid[cell["weekday"] - 1][cell["hour"]] = cell["total_orders"]
+        return grid
+
     def orders_by_day(self):
         # Groups and counts paid orders by the day they were created
         orders = (
@@ -102,6 +165,10 @@ class Order(models.Model):
         "15": Decimal("0.15"),
     }
     status_history = models.JSONField(default=list, blank=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["paid_at"])]
 
     @property
     def total_price(self):
@@ -118,6 +185,7 @@ class Order(models.Model):
 
     def save(self, *args, **kwargs):
         # Overrides save to log status changes
+        old_status = None
         if self.pk:
             old_status = Order.objects.get(pk=self.pk).status
             if old_status != self.status:
@@ -128,6 +196,14 @@ class Order(models.Model):
                         "changed_at": now().isoformat(),
                     }
                 )
+        # Flag the Paid transition for the agent daily stats rollup
+        self._became_paid = self.status == "Paid" and old_status != "Paid"
+        # Flag changes that move the order into or out of the sales figures
+        self._paid_changed = (self.status == "Paid") != (old_status == "Paid")
+        if self._became_paid:
+            self.paid_at = now()
+        elif self.status != "Paid":
+            self.paid_at = None
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -160,8 +236,10 @@ class OrderProduct(models.Model):
         return self.product_price * self.quantity
 
     @classmethod
-    def get_product_sales(cls, start_date=None, end_date=None):
-        # Retrieves sales data for products, optionally filtered by date range
+    def get_product_sales(cls, start_date=None, end_date=None, top=5):
+        # Retrieves sales data for products, optionally filtered by date range.
+        # Each row also carries its rank and its share of quantity and revenue;
+        # the first row carries the shares of everything ranked below top.
         queryset = cls.objects.filter(order__status="Paid")
 
         if start_date:
@@ -169,13 +247,31 @@ class OrderProduct(models.Model):
         if end_date:
             queryset = queryset.filter(order__date_created__lte=end_date)
 
+        quantity = Sum("quantity")
+        revenue = Sum(F("quantity") * F("product_price"))
+        ranking = [quantity.desc(), F("product_name").asc()]
+        rest = RowRange(start=top, end=None)
+
         return (
             queryset.values("product_name")
             .annotate(
-                total_quantity_sold=Sum("quantity"),
-                total_revenue_sold=Sum(F("quantity") * F("product_price")),
+                total_quantity_sold=quantity,
+                total_revenue_sold=revenue,
+                sales_rank=GroupedWindow(
+                    Window(RowNumber(), order_by=ranking), output_field=IntegerField()
+                ),
+                quantity_share=percentage_of(quantity, Window(WindowSum(quantity))),
+                revenue_share=percentage_of(revenue, Window(WindowSum(revenue))),
+                other_quantity_share=percentage_of(
+                    Window(WindowSum(quantity), order_by=ranking, frame=rest),
+                    Window(WindowSum(quantity)),
+                ),
+                other_revenue_share=percentage_of(
+                    Window(WindowSum(revenue), order_by=ranking, frame=rest),
+                    Window(WindowSum(revenue)),
+                ),
             )
-            .order_by("-total_quantity_sold")
+            .order_by("sales_rank")
         )
 
     def __str__(self):
@@ -189,3 +285,12 @@ def update_client_status_on_order_save(sender, instance, **kwargs):
     if client:
         client.update_status()
         client.save()
+
+
+@receiver(post_save, sender=Order)
+def invalidate_heatmaps_on_order_paid(sender, instance, **kwargs):
+    # Paying or un-paying an order moves it into or out of the heatmaps
+    if getattr(instance, "_paid_changed", False):
+        from .heatmap import invalidate_heatmaps
+
+        invalidate_heatmaps()
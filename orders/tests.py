@@ -0,0 +1,96 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from clients.models import Client
+
+from .models import Order
+
+WARSAW = ZoneInfo("Europe/Warsaw")
+
+
+class OrderHeatmapTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.client.login(username="organisor", password="password")
+        self.customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+
+    def paid_order(self, paid_at):
+        order = Order.objects.create(client=self.customer)
+        order.status = "Paid"
+        order.save()
+        Order.objects.filter(pk=order.pk).update(paid_at=paid_at)
+        return order
+
+    def test_paying_an_order_records_the_time(self):
+        """Test that paid_at is set on the transition to Paid only."""
+        order = Order.objects.create(client=self.customer)
+        self.assertIsNone(order.paid_at)
+        order.status = "Paid"
+        order.save()
+        paid_at = order.paid_at
+        self.assertIsNotNone(paid_at)
+        order.save()
+        self.assertEqual(order.paid_at, paid_at)
+
+    def test_grid_uses_local_weekday_and_hour(self):
+        """Test that payments are bucketed by Warsaw weekday and hour."""
+        # Monday 2024-01-01 23:30 in Warsaw is still Monday 22:30 in UTC
+        self.paid_order(datetime(2024, 1, 1, 23, 30, tzinfo=WARSAW))
+        self.paid_order(datetime(2024, 1, 1, 23, 5, tzinfo=WARSAW))
+        # Sunday 2024-01-07 00:15 in Warsaw is Saturday in UTC
+        self.paid_order(datetime(2024, 1, 7, 0, 15, tzinfo=WARSAW))
+        self.paid_order(datetime(2024, 2, 1, 12, 0, tzinfo=WARSAW))
+        Order.objects.create(client=self.customer)  # Unpaid orders are ignored
+
+        with self.assertNumQueries(1):
+            grid = Order.objects.paid_heatmap(
+                start_date=datetime(2024, 1, 1, tzinfo=WARSAW),
+                end_date=datetime(2024, 1, 31, tzinfo=WARSAW),
+            )
+        self.assertEqual(len(grid), 7)
+        self.assertTrue(all(len(row) == 24 for row in grid))
+        self.assertEqual(grid[0][23], 2)
+        self.assertEqual(grid[6][0], 1)
+        self.assertEqual(sum(map(sum, grid)), 3)
+
+    def test_endpoint_is_cached_until_an_order_is_paid(self):
+        """Test that the JSON endpoint caches grids and refreshes after payments."""
+        url = reverse("orders:order-heatmap-data")
+        params = {
+            "start_datetime": "2024-01-01T00:00",
+            "end_datetime": "2024-02-01T00:00",
+        }
+        self.paid_order(datetime(2024, 1, 3, 9, 0, tzinfo=WARSAW))
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.json()["grid"][2][9], 1)
+        self.assertEqual(response.json()["max"], 1)
+        with self.assertNumQueries(2):  # Session and user only
+            self.client.get(url, params)
+
+        self.paid_order(datetime(2024, 1, 3, 9, 45, tzinfo=WARSAW))
+        self.assertEqual(self.client.get(url, params).json()["grid"][2][9], 2)
+        response = self.client.get(url, {"start_datetime": "not a date"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_statistics_page_links_the_heatmap(self):
+        """Test that the order statistics page loads the heatmap for its period."""
+        response = self.client.get(
+            reverse("orders:order-statistics"), {"time_frame": "last_30_days"}
+        )
+        self.assertContains(response, 'id="order-heatmap"')
+        self.assertContains(response, reverse("orders:order-heatmap-data"))
+        # The range is rounded to whole days, so the URL is stable within a day
+        self.assertRegex(
+            response.context["heatmap_url"],
+            r"start_datetime=\d{4}-\d{2}-\d{2}T00%3A00&end_datetime=\d{4}-\d{2}-\d{2}T00%3A00$",
+        )
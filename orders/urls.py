@@ -6,6 +6,11 @@ app_name = "orders"
 
 urlpatterns = [
     path("", views.OrderListView.as_view(), name="order-list"),
+    path(
+        "fragment/",
+        views.OrderListView.as_view(fragment=True),
+        name="order-list-fragment",
+    ),
     path(
         "create",
         views.OrderCreateView.as_view(),
@@ -19,6 +24,11 @@ urlpatterns = [
         name="client-orders",
     ),
     path("statistics/", views.OrderStatisticsView.as_view(), name="order-statistics"),
+    path(
+        "statistics/heatmap/",
+        views.OrderHeatmapDataView.as_view(),
+        name="order-heatmap-data",
+    ),
     path(
         "<int:order_id>/confirm/",
         views.OrderConfirmView.as_view(),
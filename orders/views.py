@@ -1,51 +1,96 @@
 # Standard Library Imports
 import uuid
 import json
-import csv
 from datetime import datetime, timedelta
 from decimal import Decimal
 
 # Django Core Imports
 from django.shortcuts import get_object_or_404, redirect, render, reverse
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.utils.http import urlencode
 from django.utils.timezone import now
 from django.utils.dateparse import parse_datetime
 from django.core.mail import send_mail
-from django.db.models import Count, Sum, F
-from django.db.models.functions import TruncDay
+from django.db import transaction
+from django.db.models import Count, DecimalField, Sum, F, Value
+from django.db.models.functions import Coalesce, Concat, TruncDay
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib.sites.shortcuts import get_current_site
 from django.contrib import messages
-from django.views import generic
+from django.views import generic, View
 from django.conf import settings
 
 # Django Authentication Mixins
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 # Custom Mixins
-from agents.mixins import OrganisorAndLoginRequiredMixin
+from agents.mixins import (
+    ExportMixin,
+    FragmentListMixin,
+    OrganisorAndLoginRequiredMixin,
+)
 
 # Forms
-from .forms import OrderSearchForm
+from .forms import OrderCreateForm, OrderSearchForm, StatisticsFilterForm
+from .heatmap import cached_paid_heatmap
 from products.forms import TimeFrameSelectionForm
 
 # Models
 from .models import Order, OrderProduct
-from products.models import Product
+from products.models import InsufficientStock, Product, StockMovement
 from clients.models import Client, Contact
 
 
+# Export columns shared by the order lists, with totals computed in the query
+class OrderExportMixin(ExportMixin):
+    export_fields = (
+        ("id", "Order ID"),
+        ("client_name", "Client"),
+        ("status", "Status"),
+        ("date_created", "Date Created"),
+        ("total_price", "Total Price"),
+    )
+
+    def get_export_queryset(self):
+        price_field = DecimalField(max_digits=14, decimal_places=2)
+        return (
+            super()
+            .get_export_queryset()
+            .annotate(
+                client_name=Concat(
+                    "client__first_name", Value(" "), "client__last_name"
+                ),
+                total_price=Coalesce(
+                    Sum(
+                        F("order_products__product_price")
+                        * F("order_products__quantity"),
+                        output_field=price_field,
+                    ),
+                    Value(Decimal("0")),
+                    output_field=price_field,
+                ),
+            )
+        )
+
+
 # Handles listing and filtering orders
-class OrderListView(LoginRequiredMixin, generic.ListView):
+class OrderListView(
+    LoginRequiredMixin, FragmentListMixin, OrderExportMixin, generic.ListView
+):
     model = Order
     template_name = "orders/order_list.html"
+    fragment_template_name = "orders/partials/order_list_results.html"
     context_object_name = "orders"
     paginate_by = 15  # Number of orders per page
+    export_filename = "orders"
 
     def get_queryset(self):
         # Returns orders sorted by creation date, filtered by query
-        queryset = Order.objects.select_related("client").order_by("-date_created")
+        queryset = (
+            Order.objects.select_related("client")
+            .prefetch_related("order_products")
+            .order_by("-date_created")
+        )
 
         query = self.request.GET.get("q")
         if query:
@@ -60,68 +105,26 @@ class OrderListView(LoginRequiredMixin, generic.ListView):
     def get_context_data(self, **kwargs):
         # Adds search form and paginated orders to the context
         context = super().get_context_data(**kwargs)
-        orders = self.get_queryset()
-        paginator = Paginator(orders, self.paginate_by)
-        page = self.request.GET.get("page", 1)
-
-        try:
-            paginated_orders = paginator.page(page)
-        except PageNotAnInteger:
-            paginated_orders = paginator.page(1)
-        except EmptyPage:
-            paginated_orders = paginator.page(paginator.num_pages)
-
-        context["orders"] = paginated_orders
+        context["orders"] = context["page_obj"]
         context["search_form"] = OrderSearchForm(self.request.GET)
         return context
 
-    def get(self, request, *args, **kwargs):
-        # Handles exporting orders to CSV if requested
-        if request.GET.get("export") == "csv":
-            return self.export_to_csv()
-        return super().get(request, *args, **kwargs)
-
-    def export_to_csv(self):
-        # Exports orders to a CSV file
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="orders.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(["Order ID", "Client", "Status", "Date Created", "Total Price"])
-
-        orders = self.get_queryset()
-        for order in orders:
-            writer.writerow(
-                [
-                    order.id,
-                    f"{order.client.first_name} {order.client.last_name}",
-                    order.status,
-                    order.date_created,
-                    order.total_price,
-                ]
-            )
-
-        return response
-
     def post(self, request, *args, **kwargs):
         # Handles bulk cancellation of pending orders older than 72 hours
         if request.user.is_organisor and "delete_pending_orders" in request.POST:
             cutoff_time = now() - timedelta(hours=72)
-            pending_orders = Order.objects.filter(
-                status="Pending", date_created__lt=cutoff_time
-            )
-
-            count = pending_orders.count()
-            if count > 0:
+            with transaction.atomic():
+                # Locked so a concurrent cancel cannot release the same stock twice
+                pending_orders = list(
+                    Order.objects.select_for_update(of=("self",))
+                    .select_related("client")
+                    .filter(status="Pending", date_created__lt=cutoff_time)
+                )
+                # Restore product stock and notify clients
+                StockMovement.objects.release(
+                    pending_orders, reason="Canceled due to inactivity"
+                )
                 for order in pending_orders:
-                    # Restore product stock and notify clients
-                    for order_product in order.order_products.select_related("product"):
-                        if order_product.product:
-                            order_product.product.stock_quantity += (
-                                order_product.quantity
-                            )
-                            order_product.product.save()
-
                     Contact.objects.create(
                         client=order.client,
                         reason=Contact.ReasonChoices.SALES_OFFER,
@@ -132,6 +135,8 @@ class OrderListView(LoginRequiredMixin, generic.ListView):
                     order.status = "Canceled"
                     order.save()
 
+            count = len(pending_orders)
+            if count > 0:
                 messages.success(
                     request,
                     f"{count} pending orders older than 72 hours were canceled, stock restored, and clients notified.",
@@ -146,11 +151,12 @@ class OrderListView(LoginRequiredMixin, generic.ListView):
 
 
 # Displays orders for a specific client
-class ClientOrdersView(LoginRequiredMixin, generic.ListView):
+class ClientOrdersView(LoginRequiredMixin, OrderExportMixin, generic.ListView):
     model = Order
     template_name = "orders/client_orders.html"
     context_object_name = "orders"
     paginate_by = 15  # Number of orders per page
+    export_filename = "client_orders"
 
     def get_queryset(self):
         # Filters orders by the client associated with the given client_number
@@ -189,34 +195,6 @@ class ClientOrdersView(LoginRequiredMixin, generic.ListView):
         context["search_form"] = OrderSearchForm(self.request.GET)
         return context
 
-    def get(self, request, *args, **kwargs):
-        # Handles exporting client orders to CSV if requested
-        if request.GET.get("export") == "csv":
-            return self.export_to_csv()
-        return super().get(request, *args, **kwargs)
-
-    def export_to_csv(self):
-        # Exports client orders to a CSV file
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="client_orders.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(["Order ID", "Client", "Status", "Date Created", "Total Price"])
-
-        orders = self.get_queryset()
-        for order in orders:
-            writer.writerow(
-                [
-                    order.id,
-                    f"{order.client.first_name} {order.client.last_name}",
-                    order.status,
-                    order.date_created,
-                    order.total_price,
-                ]
-            )
-
-        return response
-
 
 # Displays details for a specific order
 class OrderDetailView(LoginRequiredMixin, generic.DetailView):
@@ -284,16 +262,19 @@ class OrderDetailView(LoginRequiredMixin, generic.DetailView):
             elif order.status == "Canceled":
                 messages.warning(request, f"Order #{order.id} is already canceled.")
             else:
-                # Restore stock for each product in the order
-                for order_product in order.order_products.all():
-                    product = order_product.product
-                    if product:
-                        product.stock_quantity += order_product.quantity
-                        product.save()
-
-                # Update the order status and save changes
-                order.status = "Canceled"
-                order.save()
+                with transaction.atomic():
+                    # Restore stock and cancel, unless a concurrent request already did
+                    order = Order.objects.select_for_update().get(pk=order.pk)
+                    if order.status in ("Paid", "Canceled"):
+                        messages.warning(
+                            request, f"Order #{order.id} is already {order.status}."
+                        )
+                        return redirect("orders:order-detail", pk=order.pk)
+                    StockMovement.objects.release(
+                        [order], reason=f"Order #{order.id} canceled by request"
+                    )
+                    order.status = "Canceled"
+                    order.save()
 
                 # Create a contact entry for the canceled order
                 Contact.objects.create(
@@ -332,7 +313,7 @@ class OrderDetailView(LoginRequiredMixin, generic.DetailView):
 class OrderCreateView(LoginRequiredMixin, generic.CreateView):
     model = Order
     template_name = "orders/order_create.html"
-    fields = ["client"]
+    form_class = OrderCreateForm
 
     def get_initial(self):
         # Sets the initial client value if a client_number is provided
@@ -352,7 +333,7 @@ class OrderCreateView(LoginRequiredMixin, generic.CreateView):
     def get_context_data(self, **kwargs):
         # Adds available products and discount options to the context
         context = super().get_context_data(**kwargs)
-        context["products"] = Product.objects.all().order_by("price")
+        context["selected_lines"] = self.get_selected_lines()
 
         context["discount_choices"] = [
             (key, f"{value * 100:.0f}%")
@@ -360,6 +341,22 @@ class OrderCreateView(LoginRequiredMixin, generic.CreateView):
         ]
         return context
 
+    def get_selected_lines(self):
+        # Lines posted back when the form is re-rendered, so they are not lost
+        if self.request.method != "POST":
+            return []
+        product_ids = [
+            product_id
+            for product_id in self.request.POST.getlist("product")
+            if product_id.isdigit()
+        ]
+        products = Product.objects.in_bulk(product_ids)
+        return [
+            (products[int(product_id)], self.request.POST.get(f"quantity_{product_id}"))
+            for product_id in product_ids
+            if int(product_id) in products
+        ]
+
     def form_valid(self, form):
         # Validates and creates the order and its associated products
         selected_product_ids = self.request.POST.getlist("product")
@@ -382,34 +379,41 @@ class OrderCreateView(LoginRequiredMixin, generic.CreateView):
                 self.request, self.template_name, self.get_context_data(form=form)
             )
 
-        for product_id, quantity in selected_products:
-            product = get_object_or_404(Product, pk=product_id)
-            if product.stock_quantity < quantity:
-                messages.error(
-                    self.request,
-                    f"Insufficient stock for {product.name}. Available: {product.stock_quantity}.",
-                )
-                return render(
-                    self.request, self.template_name, self.get_context_data(form=form)
-                )
+        products = Product.objects.in_bulk(
+            [product_id for product_id, quantity in selected_products]
+        )
+        try:
+            items = [
+                (products[int(product_id)], quantity)
+                for product_id, quantity in selected_products
+            ]
+        except (KeyError, ValueError):
+            raise Http404("No Product matches the given query.")
 
-        order = form.save(commit=False)
-        order.agent = self.request.user.agent
-        order.discount = discount * 100
-        order.status = "Pending"
-        order.save()
-
-        for product_id, quantity in selected_products:
-            product = get_object_or_404(Product, pk=product_id)
-            product.stock_quantity -= quantity
-            product.save()
-
-            OrderProduct.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                product_name=product.name,
-                product_price=None,
+        try:
+            with transaction.atomic():
+                order = form.save(commit=False)
+                order.agent = self.request.user.agent
+                order.discount = discount * 100
+                order.status = "Pending"
+                order.save()
+
+                # Reserves every line or none of them
+                StockMovement.objects.reserve(
+                    items, order=order, reason=f"Order #{order.id} created"
+                )
+                for product, quantity in items:
+                    OrderProduct.objects.create(
+                        order=order,
+                        product=product,
+                        quantity=quantity,
+                        product_name=product.name,
+                        product_price=None,
+                    )
+        except InsufficientStock as error:
+            messages.error(self.request, str(error))
+            return render(
+                self.request, self.template_name, self.get_context_data(form=form)
             )
 
         Contact.objects.create(
@@ -469,13 +473,14 @@ class OrderSummaryView(LoginRequiredMixin, generic.DetailView):
 
         elif action == "cancel":
             # Restore product quantities and delete the order
-            for order_product in order.order_products.all():
-                product = order_product.product
-                if product:
-                    product.stock_quantity += order_product.quantity
-                    product.save()
-
-            order.delete()
+            with transaction.atomic():
+                order = get_object_or_404(
+                    Order.objects.select_for_update(), pk=order.pk
+                )
+                StockMovement.objects.release(
+                    [order], reason=f"Order #{order.id} canceled before sending"
+                )
+                order.delete()
             messages.success(
                 request,
                 "The order has been canceled, and product quantities have been restored.",
@@ -532,14 +537,15 @@ class OrderConfirmView(generic.View):
                 request, "The offer has been accepted. A payment email has been sent."
             )
         elif action == "deny":
-            # Deny the order and restore product quantities
-            order.status = "Canceled"
-            order.save()
-            for order_product in order.order_products.all():
-                product = order_product.product
-                if product:
-                    product.stock_quantity += order_product.quantity
-                    product.save()
+            # Deny the order and restore product quantities, once
+            with transaction.atomic():
+                order = Order.objects.select_for_update().get(pk=order.pk)
+                if order.status != "Canceled":
+                    order.status = "Canceled"
+                    order.save()
+                    StockMovement.objects.release(
+                        [order], reason=f"Order #{order.id} denied by the client"
+                    )
 
             messages.success(
                 request, "The offer has been denied, and the order has been canceled."
@@ -673,5 +679,43 @@ class OrderStatisticsView(OrganisorAndLoginRequiredMixin, generic.TemplateView):
             "smallest_order": smallest_order,
         }
         context["daily_revenue"] = json.dumps(daily_revenue)
+        # The heatmap covers whole days, so its URL and cache key stay the
+        # same all day instead of changing every minute
+        heatmap_start = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        heatmap_end = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        if heatmap_end < end_date:
+            heatmap_end += timedelta(days=1)
+        context["heatmap_url"] = (
+            reverse("orders:order-heatmap-data")
+            + "?"
+            + urlencode(
+                {
+                    "start_datetime": heatmap_start.strftime("%Y-%m-%dT%H:%M"),
+                    "end_datetime": heatmap_end.strftime("%Y-%m-%dT%H:%M"),
+                }
+            )
+        )
 
         return context
+
+
+# JSON weekday x hour counts of paid orders for the statistics heatmap
+class OrderHeatmapDataView(OrganisorAndLoginRequiredMixin, View):
+    weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+    def get(self, request):
+        form = StatisticsFilterForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        grid = cached_paid_heatmap(
+            form.cleaned_data.get("start_datetime"),
+            form.cleaned_data.get("end_datetime"),
+        )
+        return JsonResponse(
+            {
+                "weekdays": self.weekdays,
+                "hours": list(range(24)),
+                "grid": grid,
+                "max": max(max(row) for row in grid),
+            }
+        )
@@ -1,13 +1,47 @@
-from django.contrib import admin
-from .models import Product, PriceHistory
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+
+from .forms import RepriceForm
+from .models import Product, PriceHistory, ProductCooccurrence, StockMovement
+
+
+# Changes the selected products' prices after showing a preview
+@admin.action(description="Reprice selected products")
+def reprice_products(modeladmin, request, queryset):
+    form = RepriceForm(request.POST if "value" in request.POST else None)
+    if form.is_valid() and "apply" in request.POST:
+        history = queryset.reprice(**form.get_change())
+        modeladmin.message_user(
+            request, f"{len(history)} product price(s) changed.", messages.SUCCESS
+        )
+        return None
+
+    preview = None
+    if form.is_valid():
+        preview = queryset.with_new_price(**form.get_change()).order_by("name")
+    return TemplateResponse(
+        request,
+        "admin/products/product/reprice.html",
+        {
+            **modeladmin.admin_site.each_context(request),
+            "title": "Reprice products",
+            "opts": modeladmin.model._meta,
+            "form": form,
+            "products": queryset.order_by("name"),
+            "preview": preview,
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        },
+    )
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("name", "price", "stock_quantity", "get_clients")
+    list_display = ("name", "sku", "price", "stock_quantity", "get_clients")
     list_filter = ("price",)
-    search_fields = ("name", "description")
+    search_fields = ("name", "sku", "description")
     ordering = ("name",)
+    actions = [reprice_products]
 
     def get_clients(self, obj):
         return ", ".join([client.name for client in obj.clients.all()])
@@ -21,3 +55,27 @@ class PriceHistoryAdmin(admin.ModelAdmin):
     list_filter = ("changed_at",)
     search_fields = ("product__name",)
     ordering = ("-changed_at",)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ("product", "kind", "quantity", "order", "reason", "created_at")
+    list_filter = ("kind", "created_at")
+    search_fields = ("product__name", "reason")
+    ordering = ("-created_at",)
+    raw_id_fields = ("product", "order")
+
+    # The ledger is append-only; corrections are new adjustments
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductCooccurrence)
+class ProductCooccurrenceAdmin(admin.ModelAdmin):
+    list_display = ("product", "other_product", "orders")
+    search_fields = ("product__name", "other_product__name")
+    ordering = ("product", "-orders")
+    raw_id_fields = ("product", "other_product")
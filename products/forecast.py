@@ -0,0 +1,111 @@
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Product, StockForecast
+
+# Days of sales history the forecast looks at
+HISTORY_DAYS = 90
+# Age in days at which a day's sales count half as much as today's
+HALF_LIFE_DAYS = 14
+# Slow movers lasting longer than this get no stockout date; far enough out
+# for any reorder decision and well inside the range of a date
+STOCKOUT_HORIZON_DAYS = 3650
+
+
+def ewma_demand(product_index, day_index, quantity, product_count, days, half_life):
+    # Exponentially weighted mean of daily unit sales for every product, from
+    # sparse (product, day, quantity) arrays with day 0 the oldest. Days
+    # without sales count as zero, so the weighted sum is a single bincount.
+    decay = 0.5 ** (1 / half_life)
+    weights = decay ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    weighted_sales = np.bincount(
+        product_index,
+        weights=quantity * weights[day_index],
+        minlength=product_count,
+    )
+    return weighted_sales / weights.sum()
+
+
+def days_of_cover(stock, demand):
+    # Days until stock runs out at the given daily demand; NaN when not selling
+    cover = np.full(stock.shape, np.nan)
+    np.divide(stock, demand, out=cover, where=demand > 0)
+    return cover
+
+
+def load_daily_sales(product_ids, start_date, days):
+    # Units sold per product and local day as parallel arrays. Every order that
+    # is not canceled has taken its products out of stock, so all count.
+    from orders.models import OrderProduct
+
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    rows = (
+        OrderProduct.objects.exclude(order__status="Canceled")
+        .filter(product__isnull=False, order__date_created__gte=start)
+        .annotate(day=TruncDate("order__date_created"))
+        .values_list("product_id", "day")
+        .annotate(quantity=Sum("quantity"))
+        .order_by()
+    )
+    sales = np.array(
+        [
+            (product_id, (day - start_date).days, quantity)
+            for product_id, day, quantity in rows.iterator()
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    sales = sales[sales[:, 1] < days]
+    # Products created after the product snapshot are left out, rather than
+    # having their sales land on the next id or past the end of the arrays
+    product_index = np.searchsorted(product_ids, sales[:, 0])
+    known = product_index < len(product_ids)
+    known[known] = product_ids[product_index[known]] == sales[known, 0]
+    return product_index[known], sales[known, 1], sales[known, 2]
+
+
+def update_stock_forecasts(
+    history_days=HISTORY_DAYS, half_life=HALF_LIFE_DAYS, today=None
+):
+    # Recomputes and stores the forecast of every product; returns their number
+    today = today or timezone.localdate()
+    start_date = today - timedelta(days=history_days - 1)
+    products = np.array(
+        Product.objects.order_by("pk").values_list("pk", "stock_quantity"),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    product_ids, stock = products[:, 0], products[:, 1]
+
+    demand = ewma_demand(
+        *load_daily_sales(product_ids, start_date, history_days),
+        product_count=len(product_ids),
+        days=history_days,
+        half_life=half_life,
+    )
+    cover = days_of_cover(stock, demand)
+
+    computed_at = timezone.now()
+    forecasts = [
+        StockForecast(
+            product_id=product_id,
+            daily_demand=product_demand,
+            days_of_cover=None if np.isnan(product_cover) else product_cover,
+            stockout_date=(
+                today + timedelta(days=int(product_cover))
+                if product_cover <= STOCKOUT_HORIZON_DAYS
+                else None
+            ),
+            computed_at=computed_at,
+        )
+        for product_id, product_demand, product_cover in zip(
+            product_ids.tolist(), demand.tolist(), cover.tolist()
+        )
+    ]
+    with transaction.atomic():
+        StockForecast.objects.all().delete()
+        StockForecast.objects.bulk_create(forecasts, batch_size=1000)
+    return len(forecasts)
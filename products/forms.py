@@ -8,12 +8,17 @@ class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
         fields = [
+            "sku",
             "name",
             "description",
             "price",
             "stock_quantity",
         ]
 
+    def clean_sku(self):
+        # Products without a SKU store NULL, which the unique index allows repeatedly
+        return self.cleaned_data["sku"] or None
+
 
 # Form for selecting months in last year
 class TimeFrameSelectionForm(forms.Form):
@@ -35,3 +40,38 @@ class TimeFrameSelectionForm(forms.Form):
         label="Select Time Frame",
         required=True,
     )
+
+
+# Form for changing the prices of many products at once
+class RepriceForm(forms.Form):
+    PERCENT = "percent"
+    AMOUNT = "amount"
+    MODE_CHOICES = [
+        (PERCENT, "Percent"),
+        (AMOUNT, "Absolute amount"),
+    ]
+
+    mode = forms.ChoiceField(choices=MODE_CHOICES, label="Change by")
+    value = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Negative values lower prices, e.g. -10 for a 10% discount.",
+    )
+
+    def get_change(self):
+        # Keyword arguments for ProductQuerySet.reprice and with_new_price
+        return {self.cleaned_data["mode"]: self.cleaned_data["value"]}
+
+
+# Form for uploading a product catalogue
+class CatalogueUploadForm(forms.Form):
+    file = forms.FileField(
+        label="Upload CSV or Excel File",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control"}),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if not file.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return file
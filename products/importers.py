@@ -0,0 +1,234 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from leads.importers import ChunkedImporter
+
+from .models import PriceHistory, Product, StockMovement
+from .pricing import price_cache
+
+
+# Counters and per-row error report collected during a catalogue import
+class CatalogueImportResult:
+    def __init__(self):
+        self.rows_processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.price_changes = 0
+        self.errors = []
+
+    def add_error(self, row_number, sku, message):
+        # Records a rejected row in the report
+        self.skipped += 1
+        self.errors.append({"row": row_number, "sku": sku, "error": message})
+
+
+# Streams a CSV or Excel catalogue into the products table, upserting by SKU
+class CatalogueImporter(ChunkedImporter):
+    FIELDS = ("sku", "name", "description", "price", "stock_quantity")
+    UPDATE_FIELDS = ("name", "description", "price", "stock_quantity")
+    INSERT_CONFLICT_FIELDS = ("name", "description", "price")
+    result_class = CatalogueImportResult
+
+    def __init__(self, chunk_size=1000):
+        super().__init__(chunk_size)
+        self.max_lengths = {
+            name: Product._meta.get_field(name).max_length for name in ("sku", "name")
+        }
+        self.seen_skus = set()
+
+    def read_rows(self, file, name, start_row=2):
+        # Yields (row number, values) from a .csv or .xlsx file without loading it whole
+        if name.lower().endswith(".csv"):
+            text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+            try:
+                rows = enumerate(csv.reader(text), start=1)
+                for row_number, row in rows:
+                    if row_number >= start_row:
+                        yield row_number, row
+            finally:
+                text.detach()
+            return
+
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            rows = sheet.iter_rows(min_row=start_row, values_only=True)
+            for row_number, row in enumerate(rows, start=start_row):
+                yield row_number, row
+        finally:
+            workbook.close()
+
+    def clean_row(self, row):
+        # Returns a dict of product fields or raises ValidationError with the reason.
+        # A blank stock quantity keeps the current stock of an existing product.
+        values = list(row[: len(self.FIELDS)])
+        values += [None] * (len(self.FIELDS) - len(values))
+        data = {
+            name: str(value).strip() if value is not None else ""
+            for name, value in zip(self.FIELDS, values)
+        }
+        if not data["sku"] or not data["name"] or not data["price"]:
+            raise ValidationError("Missing required fields")
+
+        for name, max_length in self.max_lengths.items():
+            if len(data[name]) > max_length:
+                raise ValidationError(
+                    f"{name.replace('_', ' ').capitalize()} is longer than {max_length} characters"
+                )
+
+        try:
+            price = Decimal(data["price"]).quantize(Decimal("0.01"))
+        except InvalidOperation:
+            raise ValidationError("Price must be a number")
+        if not price.is_finite() or price < 0 or price.adjusted() >= 8:
+            raise ValidationError("Price must be between 0 and 99999999.99")
+        data["price"] = price
+
+        if data["stock_quantity"]:
+            try:
+                stock = float(data["stock_quantity"])
+            except ValueError:
+                raise ValidationError("Stock quantity must be a number")
+            if not stock.is_integer() or stock < 0:
+                raise ValidationError("Stock quantity must be a whole number")
+            data["stock_quantity"] = int(stock)
+        else:
+            data["stock_quantity"] = None
+        data["description"] = data["description"] or None
+        return data
+
+    def import_chunk(self, chunk, result):
+        # Upserts a chunk with one locked lookup and INSERT ... ON CONFLICT for
+        # known and new SKUs, then records the price and stock changes in bulk
+        first_error = len(result.errors)
+        candidates = []
+        for row_number, row in chunk:
+            if not any(value not in (None, "") for value in row):
+                continue  # Blank rows, e.g. trailing formatting, are ignored
+            result.rows_processed += 1
+            try:
+                data = self.clean_row(row)
+            except ValidationError as error:
+                sku = row[0] if row else None
+                result.add_error(row_number, sku, error.messages[0])
+                continue
+
+            if data["sku"] in self.seen_skus:
+                result.add_error(row_number, data["sku"], "Duplicate SKU in file")
+                continue
+            self.seen_skus.add(data["sku"])
+            candidates.append(data)
+
+        with transaction.atomic():
+            # Known products are locked before they are compared, so neither
+            # the stock written below nor its ledger delta can be stale while
+            # orders reserve stock with F() updates
+            existing = {
+                product.sku: product
+                for product in Product.objects.select_for_update()
+                .filter(sku__in=[data["sku"] for data in candidates])
+                .order_by("pk")
+                .only("pk", "sku", *self.UPDATE_FIELDS)
+            }
+
+            inserts = []
+            updates = []
+            price_changes = []
+            stock_changes = []
+            for data in candidates:
+                current = existing.get(data["sku"])
+                if current is None:
+                    data["stock_quantity"] = data["stock_quantity"] or 0
+                    inserts.append(Product(**data))
+                    continue
+                if data["stock_quantity"] is None:
+                    data["stock_quantity"] = current.stock_quantity
+                if all(
+                    (getattr(current, name) or None) == (data[name] or None)
+                    for name in self.UPDATE_FIELDS
+                ):
+                    result.unchanged += 1
+                    continue
+
+                updates.append(Product(**data))
+                if current.price != data["price"]:
+                    price_changes.append(
+                        PriceHistory(
+                            product_id=current.pk,
+                            old_price=current.price,
+                            new_price=data["price"],
+                        )
+                    )
+                if current.stock_quantity != data["stock_quantity"]:
+                    stock_changes.append(
+                        (current.pk, data["stock_quantity"] - current.stock_quantity)
+                    )
+
+            Product.objects.bulk_create(
+                updates,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=self.UPDATE_FIELDS,
+                batch_size=self.chunk_size,
+            )
+            # Rows are matched on SKU, so a product created since the lookup is
+            # updated rather than duplicated. Its stock was never read here, so
+            # it is left alone and only stock missing from the ledger is added.
+            Product.objects.bulk_create(
+                inserts,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=self.INSERT_CONFLICT_FIELDS,
+                batch_size=self.chunk_size,
+            )
+            if inserts:
+                stock_changes += (
+                    Product.objects.filter(sku__in=[product.sku for product in inserts])
+                    .annotate(
+                        unrecorded=F("stock_quantity")
+                        - Coalesce(Sum("stock_movements__quantity"), 0)
+                    )
+                    .exclude(unrecorded=0)
+                    .values_list("pk", "unrecorded")
+                )
+            PriceHistory.objects.bulk_create(price_changes, batch_size=self.chunk_size)
+            StockMovement.objects.bulk_create(
+                [
+                    StockMovement(
+                        product_id=product_id,
+                        kind=StockMovement.Kind.ADJUST,
+                        quantity=quantity,
+                        reason="Catalogue import",
+                    )
+                    for product_id, quantity in stock_changes
+                ],
+                batch_size=self.chunk_size,
+            )
+
+        if price_changes:
+            # bulk_create sends no post_save, so the price cache is told directly
+            price_cache.invalidate([change.product_id for change in price_changes])
+
+        result.inserted += len(inserts)
+        result.updated += len(updates)
+        result.price_changes += len(price_changes)
+        result.errors[first_error:] = sorted(
+            result.errors[first_error:], key=lambda error: error["row"]
+        )
+        return result
+
+    def run(self, file, name, start_row=2, result=None):
+        # Imports the whole file, one transaction per chunk
+        result = result or self.result_class()
+        for chunk in self.chunks(self.read_rows(file, name, start_row=start_row)):
+            self.import_chunk(chunk, result)
+        return result
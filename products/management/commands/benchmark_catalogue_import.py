@@ -0,0 +1,74 @@
+import csv
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.importers import CatalogueImporter
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+# Measures catalogue upsert throughput on a generated CSV, inserting then updating
+class Command(BaseCommand):
+    help = "Benchmark the catalogue import: a first load, then a re-import with changed prices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--reprice-every",
+            type=int,
+            default=10,
+            help="Change the price of every Nth product in the second import.",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+
+        with tempfile.NamedTemporaryFile(
+            suffix=".csv"
+        ) as first, tempfile.NamedTemporaryFile(suffix=".csv") as second:
+            self.write_catalogue(first.name, rows)
+            self.write_catalogue(second.name, rows, options["reprice_every"])
+
+            try:
+                # The benchmark never keeps the generated products
+                with transaction.atomic():
+                    for label, file in (("Initial load", first), ("Re-import", second)):
+                        importer = CatalogueImporter(chunk_size=options["chunk_size"])
+                        started = time.perf_counter()
+                        result = importer.run(file, file.name)
+                        elapsed = time.perf_counter() - started
+                        self.stdout.write(
+                            self.style.SUCCESS(
+                                f"{label}: {result.inserted} inserted, {result.updated} updated, "
+                                f"{result.unchanged} unchanged in {elapsed:.2f}s: "
+                                f"{result.rows_processed / elapsed:,.0f} rows/s"
+                            )
+                        )
+                    raise RollbackBenchmark
+            except RollbackBenchmark:
+                pass
+
+    def write_catalogue(self, path, rows, reprice_every=0):
+        # Writes a synthetic catalogue with the upload column layout
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["SKU", "Name", "Description", "Price", "Stock Quantity"])
+            for index in range(rows):
+                price = 10 + index % 90
+                if reprice_every and index % reprice_every == 0:
+                    price += 1
+                writer.writerow(
+                    [
+                        f"BENCH-{index:07d}",
+                        f"Product {index}",
+                        "",
+                        f"{price}.99",
+                        index % 100,
+                    ]
+                )
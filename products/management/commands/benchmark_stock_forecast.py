@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from products.forecast import HALF_LIFE_DAYS, days_of_cover, ewma_demand
+
+
+# Measures the vectorized forecast pass on generated sales arrays
+class Command(BaseCommand):
+    help = (
+        "Benchmark the stock forecast computation on generated daily sales, "
+        "without touching the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--days", type=int, default=730)
+        parser.add_argument(
+            "--density",
+            type=float,
+            default=0.05,
+            help="Share of (product, day) cells with any sales.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        products, days = options["products"], options["days"]
+        rng = np.random.default_rng(options["seed"])
+
+        started = time.perf_counter()
+        cells = int(products * days * options["density"])
+        product_index = rng.integers(0, products, cells)
+        day_index = rng.integers(0, days, cells)
+        quantity = rng.integers(1, 10, cells)
+        stock = rng.integers(0, 500, products)
+        self.stdout.write(
+            f"Generated {cells:,} daily sales for {products:,} products x {days} days "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+        started = time.perf_counter()
+        demand = ewma_demand(
+            product_index, day_index, quantity, products, days, HALF_LIFE_DAYS
+        )
+        cover = days_of_cover(stock, demand)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Forecast {products:,} products in {elapsed * 1000:.0f}ms "
+                f"({cells / elapsed:,.0f} daily sales/s); "
+                f"{int(np.count_nonzero(cover < 14)):,} with under 14 days of cover."
+            )
+        )
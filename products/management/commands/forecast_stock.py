@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from products.forecast import HALF_LIFE_DAYS, HISTORY_DAYS, update_stock_forecasts
+
+
+# Recomputes the stock depletion forecast behind the reorder report
+class Command(BaseCommand):
+    help = "Forecast days of stock cover for every product from recent sales (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--history-days",
+            type=int,
+            default=HISTORY_DAYS,
+            help=f"Days of sales to look at (default: {HISTORY_DAYS}).",
+        )
+        parser.add_argument(
+            "--half-life",
+            type=float,
+            default=HALF_LIFE_DAYS,
+            help=f"Age in days at which sales count half (default: {HALF_LIFE_DAYS}).",
+        )
+
+    def handle(self, *args, **options):
+        products = update_stock_forecasts(
+            history_days=options["history_days"], half_life=options["half_life"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Forecast stock for {products} products.")
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import CatalogueImporter
+
+
+# Upserts products from a CSV or Excel catalogue, matching them by SKU
+class Command(BaseCommand):
+    help = (
+        "Import a product catalogue (.csv or .xlsx with the columns SKU, Name, "
+        "Description, Price, Stock Quantity), updating products with known SKUs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not path.lower().endswith((".csv", ".xlsx")):
+            raise CommandError("The catalogue must be a .csv or .xlsx file.")
+
+        importer = CatalogueImporter(chunk_size=options["chunk_size"])
+        with open(path, "rb") as file:
+            result = importer.run(file, path)
+
+        for error in result.errors[:20]:
+            self.stderr.write(f"Row {error['row']} ({error['sku']}): {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.inserted} inserted, {result.updated} updated "
+                f"({result.price_changes} price changes), {result.unchanged} unchanged, "
+                f"{result.skipped} skipped."
+            )
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from leads.importers import claim_next_import_job, run_import_job
+from products.importers import CatalogueImporter
+from products.models import CatalogueImportJob
+
+
+# Worker process that runs background catalogue imports
+class Command(BaseCommand):
+    help = "Process queued catalogue import jobs, resuming crashed ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is waiting instead of polling forever.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=5.0)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_import_job(CatalogueImportJob)
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(
+                f"Processing catalogue import #{job.pk} from row {job.last_row + 1}"
+            )
+            importer = CatalogueImporter(chunk_size=options["chunk_size"])
+            job = run_import_job(job, importer)
+            self.stdout.write(
+                f"Catalogue import #{job.pk} {job.status.lower()}: "
+                f"{job.inserted} inserted, {job.updated} updated, "
+                f"{job.unchanged} unchanged, {job.skipped} skipped."
+            )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.models import ProductCooccurrence
+
+
+# Recounts the "frequently bought together" pairs from all paid orders
+class Command(BaseCommand):
+    help = "Rebuild the product co-occurrence counts used for order suggestions (run nightly)."
+
+    def handle(self, *args, **options):
+        pairs = ProductCooccurrence.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {pairs} product pair rows."))
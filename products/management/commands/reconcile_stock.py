@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import StockMovement
+
+
+# Compares each product's stored stock with the sum of its stock movements
+class Command(BaseCommand):
+    help = "Verify product stock quantities against the stock movement ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Record an adjustment so the ledger matches the stored quantity.",
+        )
+
+    def handle(self, *args, **options):
+        discrepancies = list(StockMovement.objects.discrepancies())
+        if not discrepancies:
+            self.stdout.write(self.style.SUCCESS("Stock matches the ledger."))
+            return
+
+        self.stdout.write(f"{'Product':<30} {'Stored':>10} {'Ledger':>10} {'Diff':>10}")
+        for product in discrepancies:
+            difference = product.stock_quantity - product.ledger_quantity
+            self.stdout.write(
+                f"{product.name[:30]:<30} {product.stock_quantity:>10} "
+                f"{product.ledger_quantity:>10} {difference:>+10}"
+            )
+            if options["fix"]:
+                # The stored quantity is kept; only the ledger is brought in line
+                StockMovement.objects.create(
+                    product=product,
+                    kind=StockMovement.Kind.ADJUST,
+                    quantity=difference,
+                    reason="Reconciliation",
+                )
+
+        if options["fix"]:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Recorded adjustments for {len(discrepancies)} product(s)."
+                )
+            )
+        else:
+            raise CommandError(
+                f"{len(discrepancies)} product(s) do not match the ledger."
+            )
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import Product
+
+
+# Changes many product prices at once, previewing them unless --apply is given
+class Command(BaseCommand):
+    help = "Reprice products by a percent or an absolute amount; prints a preview unless --apply is given."
+
+    def add_arguments(self, parser):
+        change = parser.add_mutually_exclusive_group(required=True)
+        change.add_argument("--percent", type=Decimal, help="e.g. 5 or -10")
+        change.add_argument("--amount", type=Decimal, help="e.g. 2.50 or -1")
+        parser.add_argument(
+            "--name", help="Only products whose name contains this text."
+        )
+        parser.add_argument("--ids", type=int, nargs="+", help="Only these products.")
+        parser.add_argument("--all", action="store_true", help="Reprice every product.")
+        parser.add_argument("--apply", action="store_true", help="Save the new prices.")
+
+    def handle(self, *args, **options):
+        if not (options["name"] or options["ids"] or options["all"]):
+            raise CommandError("Select products with --name, --ids or --all.")
+
+        products = Product.objects.all()
+        if options["name"]:
+            products = products.filter(name__icontains=options["name"])
+        if options["ids"]:
+            products = products.filter(pk__in=options["ids"])
+        change = {"percent": options["percent"], "amount": options["amount"]}
+
+        if options["apply"]:
+            history = products.reprice(**change)
+            self.stdout.write(
+                self.style.SUCCESS(f"Changed the price of {len(history)} product(s).")
+            )
+            return
+
+        self.stdout.write(f"{'Product':<30} {'Price':>10} {'New price':>10}")
+        count = 0
+        for product in products.with_new_price(**change).order_by("name").iterator():
+            count += 1
+            self.stdout.write(
+                f"{product.name[:30]:<30} {product.price:>10} "
+                f"{product.new_price:>10.2f}"
+            )
+        self.stdout.write(
+            f"{count} product(s) matched. Run again with --apply to save."
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from products.sales_cache import product_sales_cache
+
+
+# Reports how often the top-selling products endpoint is served from cache
+class Command(BaseCommand):
+    help = "Show hit ratios of the product sales cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after reporting them.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'Period':<10} {'Hits':>10} {'Misses':>10} {'Hit ratio':>10}"
+        )
+        for kind, row in product_sales_cache.stats().items():
+            ratio = row["ratio"]
+            ratio = f"{ratio:.1%}" if ratio is not None else "-"
+            self.stdout.write(
+                f"{kind:<10} {row['hits']:>10} {row['misses']:>10} {ratio:>10}"
+            )
+
+        if options["reset"]:
+            product_sales_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,88 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_opening_stock(apps, schema_editor):
+    # Starts the ledger from the stock each product holds today
+    Product = apps.get_model("products", "Product")
+    StockMovement = apps.get_model("products", "StockMovement")
+    StockMovement.objects.bulk_create(
+        StockMovement(
+            product_id=product_id,
+            kind="adjust",
+            quantity=stock_quantity,
+            reason="Opening stock",
+        )
+        for product_id, stock_quantity in Product.objects.filter(
+            stock_quantity__gt=0
+        ).values_list("pk", "stock_quantity")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_order_status_history_alter_order_status"),
+        ("products", "0005_remove_product_clients"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("reserve", "Reserve"),
+                            ("release", "Release"),
+                            ("adjust", "Adjust"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("quantity", models.IntegerField(help_text="Signed change in stock")),
+                ("reason", models.CharField(blank=True, max_length=255)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="stock_movements",
+                        to="orders.order",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_movements",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product", "created_at"],
+                        name="products_st_product_a806c1_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(record_opening_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:40
+
+from django.db import migrations
+
+# Both match the UPPER("name"::text) LIKE ... that istartswith/icontains emit
+PREFIX_INDEX = (
+    "CREATE INDEX IF NOT EXISTS product_name_prefix_idx ON products_product "
+    '((UPPER("name"::text)) text_pattern_ops)'
+)
+TRIGRAM_INDEX = (
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON products_product "
+    'USING gin ((UPPER("name"::text)) gin_trgm_ops)'
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    # Expression indexes with operator classes are PostgreSQL only
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(PREFIX_INDEX)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        has_trigrams = cursor.fetchone() is not None
+    # Substring search needs pg_trgm (postgresql-contrib); without it only
+    # prefix search is indexed
+    if has_trigrams:
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(TRIGRAM_INDEX)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS product_name_trgm_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS product_name_prefix_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_stockmovement"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
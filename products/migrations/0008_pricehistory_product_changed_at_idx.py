@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_product_name_search_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pricehistory",
+            index=models.Index(
+                fields=["product", "changed_at"], name="products_pr_product_11a8c8_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_pricehistory_product_changed_at_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCooccurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("orders", models.PositiveIntegerField(default=0)),
+                (
+                    "other_product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cooccurrences",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product", "-orders"],
+                        name="products_pr_product_22f0d7_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "other_product"), name="unique_product_pair"
+                    )
+                ],
+            },
+        ),
+    ]
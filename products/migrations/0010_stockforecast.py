@@ -0,0 +1,50 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_productcooccurrence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockForecast",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="forecast",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "daily_demand",
+                    models.FloatField(help_text="Weighted average units sold per day"),
+                ),
+                (
+                    "days_of_cover",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Empty when the product is not selling",
+                        null=True,
+                    ),
+                ),
+                ("stockout_date", models.DateField(blank=True, null=True)),
+                ("computed_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["days_of_cover"], name="products_st_days_of_f46f95_idx"
+                    )
+                ],
+            },
+        ),
+    ]
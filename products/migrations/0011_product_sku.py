@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_stockforecast"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="sku",
+            field=models.CharField(
+                blank=True,
+                help_text="Stock keeping unit used to match catalogue imports",
+                max_length=64,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
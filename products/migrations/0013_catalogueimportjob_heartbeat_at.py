@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:13
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeat_at(apps, schema_editor):
+    # Jobs running during the upgrade last reported in at their last update
+    CatalogueImportJob = apps.get_model("products", "CatalogueImportJob")
+    CatalogueImportJob.objects.filter(status="Running").update(
+        heartbeat_at=F("updated_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_catalogueimportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catalogueimportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeat_at, migrations.RunPython.noop),
+    ]
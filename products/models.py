@@ -1,26 +1,154 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.dispatch import receiver
+from django.utils import timezone
 from datetime import datetime
+from decimal import Decimal
+
+from leads.models import ImportJob
+
+from .sales_cache import product_sales_cache
+
+# Shortest query matched anywhere in a product name rather than as a prefix
+MIN_SUBSTRING_SEARCH = 3
+
+
+def price_change(percent=None, amount=None):
+    # The price after a percent or absolute change, rounded to cents and never
+    # below zero, as an expression so the database computes it
+    if (percent is None) == (amount is None):
+        raise ValueError("Give either a percent or an amount.")
+    price_field = models.DecimalField(max_digits=10, decimal_places=2)
+    if percent is not None:
+        new_price = F("price") * Value(1 + Decimal(percent) / 100)
+    else:
+        new_price = F("price") + Value(Decimal(amount))
+    return Greatest(
+        Round(new_price, 2, output_field=price_field),
+        Value(Decimal("0")),
+        output_field=price_field,
+    )
+
+
+# Queries used by the product pickers and bulk repricing
+class ProductQuerySet(models.QuerySet):
+    def in_stock(self):
+        return self.filter(stock_quantity__gt=0)
+
+    def search(self, query):
+        # Names starting with the query first, then names containing it.
+        # Substrings shorter than a trigram cannot use the trigram index, so
+        # short queries only match prefixes, which the prefix index serves.
+        query = query.strip()
+        if not query:
+            return self.order_by("name", "pk")
+        if len(query) < MIN_SUBSTRING_SEARCH:
+            return self.filter(name__istartswith=query).order_by("name", "pk")
+        return (
+            self.filter(name__icontains=query)
+            .annotate(
+                prefix_match=Case(
+                    When(name__istartswith=query, then=Value(0)),
+                    default=Value(1),
+                    output_field=models.IntegerField(),
+                )
+            )
+            .order_by("prefix_match", "name", "pk")
+        )
+
+    def with_new_price(self, percent=None, amount=None):
+        return self.annotate(new_price=price_change(percent, amount))
+
+    def reprice(self, percent=None, amount=None):
+        # Changes the prices of all matching products in one UPDATE and records
+        # the changes in bulk, skipping the per-product save; returns the
+        # PriceHistory rows created
+        with transaction.atomic():
+            changes = [
+                (pk, old_price, new_price)
+                for pk, old_price, new_price in self.select_for_update()
+                .with_new_price(percent, amount)
+                .values_list("pk", "price", "new_price")
+                if old_price != new_price
+            ]
+            product_ids = [pk for pk, old_price, new_price in changes]
+            if not product_ids:
+                return []
+            Product.objects.filter(pk__in=product_ids).update(
+                price=price_change(percent, amount)
+            )
+            changed_at = timezone.now()
+            history = PriceHistory.objects.bulk_create(
+                [
+                    PriceHistory(
+                        product_id=pk,
+                        old_price=old_price,
+                        new_price=new_price,
+                        changed_at=changed_at,
+                    )
+                    for pk, old_price, new_price in changes
+                ],
+                batch_size=1000,
+            )
+
+        # bulk_create sends no post_save, so the price cache is told directly
+        from .pricing import price_cache
+
+        price_cache.invalidate(product_ids)
+        return history
 
 
 # Model representing a product in the system
 class Product(models.Model):
+    sku = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Stock keeping unit used to match catalogue imports",
+    )
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.PositiveIntegerField(default=0)
 
+    objects = ProductQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            old_product = Product.objects.get(pk=self.pk)
-            if old_product.price != self.price:  # Check if the price has changed
-                # Record the price change in the PriceHistory model
-                PriceHistory.objects.create(
+        # A save limited by update_fields only records changes to the fields
+        # it writes
+        update_fields = kwargs.get("update_fields")
+        writes_price = update_fields is None or "price" in update_fields
+        writes_stock = update_fields is None or "stock_quantity" in update_fields
+        with transaction.atomic():
+            stock_change = self.stock_quantity if writes_stock else 0
+            reason = "Opening stock"
+            if self.pk:
+                # Locked until the write, so the recorded stock change is
+                # exactly what this save replaces
+                old_product = Product.objects.select_for_update().get(pk=self.pk)
+                if writes_price and old_product.price != self.price:
+                    # Record the price change in the PriceHistory model
+                    PriceHistory.objects.create(
+                        product=self,
+                        old_price=old_product.price,
+                        new_price=self.price,
+                        changed_at=datetime.now(),
+                    )
+                if writes_stock:
+                    stock_change = self.stock_quantity - old_product.stock_quantity
+                reason = "Manual stock edit"
+            super().save(*args, **kwargs)
+            # Stock edited through forms or the admin is recorded in the ledger
+            if stock_change:
+                StockMovement.objects.create(
                     product=self,
-                    old_price=old_product.price,
-                    new_price=self.price,
-                    changed_at=datetime.now(),
+                    kind=StockMovement.Kind.ADJUST,
+                    quantity=stock_change,
+                    reason=reason,
                 )
-        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -35,6 +163,10 @@ class PriceHistory(models.Model):
     new_price = models.DecimalField(max_digits=10, decimal_places=2)
     changed_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Serves "latest change at or before T" lookups per product
+        indexes = [models.Index(fields=["product", "changed_at"])]
+
     @property
     def price_delta(self):
         return self.new_price - self.old_price
@@ -45,3 +177,297 @@ class PriceHistory(models.Model):
 
     def __str__(self):
         return f"{self.product.name}: {self.old_price} -> {self.new_price} at {self.changed_at}"
+
+
+# Raised when a reservation asks for more units than are in stock
+class InsufficientStock(ValueError):
+    def __init__(self, product, available):
+        self.product = product
+        self.available = available
+        super().__init__(
+            f"Insufficient stock for {product.name}. Available: {available}."
+        )
+
+
+# Writes stock movements together with atomic updates of the stored quantity
+class StockMovementManager(models.Manager):
+    def reserve(self, items, order=None, reason=""):
+        # Takes (product, quantity) pairs out of stock, all or none
+        movements = []
+        with transaction.atomic():
+            # Products are updated in pk order so concurrent orders cannot deadlock
+            for product, quantity in sorted(items, key=lambda item: item[0].pk):
+                updated = Product.objects.filter(
+                    pk=product.pk, stock_quantity__gte=quantity
+                ).update(stock_quantity=F("stock_quantity") - quantity)
+                if not updated:
+                    available = (
+                        Product.objects.filter(pk=product.pk)
+                        .values_list("stock_quantity", flat=True)
+                        .first()
+                    )
+                    raise InsufficientStock(product, available or 0)
+                movements.append(
+                    self.model(
+                        product=product,
+                        order=order,
+                        kind=self.model.Kind.RESERVE,
+                        quantity=-quantity,
+                        reason=reason,
+                    )
+                )
+            return self.bulk_create(movements)
+
+    def release(self, orders, reason=""):
+        # Puts the products of the given orders back into stock
+        from orders.models import OrderProduct
+
+        lines = (
+            OrderProduct.objects.filter(order__in=orders, product__isnull=False)
+            .values("order_id", "product_id")
+            .annotate(quantity=Sum("quantity"))
+            .order_by("product_id", "order_id")
+        )
+        movements = [
+            self.model(
+                product_id=line["product_id"],
+                order_id=line["order_id"],
+                kind=self.model.Kind.RELEASE,
+                quantity=line["quantity"],
+                reason=reason,
+            )
+            for line in lines
+            if line["quantity"]
+        ]
+        totals = {}
+        for movement in movements:
+            totals[movement.product_id] = (
+                totals.get(movement.product_id, 0) + movement.quantity
+            )
+
+        with transaction.atomic():
+            for product_id, quantity in totals.items():
+                Product.objects.filter(pk=product_id).update(
+                    stock_quantity=F("stock_quantity") + quantity
+                )
+            return self.bulk_create(movements)
+
+    def adjust(self, product, quantity, reason=""):
+        # Corrects stock by a signed quantity, e.g. after a stocktake
+        with transaction.atomic():
+            Product.objects.filter(pk=product.pk).update(
+                stock_quantity=F("stock_quantity") + quantity
+            )
+            return self.create(
+                product=product,
+                kind=self.model.Kind.ADJUST,
+                quantity=quantity,
+                reason=reason,
+            )
+
+    def discrepancies(self):
+        # Products whose stored stock differs from the sum of their movements
+        return (
+            Product.objects.annotate(
+                ledger_quantity=Coalesce(Sum("stock_movements__quantity"), 0)
+            )
+            .exclude(stock_quantity=F("ledger_quantity"))
+            .order_by("pk")
+        )
+
+
+# Append-only record of every change to a product's stock
+class StockMovement(models.Model):
+    class Kind(models.TextChoices):
+        RESERVE = "reserve", "Reserve"
+        RELEASE = "release", "Release"
+        ADJUST = "adjust", "Adjust"
+
+    product = models.ForeignKey(
+        Product, related_name="stock_movements", on_delete=models.CASCADE
+    )
+    order = models.ForeignKey(
+        "orders.Order",
+        related_name="stock_movements",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    quantity = models.IntegerField(help_text="Signed change in stock")
+    reason = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = StockMovementManager()
+
+    class Meta:
+        indexes = [models.Index(fields=["product", "created_at"])]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity:+d} ({self.kind})"
+
+
+# Maintains the co-occurrence counts behind "frequently bought together"
+class ProductCooccurrenceManager(models.Manager):
+    def record_paid_order(self, order):
+        # Counts every pair of distinct products in a newly paid order
+        product_ids = set(
+            order.order_products.filter(product__isnull=False).values_list(
+                "product_id", flat=True
+            )
+        )
+        if len(product_ids) < 2:
+            return
+        with transaction.atomic():
+            # Missing pairs are inserted at zero first, so the increment below
+            # never races with another order creating the same pair
+            self.bulk_create(
+                [
+                    self.model(product_id=product_id, other_product_id=other_id)
+                    for product_id in product_ids
+                    for other_id in product_ids
+                    if product_id != other_id
+                ],
+                ignore_conflicts=True,
+            )
+            self.filter(
+                product_id__in=product_ids, other_product_id__in=product_ids
+            ).update(orders=F("orders") + 1)
+
+        from .recommendations import suggestion_cache
+
+        suggestion_cache.invalidate(product_ids)
+
+    def rebuild(self):
+        # Recounts all pairs from paid orders, e.g. after orders were edited
+        from orders.models import OrderProduct
+
+        pairs = (
+            OrderProduct.objects.filter(order__status="Paid", product__isnull=False)
+            .annotate(other_product=F("order__order_products__product"))
+            .filter(other_product__isnull=False)
+            .exclude(other_product=F("product"))
+            .values("product", "other_product")
+            .annotate(orders=Count("order", distinct=True))
+            .order_by()
+        )
+        with transaction.atomic():
+            self.all().delete()
+            created = self.bulk_create(
+                (
+                    self.model(
+                        product_id=pair["product"],
+                        other_product_id=pair["other_product"],
+                        orders=pair["orders"],
+                    )
+                    for pair in pairs.iterator()
+                ),
+                batch_size=1000,
+            )
+
+        from .recommendations import suggestion_cache
+
+        suggestion_cache.invalidate()
+        return len(created)
+
+    def top_for(self, product_id, limit):
+        # Products most often bought with the given one, as (id, orders) pairs
+        return list(
+            self.filter(product_id=product_id, orders__gt=0)
+            .order_by("-orders", "other_product_id")
+            .values_list("other_product_id", "orders")[:limit]
+        )
+
+
+# Number of paid orders containing both products; each pair is stored in both
+# directions so a product's suggestions are one index range scan
+class ProductCooccurrence(models.Model):
+    product = models.ForeignKey(
+        Product, related_name="cooccurrences", on_delete=models.CASCADE
+    )
+    other_product = models.ForeignKey(
+        Product, related_name="+", on_delete=models.CASCADE
+    )
+    orders = models.PositiveIntegerField(default=0)
+
+    objects = ProductCooccurrenceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "other_product"], name="unique_product_pair"
+            )
+        ]
+        indexes = [models.Index(fields=["product", "-orders"])]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_product_id}: {self.orders} order(s)"
+
+
+# Latest stock depletion forecast of a product, rewritten by forecast_stock
+class StockForecast(models.Model):
+    product = models.OneToOneField(
+        Product, related_name="forecast", on_delete=models.CASCADE, primary_key=True
+    )
+    daily_demand = models.FloatField(help_text="Weighted average units sold per day")
+    days_of_cover = models.FloatField(
+        null=True, blank=True, help_text="Empty when the product is not selling"
+    )
+    stockout_date = models.DateField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["days_of_cover"])]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.days_of_cover} day(s) of cover"
+
+
+# Catalogue upload imported in the background by process_catalogue_imports
+class CatalogueImportJob(ImportJob):
+    COUNTERS = (
+        "rows_processed",
+        "inserted",
+        "updated",
+        "unchanged",
+        "skipped",
+        "price_changes",
+    )
+
+    file = models.FileField(upload_to="catalogue_imports/")
+    inserted = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    price_changes = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Catalogue import #{self.pk} ({self.status})"
+
+
+@receiver(post_save, sender="orders.Order")
+def invalidate_sales_cache_on_order_save(sender, instance, **kwargs):
+    # Paying or un-paying an order changes the sales of the month it is dated in
+    if getattr(instance, "_paid_changed", False):
+        product_sales_cache.invalidate_month(instance.date_created)
+
+
+@receiver(post_delete, sender="orders.Order")
+def invalidate_sales_cache_on_order_delete(sender, instance, **kwargs):
+    # Deleting a paid order removes it from its month's sales
+    if instance.status == "Paid":
+        product_sales_cache.invalidate_month(instance.date_created)
+
+
+@receiver(post_save, sender=PriceHistory)
+def invalidate_price_cache_on_price_change(sender, instance, **kwargs):
+    # A new price change alters the product's cached price timeline
+    from .pricing import price_cache
+
+    price_cache.invalidate([instance.product_id])
+
+
+@receiver(post_save, sender="orders.Order")
+def update_cooccurrences_on_order_paid(sender, instance, **kwargs):
+    # Adds a newly paid order's product pairs to the co-occurrence counts
+    if getattr(instance, "_became_paid", False):
+        ProductCooccurrence.objects.record_paid_order(instance)
@@ -0,0 +1,164 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import PriceHistory, Product
+
+# (product, timestamp) pairs resolved per query, well below SQLite's
+# limit of 999 bound parameters
+PAIRS_PER_QUERY = 300
+# Seconds a cached timeline is trusted; price changes made by other processes
+# show up after this
+PRICE_CACHE_TIMEOUT = 600
+
+
+def list_price_at(product="product", at="date_created"):
+    # Expression for a product's list price at a moment, for annotating rows
+    # such as order lines: the price set by the last change at or before the
+    # moment, else the price before the first later change, else the current
+    # price. Each branch is one probe of the (product, changed_at) index.
+    changes = PriceHistory.objects.filter(product=OuterRef(product))
+    return Coalesce(
+        Subquery(
+            changes.filter(changed_at__lte=OuterRef(at))
+            .order_by("-changed_at", "-pk")
+            .values("new_price")[:1]
+        ),
+        Subquery(
+            changes.filter(changed_at__gt=OuterRef(at))
+            .order_by("changed_at", "pk")
+            .values("old_price")[:1]
+        ),
+        Subquery(Product.objects.filter(pk=OuterRef(product)).values("price")[:1]),
+    )
+
+
+AS_OF_SQL = """
+WITH pairs (pair_index, product_id, at) AS (VALUES {values})
+SELECT pairs.pair_index, COALESCE(
+    (SELECT h.new_price FROM {history} h
+     WHERE h.product_id = pairs.product_id AND h.changed_at <= pairs.at
+     ORDER BY h.changed_at DESC, h.id DESC LIMIT 1),
+    (SELECT h.old_price FROM {history} h
+     WHERE h.product_id = pairs.product_id AND h.changed_at > pairs.at
+     ORDER BY h.changed_at, h.id LIMIT 1),
+    p.price
+)
+FROM pairs JOIN {product} p ON p.id = pairs.product_id
+"""
+
+
+def prices_as_of(pairs):
+    # List prices for many (product_id, timestamp) pairs, in input order, with
+    # one query per PAIRS_PER_QUERY pairs; unknown products give None
+    pairs = list(pairs)
+    prices = [None] * len(pairs)
+    price_field = Product._meta.get_field("price")
+    sql = AS_OF_SQL.format(
+        values="{values}",
+        history=connection.ops.quote_name(PriceHistory._meta.db_table),
+        product=connection.ops.quote_name(Product._meta.db_table),
+    )
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(pairs), PAIRS_PER_QUERY):
+            chunk = pairs[start : start + PAIRS_PER_QUERY]
+            params = []
+            for index, (product_id, at) in enumerate(chunk, start):
+                params += [
+                    index,
+                    product_id,
+                    connection.ops.adapt_datetimefield_value(at),
+                ]
+            cursor.execute(
+                sql.format(values=", ".join(["(%s, %s, %s)"] * len(chunk))), params
+            )
+            for index, price in cursor.fetchall():
+                prices[index] = price_field.to_python(price)
+    return prices
+
+
+# In-process cache of each product's price changes, sorted by time, so repeated
+# lookups for the same products are answered with bisect instead of queries
+class PriceHistoryCache:
+    def __init__(self, max_products=10000, timeout=PRICE_CACHE_TIMEOUT):
+        self.max_products = max_products
+        self.timeout = timeout
+        self._timelines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, product_ids):
+        # Fetches the timelines of products not cached yet or expired, in two queries
+        with self._lock:
+            current = time.monotonic()
+            missing = {
+                pk
+                for pk in product_ids
+                if pk not in self._timelines or self._timelines[pk][0] <= current
+            }
+        if not missing:
+            return
+
+        # Unknown products are cached as None so they are not looked up again
+        timelines = dict.fromkeys(missing)
+        timelines.update(
+            (pk, ([], [], price))
+            for pk, price in Product.objects.filter(pk__in=missing).values_list(
+                "pk", "price"
+            )
+        )
+        changes = (
+            PriceHistory.objects.filter(product_id__in=missing)
+            .order_by("product_id", "changed_at", "pk")
+            .values_list("product_id", "changed_at", "old_price", "new_price")
+        )
+        for product_id, changed_at, old_price, new_price in changes:
+            timestamps, prices, first_price = timelines[product_id]
+            if not timestamps:
+                # Before its first change a product sold at the old price
+                timelines[product_id] = (timestamps, prices, old_price)
+            timestamps.append(changed_at)
+            prices.append(new_price)
+
+        expires = time.monotonic() + self.timeout
+        with self._lock:
+            for pk, timeline in timelines.items():
+                self._timelines[pk] = (expires, timeline)
+                self._timelines.move_to_end(pk)
+            while len(self._timelines) > self.max_products:
+                self._timelines.popitem(last=False)
+
+    def price_at(self, product_id, at):
+        # List price of one product at a moment; None for unknown products
+        self.load([product_id])
+        with self._lock:
+            expires, timeline = self._timelines.get(product_id, (None, None))
+            if timeline is None:
+                return None
+            self._timelines.move_to_end(product_id)
+        timestamps, prices, first_price = timeline
+        position = bisect_right(timestamps, at)
+        return prices[position - 1] if position else first_price
+
+    def prices_at(self, pairs):
+        # List prices for many (product_id, timestamp) pairs, in input order
+        pairs = list(pairs)
+        self.load({product_id for product_id, at in pairs})
+        return [self.price_at(product_id, at) for product_id, at in pairs]
+
+    def invalidate(self, product_ids=None):
+        # Drops the given products, or everything, after their prices change
+        with self._lock:
+            if product_ids is None:
+                self._timelines.clear()
+                return
+            for product_id in product_ids:
+                self._timelines.pop(product_id, None)
+
+
+price_cache = PriceHistoryCache()
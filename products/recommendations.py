@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .models import Product, ProductCooccurrence
+
+# Suggestions kept per product, enough to fill a list after removing the
+# products already in the order
+SUGGESTIONS_PER_PRODUCT = 20
+# Seconds a cached list is trusted; other processes' updates show up after this
+SUGGESTION_TIMEOUT = 600
+
+
+# In-process LRU of each product's top co-occurring products
+class SuggestionCache:
+    def __init__(self, max_products=5000, timeout=SUGGESTION_TIMEOUT):
+        self.max_products = max_products
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def top_for(self, product_id):
+        # (product_id, orders) pairs for one product, from the table on a miss
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(product_id)
+                return entry[1]
+
+        top = ProductCooccurrence.objects.top_for(product_id, SUGGESTIONS_PER_PRODUCT)
+        with self._lock:
+            self._entries[product_id] = (time.monotonic() + self.timeout, top)
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_products:
+                self._entries.popitem(last=False)
+        return top
+
+    def invalidate(self, product_ids=None):
+        # Drops the given products, or everything, after their counts change
+        with self._lock:
+            if product_ids is None:
+                self._entries.clear()
+                return
+            for product_id in product_ids:
+                self._entries.pop(product_id, None)
+
+
+suggestion_cache = SuggestionCache()
+
+
+def frequently_bought_together(product_ids, limit=5, in_stock=False):
+    # Products most often bought with the given ones, best first. Counts are
+    # summed over the given products, which are never suggested themselves.
+    product_ids = set(product_ids)
+    scores = {}
+    for product_id in product_ids:
+        for other_id, orders in suggestion_cache.top_for(product_id):
+            if other_id not in product_ids:
+                scores[other_id] = scores.get(other_id, 0) + orders
+    if not scores:
+        return []
+
+    products = Product.objects.filter(pk__in=scores)
+    if in_stock:
+        products = products.in_stock()
+    return sorted(products, key=lambda product: (-scores[product.pk], product.pk))[
+        :limit
+    ]
@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+LAST_30_DAYS = "last_30_days"
+
+# Periods that can still change (the last 30 days, the current month) are
+# cached briefly; closed months are cached until an order in them changes.
+# Version bumps only reach the processes sharing the cache backend, so closed
+# months also expire after a day to bound how stale another worker can be.
+LIVE_TIMEOUT = 60
+CLOSED_TIMEOUT = 60 * 60 * 24
+
+# How long a rebuild may hold the lock, and how long other requests wait for it
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def month_start(year, month):
+    # First instant of a month in the current time zone
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def sales_period(time_frame, current=None):
+    # Returns (start, end, closed) for "last_30_days" or a "YYYY-MM" month
+    current = current or timezone.now()
+    if time_frame == LAST_30_DAYS:
+        return current - timedelta(days=30), current, False
+
+    year, month = map(int, time_frame.split("-"))
+    next_month = month % 12 + 1
+    next_year = year + (1 if next_month == 1 else 0)
+    start_date = month_start(year, month)
+    end_date = month_start(next_year, next_month)
+    return start_date, end_date, end_date <= current
+
+
+# Caches sales aggregates per period, with one rebuild at a time per period
+class SalesPeriodCache:
+    def __init__(
+        self,
+        prefix="product_sales",
+        live_timeout=LIVE_TIMEOUT,
+        closed_timeout=CLOSED_TIMEOUT,
+    ):
+        self.prefix = prefix
+        self.live_timeout = live_timeout
+        self.closed_timeout = closed_timeout
+
+    def month_key(self, value):
+        # "YYYY-MM" of a datetime in the current time zone
+        return timezone.localtime(value).strftime("%Y-%m")
+
+    def version_key(self, month):
+        return f"{self.prefix}:version:{month}"
+
+    def month_version(self, month):
+        # A fresh version starts from the clock, so an evicted version key can
+        # never bring back data cached under an older one
+        initial = time.time_ns()
+        cache.add(self.version_key(month), initial, timeout=None)
+        return cache.get(self.version_key(month), initial)
+
+    def invalidate_month(self, value):
+        # Moves the month containing value to a new version
+        key = self.version_key(self.month_key(value))
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+    def get(self, time_frame, compute, current=None):
+        # Returns the cached data for a period, computing it on a miss
+        start_date, end_date, closed = sales_period(time_frame, current)
+        if closed:
+            month = self.month_key(start_date)
+            key = f"{self.prefix}:{month}:v{self.month_version(month)}"
+            return self.get_or_compute(
+                key,
+                lambda: compute(start_date, end_date),
+                self.closed_timeout,
+                "closed",
+            )
+        key = f"{self.prefix}:live:{time_frame}"
+        return self.get_or_compute(
+            key, lambda: compute(start_date, end_date), self.live_timeout, "live"
+        )
+
+    def get_or_compute(self, key, compute, timeout, kind):
+        # Single-flight: one request rebuilds a missing key, the others wait for it
+        value = cache.get(key)
+        if value is not None:
+            self.count(kind, "hits")
+            return value
+        self.count(kind, "misses")
+
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + LOCK_WAIT
+        while not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                # The rebuild is stuck; answer this request without caching
+                return compute()
+
+        try:
+            value = cache.get(key)
+            if value is None:
+                value = compute()
+                cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    def count(self, kind, outcome):
+        key = f"{self.prefix}:stats:{kind}:{outcome}"
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    def stats(self):
+        # Hits, misses and hit ratio for closed months and live periods
+        stats = {}
+        for kind in ("closed", "live"):
+            hits = cache.get(f"{self.prefix}:stats:{kind}:hits", 0)
+            misses = cache.get(f"{self.prefix}:stats:{kind}:misses", 0)
+            total = hits + misses
+            stats[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "ratio": hits / total if total else None,
+            }
+        return stats
+
+    def reset_stats(self):
+        cache.delete_many(
+            [
+                f"{self.prefix}:stats:{kind}:{outcome}"
+                for kind in ("closed", "live")
+                for outcome in ("hits", "misses")
+            ]
+        )
+
+
+product_sales_cache = SalesPeriodCache()
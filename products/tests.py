@@ -1,7 +1,33 @@
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+
 from django.urls import reverse
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from .models import Product
+from django.contrib.messages import get_messages
+from django.utils import timezone
+from .models import (
+    CatalogueImportJob,
+    PriceHistory,
+    Product,
+    ProductCooccurrence,
+    StockForecast,
+    StockMovement,
+)
+from .recommendations import frequently_bought_together, suggestion_cache
+from .sales_cache import CLOSED_TIMEOUT, LIVE_TIMEOUT, product_sales_cache
 
 
 User = get_user_model()
@@ -49,3 +75,900 @@ class ProductViewsTestCase(TestCase):
         )  # Oczekujemy przekierowania na listę produktów
         self.assertRedirects(response, reverse("products:product-list"))
         self.assertEqual(Product.objects.count(), 0)  # Produkt został usunięty
+
+
+class ProductSalesDetailViewTestCase(TestCase):
+
+    def setUp(self):
+        from clients.models import Client
+        from orders.models import Order, OrderProduct
+
+        User.objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.client.login(username="organisor", password="password")
+        customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        paid = Order.objects.create(client=customer, status="Paid")
+        pending = Order.objects.create(client=customer, status="Pending")
+        # Seven products selling 7, 6, ... 1 units at 10.00 each
+        for index in range(7):
+            OrderProduct.objects.create(
+                order=paid,
+                product_name=f"Product {index}",
+                product_price=10,
+                quantity=7 - index,
+            )
+        OrderProduct.objects.create(
+            order=pending, product_name="Product 6", product_price=10, quantity=50
+        )
+
+    def test_report_is_one_query_with_shares_and_other(self):
+        """Test that ranks, shares and the Other slice come from a single query."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("products:all-products-statistics"), {"page": 2}
+            )
+        self.assertEqual(response.status_code, 200)
+        sales_queries = [q for q in queries if "orders_orderproduct" in q["sql"]]
+        self.assertEqual(len(sales_queries), 1)
+
+        page = response.context["product_sales"]
+        self.assertEqual(page.paginator.count, 7)
+        self.assertEqual(
+            [item["product_name"] for item in page], ["Product 5", "Product 6"]
+        )
+        self.assertEqual([item["sales_rank"] for item in page], [6, 7])
+
+        # 28 units in total: the top five sold 25, the other two 3
+        self.assertEqual(
+            response.context["chart_labels"],
+            [f"Product {index}" for index in range(5)] + ["Other"],
+        )
+        self.assertEqual(response.context["chart_quantity_data"][0], 25.0)
+        self.assertEqual(response.context["chart_quantity_data"][-1], 10.71)
+        self.assertEqual(response.context["chart_revenue_data"][-1], 10.71)
+
+
+class ProductSalesCacheTestCase(TestCase):
+
+    def setUp(self):
+        from clients.models import Client
+        from orders.models import Order, OrderProduct
+
+        cache.clear()
+        self.customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        self.march = timezone.make_aware(datetime(2024, 3, 15, 12))
+        order = Order.objects.create(
+            client=self.customer, status="Paid", date_created=self.march
+        )
+        OrderProduct.objects.create(
+            order=order, product_name="Chair", product_price=10, quantity=3
+        )
+        self.pending = Order.objects.create(
+            client=self.customer, status="Pending", date_created=self.march
+        )
+        OrderProduct.objects.create(
+            order=self.pending, product_name="Table", product_price=50, quantity=5
+        )
+
+    def sales_queries(self, time_frame):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("products:sales_data"), {"time_frame": time_frame}
+            )
+        self.assertEqual(response.status_code, 200)
+        count = len([q for q in queries if "orders_orderproduct" in q["sql"]])
+        return response.json(), count
+
+    def test_closed_month_is_cached_until_an_order_is_paid(self):
+        """Test that a closed month is served from cache until its sales change."""
+        data, count = self.sales_queries("2024-03")
+        self.assertEqual((data["labels"], count), (["Chair"], 1))
+        data, count = self.sales_queries("2024-03")
+        self.assertEqual((data["labels"], count), (["Chair"], 0))
+
+        # Cancelling an unpaid order does not touch the sales figures
+        self.pending.status = "Canceled"
+        self.pending.save()
+        data, count = self.sales_queries("2024-03")
+        self.assertEqual(count, 0)
+
+        self.pending.status = "Paid"
+        self.pending.save()
+        data, count = self.sales_queries("2024-03")
+        self.assertEqual((data["labels"], count), (["Table", "Chair"], 1))
+
+        stats = product_sales_cache.stats()["closed"]
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+        self.assertEqual(stats["ratio"], 0.5)
+
+    def test_live_periods_use_a_short_timeout(self):
+        """Test that the last 30 days are cached with the live timeout."""
+        with patch("django.core.cache.cache.set", wraps=cache.set) as cache_set:
+            self.sales_queries("last_30_days")
+        self.assertEqual(cache_set.call_args.kwargs["timeout"], LIVE_TIMEOUT)
+        self.assertEqual(product_sales_cache.stats()["live"]["misses"], 1)
+
+    def test_closed_months_expire(self):
+        """Test that closed months are cached with a bounded timeout."""
+        with patch("django.core.cache.cache.set", wraps=cache.set) as cache_set:
+            self.sales_queries("2024-03")
+        self.assertEqual(cache_set.call_args.kwargs["timeout"], CLOSED_TIMEOUT)
+
+    def test_errors_while_computing_are_not_reported_as_bad_input(self):
+        """Test that only the time frame itself is validated as user input."""
+        with patch(
+            "products.views.top_selling_products", side_effect=ValueError("bug")
+        ):
+            with self.assertRaises(ValueError):
+                self.client.get(
+                    reverse("products:sales_data"), {"time_frame": "2024-03"}
+                )
+
+    def test_waiting_request_reuses_the_lock_holders_result(self):
+        """Test that a request waiting on the rebuild lock does not recompute."""
+        key = "product_sales:test"
+        cache.add(f"{key}:lock", 1)
+        compute = Mock(return_value={"labels": []})
+
+        def finish_rebuild(seconds):
+            cache.set(key, {"labels": ["Chair"]})
+
+        with patch("products.sales_cache.time.sleep", side_effect=finish_rebuild):
+            value = product_sales_cache.get_or_compute(key, compute, 60, "live")
+        self.assertEqual(value, {"labels": ["Chair"]})
+        compute.assert_not_called()
+
+    def test_invalid_time_frame(self):
+        """Test that a malformed time frame is rejected."""
+        response = self.client.get(
+            reverse("products:sales_data"), {"time_frame": "March"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse("products:sales_data"), {"time_frame": "2024-13"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class StockMovementTestCase(TestCase):
+
+    def setUp(self):
+        from clients.models import Client
+        from leads.models import Agent
+
+        user = User.objects.create_user(
+            username="agent", password="password", is_organisor=False
+        )
+        Agent.objects.create(user=user)
+        self.client.login(username="agent", password="password")
+        self.customer = Client.objects.create(
+            first_name="Jan", last_name="Nowak", email="jan@example.com"
+        )
+        self.chair = Product.objects.create(name="Chair", price=10, stock_quantity=5)
+        self.table = Product.objects.create(name="Table", price=50, stock_quantity=1)
+
+    def create_order(self, chairs, tables):
+        return self.client.post(
+            reverse("orders:order-create"),
+            {
+                "client": self.customer.pk,
+                "product": [self.chair.pk, self.table.pk],
+                f"quantity_{self.chair.pk}": chairs,
+                f"quantity_{self.table.pk}": tables,
+                "discount": "0",
+            },
+        )
+
+    def assertStock(self, chairs, tables):
+        self.chair.refresh_from_db()
+        self.table.refresh_from_db()
+        self.assertEqual(
+            (self.chair.stock_quantity, self.table.stock_quantity), (chairs, tables)
+        )
+        self.assertFalse(StockMovement.objects.discrepancies().exists())
+
+    def test_order_reserves_and_cancel_releases_once(self):
+        """Test that orders move stock through the ledger, all or nothing."""
+        from orders.models import Order
+
+        response = self.create_order(chairs=2, tables=1)
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.get()
+        self.assertStock(3, 0)
+        self.assertEqual(
+            sorted(order.stock_movements.values_list("kind", "quantity")),
+            [("reserve", -2), ("reserve", -1)],
+        )
+
+        # Not enough tables left: nothing is reserved and no order is created
+        response = self.create_order(chairs=1, tables=1)
+        self.assertContains(response, "Insufficient stock for Table. Available: 0.")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertStock(3, 0)
+
+        url = reverse("orders:order-detail", kwargs={"pk": order.pk})
+        self.client.post(url, {"cancel_order": "1"})
+        self.client.post(url, {"cancel_order": "1"})
+        self.assertStock(5, 1)
+        self.assertEqual(
+            order.stock_movements.filter(kind=StockMovement.Kind.RELEASE).count(), 2
+        )
+
+    def test_manual_edits_are_recorded(self):
+        """Test that editing stock through save() records an adjustment."""
+        self.chair.stock_quantity = 8
+        self.chair.save()
+        movement = self.chair.stock_movements.latest("pk")
+        self.assertEqual((movement.kind, movement.quantity), ("adjust", 3))
+        self.assertStock(8, 1)
+
+    def test_save_without_stock_leaves_reservations_alone(self):
+        """Test that a save not writing stock neither overwrites nor records it."""
+        stale = Product.objects.get(pk=self.chair.pk)
+        Product.objects.filter(pk=self.chair.pk).update(
+            stock_quantity=F("stock_quantity") - 2
+        )
+        movements = StockMovement.objects.count()
+
+        stale.name = "Armchair"
+        stale.save(update_fields=["name"])
+        self.chair.refresh_from_db()
+        self.assertEqual((self.chair.name, self.chair.stock_quantity), ("Armchair", 3))
+        self.assertEqual(StockMovement.objects.count(), movements)
+
+    def test_reconcile_stock(self):
+        """Test that the command reports drift and can record a correction."""
+        out = StringIO()
+        call_command("reconcile_stock", stdout=out)
+        self.assertIn("Stock matches the ledger.", out.getvalue())
+
+        Product.objects.filter(pk=self.chair.pk).update(stock_quantity=9)
+        with self.assertRaises(CommandError):
+            call_command("reconcile_stock", stdout=StringIO())
+
+        call_command("reconcile_stock", "--fix", stdout=StringIO())
+        self.assertStock(9, 1)
+
+
+class ProductSearchTestCase(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.client.login(username="organisor", password="password")
+        for name, stock in [
+            ("Armchair", 2),
+            ("Chair", 5),
+            ("Chair cushion", 0),
+            ("Table", 1),
+        ]:
+            Product.objects.create(name=name, price=10, stock_quantity=stock)
+
+    def search(self, **params):
+        response = self.client.get(reverse("products:product-search"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_matches_come_first(self):
+        """Test that names starting with the query rank above other matches."""
+        data = self.search(q="chair")
+        self.assertEqual(
+            [product["name"] for product in data["products"]],
+            ["Chair", "Chair cushion", "Armchair"],
+        )
+        self.assertIsNone(data["next_page"])
+
+    def test_in_stock_filter_and_pages(self):
+        """Test that out-of-stock products can be hidden and results are paged."""
+        data = self.search(q="chair", in_stock="1")
+        self.assertEqual(
+            [product["name"] for product in data["products"]], ["Chair", "Armchair"]
+        )
+
+        with patch("products.views.ProductSearchView.page_size", 2):
+            first = self.search(in_stock="1")
+            second = self.search(in_stock="1", page=first["next_page"])
+        self.assertEqual(first["next_page"], 2)
+        self.assertEqual(
+            [product["name"] for product in first["products"] + second["products"]],
+            ["Armchair", "Chair", "Table"],
+        )
+        self.assertIsNone(second["next_page"])
+
+    def test_short_queries_match_prefixes_only(self):
+        """Test that queries shorter than a trigram only match name prefixes."""
+        data = self.search(q="ch")
+        self.assertEqual(
+            [product["name"] for product in data["products"]],
+            ["Chair", "Chair cushion"],
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "Expression indexes need PostgreSQL")
+    def test_search_is_indexed(self):
+        """Test that the name search is backed by the prefix index."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE indexname = %s",
+                ["product_name_prefix_idx"],
+            )
+            self.assertIn("text_pattern_ops", cursor.fetchone()[0])
+
+    def test_order_form_does_not_load_the_catalogue(self):
+        """Test that the order form renders without listing products."""
+        from leads.models import Agent
+
+        Agent.objects.create(user=User.objects.get(username="organisor"))
+        response = self.client.get(reverse("orders:order-create"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse("products:product-search"))
+        self.assertNotContains(response, "Armchair")
+
+
+class PriceAsOfTestCase(TestCase):
+
+    def setUp(self):
+        from .pricing import price_cache
+
+        price_cache.invalidate()
+        self.start = timezone.make_aware(datetime(2024, 1, 1))
+        self.chair = Product.objects.create(name="Chair", price=10)
+        self.table = Product.objects.create(name="Table", price=50)
+        # Chair: 10 -> 12 on day 10, 12 -> 15 on day 20; the table never changes
+        for day, old_price, new_price in [(10, 10, 12), (20, 12, 15)]:
+            change = PriceHistory.objects.create(
+                product=self.chair, old_price=old_price, new_price=new_price
+            )
+            PriceHistory.objects.filter(pk=change.pk).update(
+                changed_at=self.start + timedelta(days=day)
+            )
+        Product.objects.filter(pk=self.chair.pk).update(price=15)
+        self.pairs = [
+            (self.chair.pk, self.start + timedelta(days=5)),
+            (self.chair.pk, self.start + timedelta(days=10)),
+            (self.chair.pk, self.start + timedelta(days=15)),
+            (self.chair.pk, self.start + timedelta(days=25)),
+            (self.table.pk, self.start),
+            (0, self.start),
+        ]
+        self.expected = [
+            Decimal("10"),
+            Decimal("12"),
+            Decimal("12"),
+            Decimal("15"),
+            Decimal("50"),
+            None,
+        ]
+
+    def test_bulk_lookup_in_one_query(self):
+        """Test that many (product, time) pairs resolve in a single query."""
+        from .pricing import prices_as_of
+
+        with self.assertNumQueries(1):
+            self.assertEqual(prices_as_of(self.pairs), self.expected)
+
+    def test_cache_answers_repeated_lookups_without_queries(self):
+        """Test that the bisect cache matches SQL and reuses loaded timelines."""
+        from .pricing import price_cache
+
+        with self.assertNumQueries(2):
+            self.assertEqual(price_cache.prices_at(self.pairs), self.expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(price_cache.prices_at(self.pairs), self.expected)
+
+        # A new change drops the product from the cache
+        self.chair.price = 20
+        self.chair.save()
+        self.assertEqual(price_cache.price_at(self.chair.pk, timezone.now()), 20)
+
+    def test_cached_timelines_expire(self):
+        """Test that a price change made elsewhere shows up after the timeout."""
+        from .pricing import PRICE_CACHE_TIMEOUT, price_cache
+
+        now = timezone.now()
+        self.assertEqual(price_cache.price_at(self.chair.pk, now), 15)
+        # Another process changes the price; this one is not told
+        PriceHistory.objects.create(product=self.chair, old_price=15, new_price=18)
+        self.assertEqual(price_cache.price_at(self.chair.pk, now), 15)
+
+        later = time.monotonic() + PRICE_CACHE_TIMEOUT + 1
+        with patch("products.pricing.time.monotonic", return_value=later):
+            self.assertEqual(price_cache.price_at(self.chair.pk, timezone.now()), 18)
+
+    def test_order_lines_annotated_with_list_price(self):
+        """Test that order lines can be compared to the list price of their date."""
+        from clients.models import Client
+        from orders.models import Order, OrderProduct
+
+        from .pricing import list_price_at
+
+        customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        order = Order.objects.create(
+            client=customer, date_created=self.start + timedelta(days=15)
+        )
+        OrderProduct.objects.create(
+            order=order, product=self.chair, product_price=9, quantity=1
+        )
+        line = OrderProduct.objects.annotate(
+            list_price=list_price_at("product", "order__date_created")
+        ).get()
+        self.assertEqual(line.list_price, Decimal("12"))
+
+
+class ProductCooccurrenceTestCase(TestCase):
+
+    def setUp(self):
+        from clients.models import Client
+
+        User.objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.client.login(username="organisor", password="password")
+        suggestion_cache.invalidate()
+        self.customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        self.chair, self.table, self.lamp, self.rug = [
+            Product.objects.create(name=name, price=10, stock_quantity=5)
+            for name in ["Chair", "Table", "Lamp", "Rug"]
+        ]
+
+    def create_order(self, *products, status="Paid"):
+        from orders.models import Order, OrderProduct
+
+        order = Order.objects.create(client=self.customer)
+        for product in products:
+            OrderProduct.objects.create(
+                order=order, product=product, product_price=10, quantity=1
+            )
+        order.status = status
+        order.save()
+        return order
+
+    def counts(self):
+        return {
+            (pair.product.name, pair.other_product.name): pair.orders
+            for pair in ProductCooccurrence.objects.select_related(
+                "product", "other_product"
+            )
+            if pair.orders
+        }
+
+    def test_paid_orders_update_counts_incrementally(self):
+        """Test that each newly paid order counts its product pairs once."""
+        self.create_order(self.chair, self.table, self.lamp)
+        order = self.create_order(self.chair, self.table)
+        self.create_order(self.chair, self.rug, status="Pending")
+        order.save()  # Saving an already paid order changes nothing
+
+        counts = self.counts()
+        self.assertEqual(counts[("Chair", "Table")], 2)
+        self.assertEqual(counts[("Table", "Chair")], 2)
+        self.assertEqual(counts[("Lamp", "Chair")], 1)
+        self.assertNotIn(("Chair", "Rug"), counts)
+        self.assertEqual(len(counts), 6)
+
+    def test_rebuild_matches_incremental_counts(self):
+        """Test that the nightly rebuild recounts the same pairs from scratch."""
+        self.create_order(self.chair, self.table, self.lamp)
+        self.create_order(self.chair, self.table, self.table)
+        self.create_order(self.rug)
+        incremental = self.counts()
+
+        ProductCooccurrence.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_product_cooccurrences", stdout=out)
+        self.assertIn("Rebuilt 6 product pair rows.", out.getvalue())
+        self.assertEqual(self.counts(), incremental)
+
+    def test_suggestions_for_order_lines(self):
+        """Test that suggestions sum counts, skip chosen products and are cached."""
+        self.create_order(self.chair, self.table)
+        self.create_order(self.chair, self.table)
+        self.create_order(self.chair, self.lamp)
+        self.create_order(self.table, self.rug)
+        self.create_order(self.lamp, self.rug)
+        url = reverse("products:product-suggestions")
+
+        response = self.client.get(url, {"product": [self.chair.pk]})
+        self.assertEqual(
+            [product["name"] for product in response.json()["products"]],
+            ["Table", "Lamp"],
+        )
+        response = self.client.get(url, {"product": [self.chair.pk, self.table.pk]})
+        self.assertEqual(
+            [product["name"] for product in response.json()["products"]],
+            ["Lamp", "Rug"],
+        )
+        self.assertEqual(self.client.get(url, {"product": "x"}).status_code, 400)
+
+        # Cached lists answer repeat lookups; paying an order refreshes them
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                frequently_bought_together([self.chair.pk]), [self.table, self.lamp]
+            )
+        self.create_order(self.chair, self.lamp)
+        self.create_order(self.chair, self.lamp)
+        self.assertEqual(
+            frequently_bought_together([self.chair.pk]), [self.lamp, self.table]
+        )
+
+
+class StockForecastTestCase(TestCase):
+
+    def setUp(self):
+        from clients.models import Client
+
+        User.objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.client.login(username="organisor", password="password")
+        self.customer = Client.objects.create(first_name="Jan", last_name="Nowak")
+        self.today = timezone.localdate()
+
+    def sell(self, product, quantity, days_ago, status="Paid"):
+        from orders.models import Order, OrderProduct
+
+        order = Order.objects.create(
+            client=self.customer,
+            status=status,
+            date_created=timezone.now() - timedelta(days=days_ago),
+        )
+        OrderProduct.objects.create(
+            order=order, product=product, product_price=10, quantity=quantity
+        )
+
+    def test_ewma_weights_recent_days_more(self):
+        """Test that demand is a weighted daily mean favouring recent sales."""
+        import numpy as np
+
+        from .forecast import days_of_cover, ewma_demand
+
+        # Product 0 sold 10 units on the last day, product 1 on the first day
+        demand = ewma_demand(
+            np.array([0, 1]), np.array([1, 0]), np.array([10, 10]), 3, 2, 1
+        )
+        self.assertAlmostEqual(demand[0], 10 / 1.5)
+        self.assertAlmostEqual(demand[1], 5 / 1.5)
+        self.assertEqual(demand[2], 0)
+
+        cover = days_of_cover(np.array([20, 20, 20]), demand)
+        self.assertAlmostEqual(cover[0], 3)
+        self.assertTrue(np.isnan(cover[2]))
+
+    def test_forecast_and_reorder_report(self):
+        """Test that stored forecasts drive the sortable reorder report."""
+        fast = Product.objects.create(name="Fast", price=10, stock_quantity=10)
+        slow = Product.objects.create(name="Slow", price=10, stock_quantity=10)
+        idle = Product.objects.create(name="Idle", price=10, stock_quantity=10)
+        for days_ago in range(7):
+            self.sell(fast, 5, days_ago)
+            self.sell(fast, 50, days_ago, status="Canceled")
+        self.sell(slow, 1, 3)
+
+        out = StringIO()
+        call_command("forecast_stock", "--history-days", "7", stdout=out)
+        self.assertIn("Forecast stock for 3 products.", out.getvalue())
+
+        forecast = StockForecast.objects.get(product=fast)
+        self.assertAlmostEqual(forecast.daily_demand, 5)
+        self.assertAlmostEqual(forecast.days_of_cover, 2)
+        self.assertEqual(forecast.stockout_date, self.today + timedelta(days=2))
+        self.assertIsNone(StockForecast.objects.get(product=idle).days_of_cover)
+
+        url = reverse("products:reorder-report")
+        response = self.client.get(url, {"days": 365})
+        self.assertEqual(list(response.context["forecasts"]), [forecast, slow.forecast])
+        response = self.client.get(url, {"days": 365, "sort": "name"})
+        self.assertEqual(
+            [f.product for f in response.context["forecasts"]], [fast, slow]
+        )
+        response = self.client.get(url)
+        self.assertEqual([f.product for f in response.context["forecasts"]], [fast])
+        self.assertContains(response, "Fast")
+
+    def test_sales_of_products_missing_from_snapshot_are_ignored(self):
+        """Test that products created after the snapshot do not shift sales."""
+        import numpy as np
+
+        from .forecast import load_daily_sales
+
+        first = Product.objects.create(name="First", price=10)
+        middle = Product.objects.create(name="Middle", price=10)
+        last = Product.objects.create(name="Last", price=10)
+        for product in (first, middle, last):
+            self.sell(product, 2, 0)
+
+        # Only First was in the snapshot the forecast started from
+        product_ids = np.array([first.pk])
+        product_index, day_index, quantity = load_daily_sales(
+            product_ids, self.today, 1
+        )
+        self.assertEqual(product_index.tolist(), [0])
+        self.assertEqual(quantity.tolist(), [2])
+
+        # Middle was created between the two: its sales are not given to Last
+        product_index, day_index, quantity = load_daily_sales(
+            np.array([first.pk, last.pk]), self.today, 1
+        )
+        self.assertEqual(sorted(product_index.tolist()), [0, 1])
+        self.assertEqual(quantity.tolist(), [2, 2])
+
+    def test_slow_movers_get_no_stockout_date(self):
+        """Test that covers past the horizon do not overflow the stockout date."""
+        slow = Product.objects.create(name="Slow", price=10, stock_quantity=2000)
+        self.sell(slow, 1, 89)
+
+        call_command("forecast_stock", stdout=StringIO())
+        forecast = StockForecast.objects.get(product=slow)
+        self.assertGreater(forecast.days_of_cover, 1_000_000)
+        self.assertIsNone(forecast.stockout_date)
+
+
+class RepriceTestCase(TestCase):
+
+    def setUp(self):
+        self.chair = Product.objects.create(name="Chair", price="10.00")
+        self.armchair = Product.objects.create(name="Armchair", price="99.99")
+        self.table = Product.objects.create(name="Table", price="1.00")
+
+    def prices(self):
+        return dict(Product.objects.values_list("name", "price"))
+
+    def test_reprice_in_bulk_with_history(self):
+        """Test that one statement reprices any number of products, with history."""
+        from .pricing import price_cache
+
+        price_cache.price_at(self.chair.pk, timezone.now())
+        history = Product.objects.filter(name__icontains="chair").reprice(percent=10)
+
+        self.assertEqual(len(history), 2)
+        self.assertEqual(
+            self.prices(),
+            {
+                "Chair": Decimal("11.00"),
+                "Armchair": Decimal("109.99"),
+                "Table": Decimal("1.00"),
+            },
+        )
+        change = PriceHistory.objects.get(product=self.armchair)
+        self.assertEqual(
+            (change.old_price, change.new_price),
+            (Decimal("99.99"), Decimal("109.99")),
+        )
+        # The cache was invalidated even though no signals were sent
+        self.assertEqual(
+            price_cache.price_at(self.chair.pk, timezone.now()), Decimal("11.00")
+        )
+
+        # The statement count does not depend on the number of products
+        with CaptureQueriesContext(connection) as few:
+            Product.objects.filter(pk=self.table.pk).reprice(amount=1)
+        Product.objects.bulk_create(
+            Product(name=f"Bulk {index}", price=5) for index in range(20)
+        )
+        with CaptureQueriesContext(connection) as many:
+            Product.objects.all().reprice(amount=1)
+        self.assertEqual(len(many), len(few))
+
+    def test_prices_never_go_below_zero(self):
+        """Test that large cuts stop at zero and unchanged prices get no history."""
+        Product.objects.all().reprice(amount=-5)
+        self.assertEqual(self.prices()["Table"], Decimal("0.00"))
+        self.assertEqual(self.prices()["Chair"], Decimal("5.00"))
+        self.assertEqual(
+            Product.objects.filter(pk=self.table.pk).reprice(amount=-5), []
+        )
+        self.assertEqual(PriceHistory.objects.filter(product=self.table).count(), 1)
+        with self.assertRaises(ValueError):
+            Product.objects.all().reprice()
+
+    def test_command_previews_unless_applied(self):
+        """Test that the command only prints new prices until --apply is given."""
+        out = StringIO()
+        call_command(
+            "reprice_products", "--percent", "-10", "--name", "chair", stdout=out
+        )
+        self.assertIn("89.99", out.getvalue())
+        self.assertIn("2 product(s) matched", out.getvalue())
+        self.assertEqual(self.prices()["Armchair"], Decimal("99.99"))
+
+        call_command(
+            "reprice_products",
+            "--percent",
+            "-10",
+            "--name",
+            "chair",
+            "--apply",
+            stdout=StringIO(),
+        )
+        self.assertEqual(self.prices()["Armchair"], Decimal("89.99"))
+        with self.assertRaises(CommandError):
+            call_command("reprice_products", "--amount", "1", stdout=StringIO())
+
+    def test_admin_action_with_preview(self):
+        """Test that the admin action shows a preview before applying."""
+        User.objects.create_superuser(username="admin", password="password")
+        self.client.login(username="admin", password="password")
+        url = reverse("admin:products_product_changelist")
+        data = {
+            "action": "reprice_products",
+            "_selected_action": [self.chair.pk, self.table.pk],
+        }
+
+        response = self.client.post(url, {**data, "mode": "amount", "value": "2"})
+        self.assertContains(response, "12.00")
+        self.assertContains(response, "Apply to 2 product(s)")
+        self.assertEqual(self.prices()["Chair"], Decimal("10.00"))
+
+        response = self.client.post(
+            url, {**data, "mode": "amount", "value": "2", "apply": "1"}
+        )
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["2 product price(s) changed."],
+        )
+        self.assertEqual(self.prices()["Chair"], Decimal("12.00"))
+        self.assertEqual(self.prices()["Table"], Decimal("3.00"))
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CatalogueImportTestCase(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        User.objects.create_user(
+            username="organisor", password="password", is_organisor=True
+        )
+        self.client.login(username="organisor", password="password")
+        self.chair = Product.objects.create(
+            sku="CH-1", name="Chair", price="10.00", stock_quantity=5
+        )
+        self.table = Product.objects.create(
+            sku="TB-1", name="Table", price="50.00", stock_quantity=2
+        )
+
+    def csv_file(self, *rows, name="catalogue.csv"):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        lines = ["SKU,Name,Description,Price,Stock Quantity", *rows]
+        return SimpleUploadedFile(name, "\n".join(lines).encode())
+
+    def test_upsert_counts_and_price_history(self):
+        """Test that rows are inserted, updated or left alone by SKU."""
+        from .importers import CatalogueImporter
+
+        file = self.csv_file(
+            "CH-1,Chair,,12.00,",  # Price change, stock kept
+            "TB-1,Table,,50,2",  # Unchanged
+            "LP-1,Lamp,Desk lamp,20,7",  # New
+            "LP-1,Lamp,,21,7",  # Duplicate SKU
+            ",No SKU,,1,1",
+            "RG-1,Rug,,cheap,1",
+        )
+        result = CatalogueImporter().run(file, file.name)
+
+        self.assertEqual(
+            (result.inserted, result.updated, result.unchanged, result.skipped),
+            (1, 1, 1, 3),
+        )
+        self.assertEqual(
+            [error["error"] for error in result.errors],
+            [
+                "Duplicate SKU in file",
+                "Missing required fields",
+                "Price must be a number",
+            ],
+        )
+        self.chair.refresh_from_db()
+        self.assertEqual((self.chair.price, self.chair.stock_quantity), (12, 5))
+        change = PriceHistory.objects.get()
+        self.assertEqual(
+            (change.product, change.old_price, change.new_price), (self.chair, 10, 12)
+        )
+        lamp = Product.objects.get(sku="LP-1")
+        self.assertEqual(
+            (lamp.name, lamp.description, lamp.stock_quantity), ("Lamp", "Desk lamp", 7)
+        )
+        # Stock set by the import is recorded in the ledger
+        self.assertFalse(StockMovement.objects.discrepancies().exists())
+
+    def test_stock_is_compared_under_a_lock(self):
+        """Test that stock read for the ledger delta is locked until the write."""
+        from .importers import CatalogueImporter
+
+        # An order reserves stock after the first import
+        Product.objects.filter(pk=self.chair.pk).update(
+            stock_quantity=F("stock_quantity") - 2
+        )
+        StockMovement.objects.create(
+            product=self.chair, kind=StockMovement.Kind.RESERVE, quantity=-2
+        )
+        file = self.csv_file("CH-1,Chair,,10,8")
+        with CaptureQueriesContext(connection) as queries:
+            CatalogueImporter().run(file, file.name)
+
+        movement = StockMovement.objects.filter(reason="Catalogue import").get()
+        self.assertEqual(movement.quantity, 5)
+        self.assertFalse(StockMovement.objects.discrepancies().exists())
+        if connection.features.has_select_for_update:
+            lookup = next(q["sql"] for q in queries if '"sku" IN' in q["sql"])
+            self.assertIn("FOR UPDATE", lookup)
+
+    def test_product_created_since_the_lookup_keeps_its_stock(self):
+        """Test that a SKU created concurrently is updated without touching stock."""
+        from .importers import CatalogueImporter
+
+        bulk_create = Product.objects.bulk_create
+
+        def create_lamp_first(*args, **kwargs):
+            if not Product.objects.filter(sku="LP-1").exists():
+                Product.objects.create(
+                    sku="LP-1", name="Lamp", price="15.00", stock_quantity=3
+                )
+            return bulk_create(*args, **kwargs)
+
+        file = self.csv_file("LP-1,Desk lamp,,20,7")
+        with patch.object(
+            Product.objects, "bulk_create", side_effect=create_lamp_first
+        ):
+            CatalogueImporter().run(file, file.name)
+
+        lamp = Product.objects.get(sku="LP-1")
+        self.assertEqual((lamp.name, lamp.stock_quantity), ("Desk lamp", 3))
+        self.assertFalse(StockMovement.objects.discrepancies().exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Test that a chunk costs the same number of queries however many rows it has."""
+        from .importers import CatalogueImporter
+
+        def run(count):
+            rows = [
+                f"BULK-{index},Bulk {index},,{index + 1},3" for index in range(count)
+            ]
+            file = self.csv_file(*rows, f"TB-1,Table,,{count},{count + 1}")
+            with CaptureQueriesContext(connection) as queries:
+                CatalogueImporter().run(file, file.name)
+            return len(queries)
+
+        self.assertEqual(run(2), run(40))
+
+    def test_upload_is_queued_and_processed_in_the_background(self):
+        """Test that an upload is queued as a job and imported by the worker."""
+        url = reverse("products:product-import")
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        response = self.client.post(
+            url, {"file": self.csv_file("TB-1,Table,,45,2", "LP-1,Lamp,,20,")}
+        )
+        job = CatalogueImportJob.objects.get()
+        self.assertRedirects(
+            response,
+            reverse("products:catalogue-import-detail", kwargs={"pk": job.pk}),
+        )
+        self.table.refresh_from_db()
+        self.assertEqual(self.table.price, 50)
+
+        call_command("process_catalogue_imports", "--once", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, CatalogueImportJob.StatusChoices.COMPLETED)
+        self.assertEqual(
+            (job.inserted, job.updated, job.price_changes, job.last_row), (1, 1, 1, 3)
+        )
+        self.table.refresh_from_db()
+        self.assertEqual(self.table.price, 45)
+        response = self.client.get(
+            reverse("products:catalogue-import-status", kwargs={"pk": job.pk})
+        )
+        self.assertEqual(response.json()["inserted"], 1)
+
+        response = self.client.post(url, {"file": self.csv_file(name="catalogue.txt")})
+        self.assertContains(response, "Upload a .csv or .xlsx file.")
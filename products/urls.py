@@ -1,12 +1,18 @@
 from django.urls import path
 from .views import (
+    CatalogueImportJobDetailView,
+    CatalogueImportJobStatusView,
     ProductCreateView,
     ProductUpdateView,
     ProductDetailView,
+    ProductImportView,
     ProductDeleteView,
     ProductListView,
     ProductSalesDetailView,
     ProductSalesChartView,
+    ProductSearchView,
+    ProductSuggestionsView,
+    ReorderReportView,
     product_sales_data,
 )
 
@@ -15,6 +21,19 @@ app_name = "products"
 urlpatterns = [
     path("", ProductListView.as_view(), name="product-list"),
     path("create/", ProductCreateView.as_view(), name="product-create"),
+    path("import/", ProductImportView.as_view(), name="product-import"),
+    path(
+        "import/<int:pk>/",
+        CatalogueImportJobDetailView.as_view(),
+        name="catalogue-import-detail",
+    ),
+    path(
+        "import/<int:pk>/status/",
+        CatalogueImportJobStatusView.as_view(),
+        name="catalogue-import-status",
+    ),
+    path("search/", ProductSearchView.as_view(), name="product-search"),
+    path("suggestions/", ProductSuggestionsView.as_view(), name="product-suggestions"),
     path("<int:pk>/", ProductDetailView.as_view(), name="product-detail"),
     path("<int:pk>/update/", ProductUpdateView.as_view(), name="product-update"),
     path("<int:pk>/delete/", ProductDeleteView.as_view(), name="product-delete"),
@@ -23,6 +42,7 @@ urlpatterns = [
         ProductSalesDetailView.as_view(),
         name="all-products-statistics",
     ),
+    path("reorder/", ReorderReportView.as_view(), name="reorder-report"),
     path("sales-chart/", ProductSalesChartView.as_view(), name="sales_chart"),
     path("sales-data/", product_sales_data, name="sales_data"),
 ]
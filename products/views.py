@@ -1,28 +1,43 @@
 # Django imports
+from django.contrib import messages
+from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
-from django.views import generic
+from django.views import generic, View
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models import Sum, Count
+from django.db.models import Count, F, Sum
 from django.http import JsonResponse
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 # Application-specific imports
-from .models import Product
+from .models import CatalogueImportJob, Product, StockForecast
 from orders.models import OrderProduct
-from .forms import ProductForm, TimeFrameSelectionForm
+from .forms import CatalogueUploadForm, ProductForm, TimeFrameSelectionForm
 from orders.forms import StatisticsFilterForm
-from agents.mixins import OrganisorAndLoginRequiredMixin
-
-# Python standard library imports
-from datetime import timedelta, datetime
+from agents.mixins import (
+    ExportMixin,
+    ImportJobDetailMixin,
+    ImportJobStatusMixin,
+    OrganisorAndLoginRequiredMixin,
+)
+from .recommendations import frequently_bought_together
+from .sales_cache import LAST_30_DAYS, product_sales_cache, sales_period
 
 
 # View for listing products with pagination
-class ProductListView(LoginRequiredMixin, generic.ListView):
+class ProductListView(LoginRequiredMixin, ExportMixin, generic.ListView):
     template_name = "products/product_list.html"
     context_object_name = "products"
     paginate_by = 10  # Number of items per page
+    export_filename = "products"
+    export_fields = (
+        ("id", "Product ID"),
+        ("sku", "SKU"),
+        ("name", "Name"),
+        ("description", "Description"),
+        ("price", "Price"),
+        ("stock_quantity", "Stock Quantity"),
+    )
 
     def get_queryset(self):
         # Retrieve all products ordered by name
@@ -46,6 +61,116 @@ class ProductListView(LoginRequiredMixin, generic.ListView):
         return context
 
 
+# JSON typeahead for picking products, a page of matches at a time
+class ProductSearchView(LoginRequiredMixin, View):
+    page_size = 20
+
+    def get(self, request):
+        products = Product.objects.search(request.GET.get("q", ""))
+        if request.GET.get("in_stock"):
+            products = products.in_stock()
+
+        page = request.GET.get("page", "1")
+        if not page.isdigit() or int(page) < 1:
+            return JsonResponse({"error": "Invalid page."}, status=400)
+        offset = (int(page) - 1) * self.page_size
+        rows = list(
+            products.values("pk", "name", "price", "stock_quantity")[
+                offset : offset + self.page_size + 1
+            ]
+        )
+        has_more = len(rows) > self.page_size
+
+        return JsonResponse(
+            {
+                "products": [
+                    {
+                        "id": row["pk"],
+                        "name": row["name"],
+                        "price": row["price"],
+                        "stock_quantity": row["stock_quantity"],
+                    }
+                    for row in rows[: self.page_size]
+                ],
+                "next_page": int(page) + 1 if has_more else None,
+            }
+        )
+
+
+# JSON list of products often bought with the ones already in an order
+class ProductSuggestionsView(LoginRequiredMixin, View):
+    limit = 5
+
+    def get(self, request):
+        product_ids = request.GET.getlist("product")
+        if not all(product_id.isdigit() for product_id in product_ids):
+            return JsonResponse({"error": "Invalid product."}, status=400)
+        products = frequently_bought_together(
+            map(int, product_ids), limit=self.limit, in_stock=True
+        )
+        return JsonResponse(
+            {
+                "products": [
+                    {
+                        "id": product.pk,
+                        "name": product.name,
+                        "price": product.price,
+                        "stock_quantity": product.stock_quantity,
+                    }
+                    for product in products
+                ]
+            }
+        )
+
+
+# View to queue a CSV or Excel catalogue for a background upsert by SKU
+class ProductImportView(OrganisorAndLoginRequiredMixin, View):
+    template_name = "products/product_import.html"
+
+    def get_context_data(self, form):
+        return {
+            "form": form,
+            "import_jobs": CatalogueImportJob.objects.order_by("-created_at")[:10],
+        }
+
+    def get(self, request, *args, **kwargs):
+        form = CatalogueUploadForm()
+        return render(request, self.template_name, self.get_context_data(form))
+
+    def post(self, request, *args, **kwargs):
+        form = CatalogueUploadForm(request.POST, request.FILES)
+
+        if form.is_valid():
+            # The file is stored and imported by the process_catalogue_imports worker
+            job = CatalogueImportJob.objects.create(
+                file=form.cleaned_data["file"],
+                created_by=request.user.userprofile,
+            )
+            messages.success(
+                request, f"Catalogue import #{job.pk} has been queued for processing."
+            )
+            return redirect("products:catalogue-import-detail", pk=job.pk)
+
+        return render(request, self.template_name, self.get_context_data(form))
+
+
+# View to follow the progress of a background catalogue import
+class CatalogueImportJobDetailView(
+    OrganisorAndLoginRequiredMixin, ImportJobDetailMixin, generic.DetailView
+):
+    model = CatalogueImportJob
+    template_name = "products/catalogue_import_detail.html"
+    job_label = "Catalogue import"
+    detail_url_name = "products:catalogue-import-detail"
+
+
+# JSON endpoint polled by the catalogue import progress page
+class CatalogueImportJobStatusView(
+    OrganisorAndLoginRequiredMixin, ImportJobStatusMixin, generic.DetailView
+):
+    model = CatalogueImportJob
+
+
 # View for displaying detailed product information
 class ProductDetailView(LoginRequiredMixin, generic.DetailView):
     model = Product
@@ -101,71 +226,97 @@ class ProductCreateView(OrganisorAndLoginRequiredMixin, generic.CreateView):
     success_url = reverse_lazy("products:product-list")
 
 
+# Products forecast to run out soon, from the stored stock forecasts
+class ReorderReportView(OrganisorAndLoginRequiredMixin, generic.ListView):
+    template_name = "products/reorder_report.html"
+    context_object_name = "forecasts"
+    paginate_by = 20
+    default_days = 14  # Typical supplier lead time
+    orderings = {
+        "cover": [F("days_of_cover").asc(), "product__name"],
+        "demand": [F("daily_demand").desc(), "product__name"],
+        "stock": [F("product__stock_quantity").asc(), "product__name"],
+        "name": ["product__name"],
+    }
+
+    def get_days(self):
+        days = self.request.GET.get("days", "")
+        return int(days) if days.isdigit() else self.default_days
+
+    def get_sort(self):
+        sort = self.request.GET.get("sort")
+        return sort if sort in self.orderings else "cover"
+
+    def get_queryset(self):
+        return (
+            StockForecast.objects.filter(days_of_cover__lte=self.get_days())
+            .select_related("product")
+            .order_by(*self.orderings[self.get_sort()])
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["days"] = self.get_days()
+        context["sort"] = self.get_sort()
+        context["computed_at"] = (
+            StockForecast.objects.order_by().values_list("computed_at", flat=True)
+        ).first()
+        return context
+
+
 # View for displaying product sales details with filtering and chart data
 class ProductSalesDetailView(OrganisorAndLoginRequiredMixin, generic.ListView):
     template_name = "products/product_sales_detail.html"
     context_object_name = "product_sales"
 
+    chart_size = 5  # Products shown in the charts before the "Other" slice
+    paginate_by = 5
+
     def get_queryset(self):
-        # Retrieve aggregated product sales data, optionally filtered by date
+        # Retrieve aggregated product sales data, optionally filtered by date.
+        # Evaluated once; the table, pagination and charts all read this list.
         form = StatisticsFilterForm(self.request.GET or None)
+        start_datetime = end_datetime = None
         if form.is_valid():
             start_datetime = form.cleaned_data.get("start_datetime")
             end_datetime = form.cleaned_data.get("end_datetime")
-            return OrderProduct.get_product_sales(
-                start_date=start_datetime, end_date=end_datetime
+        return list(
+            OrderProduct.get_product_sales(
+                start_date=start_datetime, end_date=end_datetime, top=self.chart_size
             )
-        return OrderProduct.get_product_sales()
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        # Clamp out-of-range pages instead of raising 404
+        paginator = self.get_paginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET.get(self.page_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         # Add chart data and pagination to the context
         context = super().get_context_data(**kwargs)
-        form = StatisticsFilterForm(self.request.GET or None)
-        context["form"] = form
-        product_sales = self.get_queryset()
-        paginator = Paginator(product_sales, 5)
-        page_number = self.request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
-
-        context["product_sales"] = page_obj
-        context["page_obj"] = page_obj
-
-        total_quantity = sum(item["total_quantity_sold"] for item in product_sales)
-        total_revenue = sum(item["total_revenue_sold"] for item in product_sales)
-
-        if total_quantity == 0 or total_revenue == 0:
-            labels = []
-            quantity_data = []
-            revenue_data = []
-        else:
-            sorted_sales = sorted(
-                product_sales, key=lambda x: x["total_quantity_sold"], reverse=True
-            )
-            top_sales = sorted_sales[:5]
-            other_sales = sorted_sales[5:]
-
-            other_quantity = sum(item["total_quantity_sold"] for item in other_sales)
-            other_revenue = sum(item["total_revenue_sold"] for item in other_sales)
-
-            labels = [item["product_name"] for item in top_sales]
-            quantity_data = [item["total_quantity_sold"] for item in top_sales]
-            revenue_data = [item["total_revenue_sold"] for item in top_sales]
-
-            if other_sales:
+        context["form"] = StatisticsFilterForm(self.request.GET or None)
+        context["product_sales"] = context["page_obj"]
+
+        product_sales = self.object_list
+        labels = []
+        quantity_data = []
+        revenue_data = []
+        if product_sales and product_sales[0]["quantity_share"] is not None:
+            for item in product_sales[: self.chart_size]:
+                labels.append(item["product_name"])
+                quantity_data.append(item["quantity_share"])
+                revenue_data.append(item["revenue_share"] or 0)
+
+            top_sales = product_sales[0]
+            if top_sales["other_quantity_share"] is not None:
                 labels.append("Other")
-                quantity_data.append(other_quantity)
-                revenue_data.append(other_revenue)
-
-            quantity_data = [
-                round((value / total_quantity) * 100, 2) for value in quantity_data
-            ]
-            revenue_data = [
-                round((value / total_revenue) * 100, 2) for value in revenue_data
-            ]
+                quantity_data.append(top_sales["other_quantity_share"])
+                revenue_data.append(top_sales["other_revenue_share"] or 0)
 
         context["chart_labels"] = labels
-        context["chart_quantity_data"] = quantity_data
-        context["chart_revenue_data"] = revenue_data
+        context["chart_quantity_data"] = [float(value) for value in quantity_data]
+        context["chart_revenue_data"] = [float(value) for value in revenue_data]
 
         return context
 
@@ -182,20 +333,8 @@ class ProductSalesChartView(OrganisorAndLoginRequiredMixin, generic.TemplateView
         return context
 
 
-# API endpoint for fetching product sales data
-def product_sales_data(request):
-    time_frame = request.GET.get("time_frame", "last_30_days")
-    end_date = datetime.now()
-
-    if time_frame == "last_30_days":
-        start_date = end_date - timedelta(days=30)
-    else:
-        year, month = map(int, time_frame.split("-"))
-        start_date = datetime(year, month, 1)
-        next_month = month % 12 + 1
-        year = year + (1 if next_month == 1 else 0)
-        end_date = datetime(year, next_month, 1)
-
+# Top five products sold in a period, by quantity
+def top_selling_products(start_date, end_date):
     sales_data = (
         OrderProduct.objects.filter(
             order__status="Paid", order__date_created__range=(start_date, end_date)
@@ -208,14 +347,18 @@ def product_sales_data(request):
         .order_by("-total_sold")[:5]
     )
 
-    labels = [entry["product_name"] for entry in sales_data]
-    total_sold = [entry["total_sold"] for entry in sales_data]
-    unique_customers = [entry["unique_customers"] for entry in sales_data]
+    return {
+        "labels": [entry["product_name"] for entry in sales_data],
+        "total_sold": [entry["total_sold"] for entry in sales_data],
+        "unique_customers": [entry["unique_customers"] for entry in sales_data],
+    }
 
-    return JsonResponse(
-        {
-            "labels": labels,
-            "total_sold": total_sold,
-            "unique_customers": unique_customers,
-        }
-    )
+
+# API endpoint for fetching product sales data
+def product_sales_data(request):
+    time_frame = request.GET.get("time_frame", LAST_30_DAYS)
+    try:
+        sales_period(time_frame)
+    except ValueError:
+        return JsonResponse({"error": "Invalid time frame."}, status=400)
+    return JsonResponse(product_sales_cache.get(time_frame, top_selling_products))
@@ -0,0 +1,109 @@
+// Turn selects with a data-autocomplete-url into search-as-you-type inputs
+document.addEventListener('DOMContentLoaded', () => {
+    const selects = document.querySelectorAll('select[data-autocomplete-url]');
+
+    selects.forEach(select => {
+        const wrapper = document.createElement('div');
+        wrapper.className = 'relative';
+
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.autocomplete = 'off';
+        input.placeholder = 'Start typing to search...';
+        input.className = 'bg-white focus:outline-none border border-gray-300 rounded-lg py-2 px-4 block w-full leading-normal text-gray-700';
+        const selected = select.options[select.selectedIndex];
+        input.value = selected && selected.value ? selected.text : '';
+
+        const results = document.createElement('ul');
+        results.className = 'hidden absolute z-50 w-full bg-white border rounded-md shadow-lg mt-1 max-h-72 overflow-y-auto';
+
+        // The select stays in the form and carries the chosen value
+        select.classList.add('hidden');
+        select.parentNode.insertBefore(wrapper, select);
+        wrapper.append(input, results, select);
+
+        const choose = result => {
+            select.innerHTML = '';
+            select.appendChild(new Option(result.text, result.id, true, true));
+            input.value = result.text;
+            results.classList.add('hidden');
+        };
+
+        const renderResult = result => {
+            const item = document.createElement('li');
+            item.className = 'px-4 py-2 cursor-pointer hover:bg-indigo-50';
+            const label = document.createElement('span');
+            label.className = 'block text-gray-800';
+            label.textContent = result.text;
+            item.appendChild(label);
+            if (result.detail) {
+                const detail = document.createElement('span');
+                detail.className = 'block text-xs text-gray-500';
+                detail.textContent = result.detail;
+                item.appendChild(detail);
+            }
+            item.addEventListener('click', () => choose(result));
+            return item;
+        };
+
+        let debounceTimer = null;
+        let currentQuery = '';
+
+        const search = query => {
+            const url = new URL(select.dataset.autocompleteUrl, window.location.origin);
+            url.searchParams.set('q', query);
+
+            fetch(url, { headers: { 'Accept': 'application/json' } })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    if (query !== currentQuery) {
+                        return;  // A newer search has started
+                    }
+                    results.innerHTML = '';
+                    data.results.forEach(result => results.appendChild(renderResult(result)));
+                    if (!data.results.length) {
+                        const empty = document.createElement('li');
+                        empty.className = 'px-4 py-2 text-gray-500';
+                        empty.textContent = 'No matches found.';
+                        results.appendChild(empty);
+                    }
+                    results.classList.remove('hidden');
+                })
+                .catch(error => console.error('Error loading suggestions:', error));
+        };
+
+        input.addEventListener('input', () => {
+            clearTimeout(debounceTimer);
+            currentQuery = input.value.trim();
+            if (!currentQuery) {
+                // Clearing the input clears the selection
+                select.innerHTML = '';
+                select.appendChild(new Option('', '', true, true));
+                results.classList.add('hidden');
+                return;
+            }
+            debounceTimer = setTimeout(() => search(currentQuery), 250);
+        });
+
+        input.addEventListener('keydown', event => {
+            if (event.key === 'Enter') {
+                event.preventDefault();
+                const first = results.querySelector('li.cursor-pointer');
+                if (first && !results.classList.contains('hidden')) {
+                    first.click();
+                }
+            }
+        });
+
+        document.addEventListener('click', event => {
+            if (!wrapper.contains(event.target)) {
+                results.classList.add('hidden');
+            }
+        });
+    });
+});
@@ -0,0 +1,34 @@
+// Poll the import status endpoint and refresh the counters until the job finishes
+document.addEventListener('DOMContentLoaded', () => {
+    const importDataElement = document.getElementById('import-data');
+
+    if (!importDataElement || importDataElement.dataset.isFinished === "true") {
+        return;
+    }
+
+    const statusUrl = importDataElement.dataset.statusUrl;
+    const counters = importDataElement.dataset.counters
+        ? importDataElement.dataset.counters.split(',')
+        : ['rows_processed', 'created', 'skipped', 'duplicates'];
+
+    const poll = () => {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(progress => {
+                document.getElementById('import-status').textContent = progress.status;
+                counters.forEach(name => {
+                    document.getElementById(`import-${name}`).textContent = progress[name];
+                });
+
+                // Reload once to show the final report and the available actions
+                if (progress.is_finished) {
+                    window.location.reload();
+                } else {
+                    setTimeout(poll, 2000);
+                }
+            })
+            .catch(error => console.error("Error fetching import status:", error));
+    };
+
+    setTimeout(poll, 2000);
+});
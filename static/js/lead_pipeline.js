@@ -0,0 +1,100 @@
+// Load pipeline columns page by page and move cards between them with drag and drop
+document.addEventListener('DOMContentLoaded', () => {
+    const pipelineDataElement = document.getElementById('pipeline-data');
+
+    if (!pipelineDataElement) {
+        console.error("Pipeline data element not found.");
+        return;
+    }
+
+    const moveUrl = pipelineDataElement.dataset.moveUrl;
+    const csrfToken = pipelineDataElement.dataset.csrfToken;
+    let draggedCard = null;
+
+    const renderCard = lead => {
+        const card = document.createElement('li');
+        card.className = 'bg-white rounded-md shadow p-3 cursor-move';
+        card.draggable = true;
+        card.dataset.leadId = lead.id;
+
+        const link = document.createElement('a');
+        link.href = lead.url;
+        link.className = 'font-medium text-gray-900 hover:text-indigo-600';
+        link.textContent = lead.name;
+
+        const details = document.createElement('p');
+        details.className = 'text-xs text-gray-500';
+        details.textContent = `${lead.email} · ${lead.agent || 'unassigned'}${lead.is_converted ? ' · converted' : ''}`;
+
+        card.append(link, details);
+        card.addEventListener('dragstart', () => {
+            draggedCard = card;
+        });
+        return card;
+    };
+
+    // Fetch the next page of a column using the keyset cursor of the previous one
+    const loadPage = (column, cursor) => {
+        const url = new URL(column.dataset.url, window.location.origin);
+        if (cursor) {
+            url.searchParams.set('before', cursor.before);
+            url.searchParams.set('before_id', cursor.before_id);
+        }
+
+        const moreButton = column.querySelector('.pipeline-more');
+        moreButton.disabled = true;
+
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(page => {
+                const cards = column.querySelector('.pipeline-cards');
+                page.leads.forEach(lead => cards.appendChild(renderCard(lead)));
+                column.nextCursor = page.next;
+                moreButton.classList.toggle('hidden', !page.next);
+                moreButton.disabled = false;
+            })
+            .catch(error => console.error("Error loading pipeline column:", error));
+    };
+
+    const updateCount = (column, delta) => {
+        const count = column.querySelector('.pipeline-count');
+        count.textContent = parseInt(count.textContent, 10) + delta;
+    };
+
+    document.querySelectorAll('.pipeline-column').forEach(column => {
+        loadPage(column, null);
+
+        column.querySelector('.pipeline-more').addEventListener('click', () => {
+            loadPage(column, column.nextCursor);
+        });
+
+        column.addEventListener('dragover', event => event.preventDefault());
+
+        column.addEventListener('drop', event => {
+            event.preventDefault();
+            const card = draggedCard;
+            draggedCard = null;
+            const source = card && card.closest('.pipeline-column');
+            if (!card || source === column) {
+                return;
+            }
+
+            const body = new URLSearchParams({ category: column.dataset.categoryId });
+            fetch(moveUrl.replace('/0/', `/${card.dataset.leadId}/`), {
+                method: 'POST',
+                headers: { 'X-CSRFToken': csrfToken, 'Accept': 'application/json' },
+                body: body,
+            })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    // The moved card stays at the top of its new column until reload
+                    column.querySelector('.pipeline-cards').prepend(card);
+                    updateCount(source, -1);
+                    updateCount(column, 1);
+                })
+                .catch(error => console.error("Error moving lead:", error));
+        });
+    });
+});
@@ -0,0 +1,52 @@
+// Refresh paginated lists in place by fetching only their results fragment
+document.addEventListener('DOMContentLoaded', () => {
+    const resultsElement = document.getElementById('list-results');
+
+    if (!resultsElement) {
+        return;
+    }
+
+    const fragmentUrl = resultsElement.dataset.fragmentUrl;
+
+    const load = (search, pushState) => {
+        fetch(`${fragmentUrl}${search}`, { headers: { 'Accept': 'text/html' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.text();
+            })
+            .then(html => {
+                resultsElement.innerHTML = html;
+                if (pushState) {
+                    history.pushState(null, '', `${window.location.pathname}${search}`);
+                }
+            })
+            .catch(error => {
+                // Fall back to a full page load
+                console.error("Error loading list results:", error);
+                window.location.search = search;
+            });
+    };
+
+    // Filter and search forms submit to the fragment endpoint
+    document.querySelectorAll('form[data-fragment-form]').forEach(form => {
+        form.addEventListener('submit', event => {
+            event.preventDefault();
+            const params = new URLSearchParams(new FormData(form));
+            load(`?${params}`, true);
+        });
+    });
+
+    // Pagination links are replaced in the fragment, so listen on the container
+    resultsElement.addEventListener('click', event => {
+        const link = event.target.closest('[data-fragment-links] a');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        load(new URL(link.href).search, true);
+    });
+
+    window.addEventListener('popstate', () => load(window.location.search, false));
+});
@@ -0,0 +1,60 @@
+// Render paid orders as a weekday x hour grid, darker cells meaning more orders
+document.addEventListener('DOMContentLoaded', () => {
+    const container = document.getElementById('order-heatmap');
+
+    if (!container) {
+        console.error("Order heatmap element not found.");
+        return;
+    }
+
+    const cell = (tag, className, text) => {
+        const element = document.createElement(tag);
+        element.className = className;
+        if (text !== undefined) {
+            element.textContent = text;
+        }
+        return element;
+    };
+
+    const renderHeatmap = data => {
+        const table = cell('table', 'text-xs border-separate');
+        table.style.borderSpacing = '2px';
+
+        const header = document.createElement('tr');
+        header.appendChild(cell('th', ''));
+        data.hours.forEach(hour => {
+            header.appendChild(cell('th', 'font-normal text-gray-500 w-6', String(hour).padStart(2, '0')));
+        });
+        table.appendChild(header);
+
+        data.grid.forEach((counts, index) => {
+            const row = document.createElement('tr');
+            row.appendChild(cell('th', 'pr-2 text-right font-medium text-gray-600', data.weekdays[index]));
+            counts.forEach((count, hour) => {
+                const td = cell('td', 'w-6 h-6 rounded text-center', count || '');
+                const intensity = data.max ? count / data.max : 0;
+                td.style.backgroundColor = `rgba(99, 102, 241, ${0.08 + intensity * 0.92})`;
+                td.style.color = intensity > 0.5 ? '#fff' : '#374151';
+                td.title = `${data.weekdays[index]} ${String(hour).padStart(2, '0')}:00: ${count} paid order(s)`;
+                row.appendChild(td);
+            });
+            table.appendChild(row);
+        });
+
+        container.innerHTML = '';
+        container.appendChild(table);
+    };
+
+    fetch(container.dataset.url, { headers: { 'Accept': 'application/json' } })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(renderHeatmap)
+        .catch(error => {
+            console.error('Error loading the order heatmap:', error);
+            container.textContent = 'The heatmap could not be loaded.';
+        });
+});
@@ -0,0 +1,199 @@
+// Search products as the user types and add the picked ones as order lines
+document.addEventListener('DOMContentLoaded', () => {
+    const picker = document.getElementById('product-picker');
+
+    if (!picker) {
+        console.error("Product picker element not found.");
+        return;
+    }
+
+    const searchUrl = picker.dataset.searchUrl;
+    const searchInput = document.getElementById('product-search');
+    const results = document.getElementById('product-results');
+    const lines = document.getElementById('order-lines');
+    const emptyMessage = document.getElementById('order-lines-empty');
+    const suggestions = document.getElementById('product-suggestions');
+    const suggestionsList = document.getElementById('product-suggestions-list');
+    let debounceTimer = null;
+    let currentQuery = '';
+    let nextPage = null;
+
+    // Suggest products often bought with the current order lines
+    const refreshSuggestions = () => {
+        const url = new URL(suggestions.dataset.suggestionsUrl, window.location.origin);
+        lines.querySelectorAll('[data-product-id]').forEach(line => {
+            url.searchParams.append('product', line.dataset.productId);
+        });
+        if (!url.searchParams.has('product')) {
+            suggestions.classList.add('hidden');
+            return;
+        }
+
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                suggestionsList.innerHTML = '';
+                data.products.forEach(product => {
+                    const item = document.createElement('li');
+                    item.className = 'px-3 py-1 text-sm rounded-full border border-indigo-200 text-indigo-700 cursor-pointer hover:bg-indigo-50';
+                    item.textContent = `+ ${product.name} — $${product.price}`;
+                    item.addEventListener('click', () => addLine(product));
+                    suggestionsList.appendChild(item);
+                });
+                suggestions.classList.toggle('hidden', !data.products.length);
+            })
+            .catch(error => console.error('Error loading suggestions:', error));
+    };
+
+    const toggleEmptyMessage = () => {
+        emptyMessage.classList.toggle('hidden', lines.children.length > 0);
+        refreshSuggestions();
+    };
+
+    const addLine = product => {
+        const existing = lines.querySelector(`[data-product-id="${product.id}"]`);
+        if (existing) {
+            existing.querySelector('input[type="number"]').focus();
+            return;
+        }
+
+        const line = document.createElement('li');
+        line.className = 'flex items-center justify-between p-4 border rounded-lg shadow-sm';
+        line.dataset.productId = product.id;
+
+        const hidden = document.createElement('input');
+        hidden.type = 'hidden';
+        hidden.name = 'product';
+        hidden.value = product.id;
+
+        const details = document.createElement('div');
+        const name = document.createElement('span');
+        name.className = 'block text-lg font-medium text-gray-800';
+        name.textContent = product.name;
+        const info = document.createElement('span');
+        info.className = 'text-sm text-gray-600';
+        info.textContent = `Price: $${product.price} · Stock: ${product.stock_quantity} available`;
+        details.append(name, info);
+
+        const controls = document.createElement('div');
+        controls.className = 'flex items-center space-x-3';
+        const quantity = document.createElement('input');
+        quantity.type = 'number';
+        quantity.name = `quantity_${product.id}`;
+        quantity.value = 1;
+        quantity.min = 1;
+        quantity.max = product.stock_quantity;
+        quantity.className = 'form-input w-24 rounded-md border-2 border-gray-300 focus:border-indigo-600 focus:ring focus:ring-indigo-200';
+        const remove = document.createElement('button');
+        remove.type = 'button';
+        remove.dataset.removeLine = '';
+        remove.className = 'text-red-500 hover:text-red-700';
+        remove.textContent = 'Remove';
+        controls.append(quantity, remove);
+
+        line.append(hidden, details, controls);
+        lines.appendChild(line);
+        toggleEmptyMessage();
+    };
+
+    const renderResult = product => {
+        const item = document.createElement('li');
+        item.className = 'px-4 py-2 cursor-pointer hover:bg-indigo-50';
+        item.textContent = `${product.name} — $${product.price} (${product.stock_quantity} in stock)`;
+        item.addEventListener('click', () => {
+            addLine(product);
+            results.classList.add('hidden');
+            searchInput.value = '';
+        });
+        return item;
+    };
+
+    const renderMoreButton = () => {
+        const item = document.createElement('li');
+        item.className = 'px-4 py-2 text-center text-indigo-600 cursor-pointer hover:bg-indigo-50';
+        item.textContent = 'Show more';
+        item.addEventListener('click', () => {
+            item.remove();
+            search(currentQuery, nextPage);
+        });
+        return item;
+    };
+
+    // Fetch one page of in-stock matches; page 1 replaces the list, later pages append
+    const search = (query, page = 1) => {
+        const url = new URL(searchUrl, window.location.origin);
+        url.searchParams.set('q', query);
+        url.searchParams.set('in_stock', '1');
+        url.searchParams.set('page', page);
+
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                if (query !== currentQuery) {
+                    return;  // A newer search has started
+                }
+                if (page === 1) {
+                    results.innerHTML = '';
+                }
+                data.products.forEach(product => results.appendChild(renderResult(product)));
+                if (!results.children.length) {
+                    const empty = document.createElement('li');
+                    empty.className = 'px-4 py-2 text-gray-500';
+                    empty.textContent = 'No products in stock match your search.';
+                    results.appendChild(empty);
+                }
+                nextPage = data.next_page;
+                if (nextPage) {
+                    results.appendChild(renderMoreButton());
+                }
+                results.classList.remove('hidden');
+            })
+            .catch(error => console.error('Error searching products:', error));
+    };
+
+    searchInput.addEventListener('input', () => {
+        clearTimeout(debounceTimer);
+        currentQuery = searchInput.value.trim();
+        if (!currentQuery) {
+            results.classList.add('hidden');
+            return;
+        }
+        debounceTimer = setTimeout(() => search(currentQuery), 250);
+    });
+
+    // Enter picks from the list instead of submitting the order
+    searchInput.addEventListener('keydown', event => {
+        if (event.key === 'Enter') {
+            event.preventDefault();
+            const first = results.querySelector('li.cursor-pointer');
+            if (first && !results.classList.contains('hidden')) {
+                first.click();
+            }
+        }
+    });
+
+    document.addEventListener('click', event => {
+        if (!picker.contains(event.target)) {
+            results.classList.add('hidden');
+        }
+    });
+
+    toggleEmptyMessage();
+
+    lines.addEventListener('click', event => {
+        if (event.target.closest('[data-remove-line]')) {
+            event.target.closest('li').remove();
+            toggleEmptyMessage();
+        }
+    });
+});